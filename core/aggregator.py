@@ -1,19 +1,40 @@
 # core/aggregator.py
 import os
 import sys
-import ipaddress
-import socket
-import subprocess
+import json
+import shutil
+import time
 from pathlib import Path
-from typing import Dict, List
+from typing import Callable, Dict, Iterable, List
 
 import yaml
 
-from .utils import write_text, read_lines
+from .utils import iter_lines, read_lines, write_lines, write_text
+from .targets import TargetSet, endpoint_port
+from .scope import exclude_file, load_exclusions
+from .aggstate import AggState, lines_digest, lines_hash, link_or_copy
+from .liveness import fping_alive_sharded, fping_interval_for, tcp_alive
+from .livecache import AliveCache
+from .pipeline import (
+    Discovery,
+    Liveness,
+    Throttle,
+    load_discovery,
+    load_dns,
+    load_liveness,
+    load_target_files,
+    load_throttle,
+    load_timeouts,
+)
+from .rtt import write_rtt_file
+from .targetbin import write_target_file
+from .provenance import Provenance
+from .resolver import resolve_hosts
+from .ftp_fetch import fetch_sources
 from . import discovery
 
 
-def _dedupe_preserve_order(items: List[str]) -> List[str]:
+def _dedupe_preserve_order(items: Iterable[str]) -> List[str]:
     seen = set()
     out: List[str] = []
     for x in items:
@@ -23,213 +44,561 @@ def _dedupe_preserve_order(items: List[str]) -> List[str]:
     return out
 
 
-def expand_targets(lines: List[str]) -> List[str]:
+def expand_targets(lines: Iterable[str]) -> TargetSet:
     """
     Принимает строки с целями:
       - IP: 1.2.3.4
       - CIDR: 10.0.0.0/24
       - диапазоны: 10.0.0.1-10.0.0.10 или 10.0.0.1-10
       - URL/hostname: https://example.com, example.com, 1.1.1.1:443
-    Возвращает нормализованный список IP/host, каждый один раз.
+    Возвращает TargetSet: слитые интервалы IP + множество hostnames.
+    Отдельные адреса не материализуются — только при итерации.
     """
-    out: List[str] = []
+    return TargetSet(lines)
 
-    for raw in lines:
-        s = raw.strip()
-        if not s or s.startswith("#"):
-            continue
-
-        # отрежем схему и путь
-        if "://" in s:
-            s = s.split("://", 1)[1]
-        s = s.split("/", 1)[0]
-
-        # отрежем порт, если есть
-        if ":" in s:
-            s = s.split(":", 1)[0]
-
-        # диапазон IP: A.B.C.D-E или A.B.C.D-E.F.G.H
-        if "-" in s:
-            left, right = s.split("-", 1)
-            try:
-                start = ipaddress.ip_address(left)
-                if "." in right:
-                    end = ipaddress.ip_address(right)
-                else:
-                    # если правая часть только последний октет
-                    base = left.split(".")
-                    if len(base) != 4:
-                        raise ValueError()
-                    end = ipaddress.ip_address(".".join(base[:3] + [right]))
-                if int(start) <= int(end):
-                    cur = start
-                    while int(cur) <= int(end):
-                        out.append(str(cur))
-                        cur = ipaddress.ip_address(int(cur) + 1)
-                    continue
-            except ValueError:
-                # не смогли понять как диапазон — пойдём дальше
-                pass
-
-        # CIDR
-        try:
-            net = ipaddress.ip_network(s, strict=False)
-            for ip in net.hosts():
-                out.append(str(ip))
-            continue
-        except ValueError:
-            pass
-
-        # одно IP?
-        try:
-            ip = ipaddress.ip_address(s)
-            out.append(str(ip))
-            continue
-        except ValueError:
-            # не IP — считаем, что это hostname
-            out.append(s)
 
-    return _dedupe_preserve_order(out)
+def target_order(ts: TargetSet, throttle: Throttle | None = None) -> Iterable[str]:
+    """Порядок обхода целей (pipeline.yaml -> throttle.order): чередование подсетей или подряд."""
+    throttle = throttle or Throttle()
+    if throttle.order == "interleave":
+        return ts.interleaved(throttle.block_prefix)
+    return ts
 
 
-def fping_alive(hosts: List[str]) -> List[str]:
+def probe_alive(
+    hosts: Iterable[str],
+    cfg: Liveness | None = None,
+    on_alive: Callable[[str, float | None], None] | None = None,
+    stats: Dict[str, object] | None = None,
+    loss: Dict[str, float] | None = None,
+) -> Dict[str, float | None]:
     """
-    Прогоняем список через fping, возвращаем только живые (по ICMP).
-    Если fping не доступен — простой TCP connect к 80/tcp.
+    Проверка живости выбранным движком (pipeline.yaml -> liveness.engine):
+      fping — ICMP, N параллельных процессов-шардов; tcp — асинхронный TCP connect.
+    cfg.pps — общий лимит проб в секунду: для fping переводится в -i шардов,
+    TCP-движок разносит connect'ы во времени сам.
+    При отсутствии/падении fping — откатываемся на TCP.
+    on_alive вызывается для каждого живого хоста сразу по мере обнаружения.
+    stats (если передан) заполняется движком, временем и статистикой шардов.
+    loss (если передан) — доли потерь живых хостов (только fping с fping_count).
+    Возвращает host -> RTT в мс (None, если движок RTT не измерял).
     """
     if not hosts:
-        return []
+        return {}
+    cfg = cfg or Liveness()
+    stats = stats if stats is not None else {}
+    t0 = time.monotonic()
 
+    engine = cfg.engine
+    if engine == "auto":
+        engine = "fping" if shutil.which("fping") else "tcp"
+
+    if engine == "fping":
+        seen: Dict[str, float | None] = {}
+
+        def _cb(h, rtt):
+            seen[h] = rtt
+            if on_alive is not None:
+                on_alive(h, rtt)
+
+        try:
+            alive, shards = fping_alive_sharded(
+                hosts,
+                shards=cfg.fping_shards,
+                interval=_fping_interval(cfg),
+                retries=cfg.fping_retries,
+                timeout=cfg.fping_timeout,
+                on_alive=_cb,
+                count=cfg.fping_count,
+                loss=loss,
+            )
+            stats.update(engine="fping", shards=shards, seconds=round(time.monotonic() - t0, 3))
+            return alive
+        except Exception as e:
+            print(f"[01] aggregation: WARNING: fping failed ({e}), falling back to TCP", file=sys.stderr)
+        # уже отданные в on_alive хосты второй раз не отдаём
+        if on_alive is not None:
+            cb = on_alive
+            on_alive = lambda h, rtt: None if h in seen else cb(h, rtt)
+
+    alive = tcp_alive(
+        hosts,
+        ports=cfg.tcp_ports,
+        timeout=cfg.tcp_timeout,
+        concurrency=cfg.tcp_concurrency,
+        on_alive=on_alive,
+        pps=cfg.pps,
+    )
+    stats.update(engine="tcp", shards=[], seconds=round(time.monotonic() - t0, 3))
+    return alive
+
+
+def _fping_interval(cfg: Liveness) -> int | None:
+    """-i шардов fping: явный fping_interval, но не чаще, чем позволяет cfg.pps."""
+    budget = fping_interval_for(cfg.pps, cfg.fping_shards)
+    if budget is None:
+        return cfg.fping_interval
+    return max(budget, cfg.fping_interval or 0)
+
+
+def probe_alive_cached(
+    home: Path,
+    hosts: Iterable[str],
+    cfg: Liveness,
+    on_alive: Callable[[str, float | None], None] | None = None,
+    stats: Dict[str, object] | None = None,
+    hints: Iterable[str] = (),
+    loss: Dict[str, float] | None = None,
+) -> Dict[str, float | None]:
+    """
+    probe_alive с персистентным кэшем живости (AUTOPEN_HOME/state):
+    недавно живые хосты не пробуем, долго мёртвые — пробуем реже.
+    hints — хосты из скоупа, заведомо «скорее всего живые» (ARP-соседи):
+    засеваются в кэш как живые.
+    """
+    stats = stats if stats is not None else {}
+    now = time.time()
+    cache = AliveCache.load(
+        home,
+        ttl=cfg.cache_ttl,
+        dead_after=cfg.dead_after,
+        dead_every=cfg.dead_every,
+    )
+
+    hinted = cache.seed(hints, now)
+    alive = cache.fresh(hosts, now)
+    if on_alive is not None:
+        for h, r in alive.items():
+            on_alive(h, r)
+
+    alive.update(
+        probe_alive(cache.to_probe(hosts, now), cfg, on_alive=on_alive, stats=stats, loss=loss)
+    )
+
+    stats["cache"] = cache.update(hosts, alive, now)
+    stats["cache"]["hinted"] = hinted
     try:
-        proc = subprocess.run(
-            ["bash", "-lc", "fping -a -q -f /dev/stdin 2>/dev/null"],
-            input=("\n".join(hosts)).encode(),
-            capture_output=True,
-            check=False,
-        )
-        alive = proc.stdout.decode().splitlines()
-        return _dedupe_preserve_order([x.strip() for x in alive if x.strip()])
-    except Exception:
-        alive: List[str] = []
-        for h in hosts:
-            try:
-                with socket.create_connection((h, 80), timeout=1):
-                    alive.append(h)
-            except Exception:
-                pass
-        return _dedupe_preserve_order(alive)
-
-
-def _load_ftp_cfg_from_yaml(project_root: Path) -> Dict[str, str] | None:
-    cfg_path = project_root / "config" / "ftp.yaml"
-    if not cfg_path.exists():
-        return None
-    try:
-        cfg = yaml.safe_load(cfg_path.read_text()) or {}
+        cache.save(now)
     except Exception as e:
-        print(f"[01] aggregation: WARNING: failed to parse ftp.yaml: {e}", file=sys.stderr)
-        return None
+        print(f"[01] aggregation: WARNING: failed to save alive cache: {e}", file=sys.stderr)
+    return alive
+
+
+def alive_by_name(
+    ip_rtt: Dict[str, float | None],
+    expanded: TargetSet,
+    host_map: Dict[str, List[str]],
+) -> Dict[str, float | None]:
+    """
+    Результат проверки по IP -> живые цели в исходных терминах:
+    IP из диапазонов как есть, hostname жив, если жив хотя бы один его адрес
+    (RTT — лучший из адресов). Без host_map (резолвинг выключен) hostnames
+    пробовались по имени и уже лежат в ip_rtt.
+    """
+    if not host_map:
+        return dict(ip_rtt)
+    out: Dict[str, float | None] = {ip: r for ip, r in ip_rtt.items() if ip in expanded}
+    for h, ips in host_map.items():
+        rtts = [ip_rtt[ip] for ip in ips if ip in ip_rtt]
+        if rtts:
+            known = [r for r in rtts if r is not None]
+            out[h] = min(known) if known else None
+    return out
+
 
+def fping_alive(hosts: Iterable[str], cfg: Liveness | None = None) -> List[str]:
+    """
+    Прогоняем список через fping, возвращаем только живые (по ICMP).
+    Если fping не доступен — асинхронный TCP connect по портам из конфига.
+    """
+    return list(probe_alive(hosts, cfg))
+
+
+def sample_autodiscovery(
+    nets: List[str],
+    cfg: Discovery,
+    live_cfg: Liveness,
+    exclusions: TargetSet,
+    agg_dir: Path,
+    throttle: Throttle | None = None,
+) -> List[str]:
+    """
+    Иерархическое обнаружение: сети шире /block_prefix не разворачиваем целиком,
+    а пробуем выборку адресов в каждом блоке; дальше идут только блоки с живыми.
+    Статистика попаданий — в 01-aggregated/sampling.json.
+    """
+    if not cfg.sampling:
+        return nets
+    whole, blocks = discovery.sample_blocks(
+        nets, cfg.sample_ratio, discovery.neighbours(), cfg.block_prefix
+    )
+    if not blocks:
+        return nets
+
+    sample = TargetSet()
+    for ips in blocks.values():
+        for ip in ips:
+            if ip not in exclusions:
+                sample.add_ip(ip)
+    alive = probe_alive(target_order(sample, throttle), live_cfg)
+
+    live_blocks = [b for b, ips in blocks.items() if any(ip in alive for ip in ips)]
+    stats = {
+        "block_prefix": cfg.block_prefix,
+        "sample_ratio": cfg.sample_ratio,
+        "nets_whole": whole,
+        "blocks_total": len(blocks),
+        "blocks_alive": len(live_blocks),
+        "probes": len(sample),
+        "probes_alive": len(alive),
+        "hit_ratio": round(len(live_blocks) / len(blocks), 4),
+        "live_blocks": live_blocks,
+    }
+    write_text(str(agg_dir / "sampling.json"), json.dumps(stats, ensure_ascii=False, indent=2))
+    return whole + live_blocks
+
+
+def _ftp_source(cfg: Dict[str, object], idx: int) -> Dict[str, object] | None:
     host = cfg.get("host") or cfg.get("server")
     if not host:
         return None
-
     return {
+        "name": str(cfg.get("name") or f"ftp{idx}"),
         "host": host,
+        "port": int(cfg.get("port") or 21),
         "user": cfg.get("user") or cfg.get("username") or "anonymous",
         "password": cfg.get("password") or cfg.get("pass") or "anonymous@",
         "path": cfg.get("path") or "/targets.txt",
-        "protocol": cfg.get("protocol") or cfg.get("scheme") or "ftp",
+        "protocol": str(cfg.get("protocol") or cfg.get("scheme") or "ftp").lower(),
+        "timeout": float(cfg.get("timeout") or 15),
     }
 
 
-def load_ftp_targets(project_root: Path, agg_dir: Path, env: Dict[str, str]) -> List[str]:
+def _load_ftp_cfg_from_yaml(project_root: Path) -> List[Dict[str, object]] | None:
     """
-    1) Пытаемся прочитать config/ftp.yaml
+    config/ftp.yaml: либо один источник (host/user/password/path/...),
+    либо список sources: [{name, host, ...}, ...].
+    """
+    cfg_path = project_root / "config" / "ftp.yaml"
+    if not cfg_path.exists():
+        return None
+    try:
+        cfg = yaml.safe_load(cfg_path.read_text()) or {}
+    except Exception as e:
+        print(f"[01] aggregation: WARNING: failed to parse ftp.yaml: {e}", file=sys.stderr)
+        return None
+
+    items = cfg.get("sources") if isinstance(cfg.get("sources"), list) else [cfg]
+    sources = [_ftp_source(c, i) for i, c in enumerate(items) if isinstance(c, dict)]
+    sources = [s for s in sources if s]
+    return sources or None
+
+
+def fetch_ftp_targets(project_root: Path, agg_dir: Path, env: Dict[str, str]) -> Path:
+    """
+    1) Пытаемся прочитать config/ftp.yaml (один или несколько источников)
     2) Если нет — смотрим переменные окружения FTP_HOST/FTP_USER/FTP_PASS/FTP_PATH
-    3) Если и там ничего — возвращаем пустой список
+    3) Если и там ничего — пустой raw_ftp.txt
+    Источники качаются параллельно, в процессе (ftplib), с локальным кэшем
+    в AUTOPEN_HOME/state/ftp: неизменившиеся (MDTM/SIZE) файлы не перекачиваются.
+    Возвращает путь к agg_dir/raw_ftp.txt.
     """
-    cfg = _load_ftp_cfg_from_yaml(project_root)
+    out_file = agg_dir / "raw_ftp.txt"
+    sources = _load_ftp_cfg_from_yaml(project_root)
 
-    if cfg is None:
+    if sources is None:
         host = env.get("FTP_HOST") or ""
         if not host:
-            return []
-        cfg = {
-            "host": host,
-            "user": env.get("FTP_USER") or "anonymous",
-            "password": env.get("FTP_PASS") or "anonymous@",
-            "path": env.get("FTP_PATH") or "/targets.txt",
-            "protocol": env.get("FTP_PROTO") or "ftp",
-        }
+            write_lines(out_file, [])
+            return out_file
+        sources = [
+            _ftp_source(
+                {
+                    "host": host,
+                    "port": env.get("FTP_PORT"),
+                    "user": env.get("FTP_USER"),
+                    "password": env.get("FTP_PASS"),
+                    "path": env.get("FTP_PATH"),
+                    "protocol": env.get("FTP_PROTO"),
+                },
+                0,
+            )
+        ]
+
+    results = fetch_sources(sources, project_root / "state" / "ftp")
+
+    # склеиваем источники в raw_ftp.txt потоково, построчно
+    def _lines():
+        for name, path, status in results:
+            n = 0
+            for line in iter_lines(path):
+                n += 1
+                yield line
+            print(f"[01] aggregation: ftp source {name}: {status}, lines={n}", file=sys.stderr)
+
+    write_lines(out_file, _lines())
+    return out_file
 
-    url = f"{cfg['protocol']}://{cfg['user']}:{cfg['password']}@{cfg['host']}{cfg['path']}"
-    out_file = agg_dir / "raw_ftp.txt"
-    cmd = f'curl -m 15 --silent --show-error "{url}" -o "{out_file}" || true'
-    subprocess.run(["bash", "-lc", cmd], check=False)
 
-    return read_lines(out_file)
+def load_ftp_targets(project_root: Path, agg_dir: Path, env: Dict[str, str]) -> List[str]:
+    """Список строк из FTP-источников (см. fetch_ftp_targets)."""
+    return read_lines(fetch_ftp_targets(project_root, agg_dir, env))
 
 
-def aggregate(run_dir: str, env: Dict[str, str]) -> Dict[str, object]:
+def aggregate(
+    run_dir: str,
+    env: Dict[str, str],
+    on_alive: Callable[[str, float | None], None] | None = None,
+) -> Dict[str, object]:
     """
     Главный вход: собираем цели из FTP, локального файла, TG-файла, autodiscovery.
     run_dir: /workspace/out/<run_id>
+    on_alive: колбэк, получающий живые хосты по мере их обнаружения.
     """
     run_path = Path(run_dir)
     project_root = run_path.parents[1]  # /workspace
     agg_dir = run_path / "01-aggregated"
     agg_dir.mkdir(parents=True, exist_ok=True)
 
-    # --- 1. Источники целевых хостов ---
-    ftp_lines = load_ftp_targets(project_root, agg_dir, env)
-
+    # --- 1. Источники целевых хостов (файлы, читаются потоково) ---
+    ftp_file = fetch_ftp_targets(project_root, agg_dir, env)
     tg_file = project_root / "data" / "incoming" / "targets_tg.txt"
-    tg_lines = read_lines(str(tg_file))
-
     local_file = project_root / "config" / "targets.txt"
-    local_lines = read_lines(str(local_file))
 
     auto_nets: List[str] = discovery.routes_cidr() if env.get("AUTO_DISCOVERY", "1") == "1" else []
 
-    # --- 2. Объединяем «сырой» список ---
-    raw_all = sorted(set(ftp_lines + tg_lines + local_lines + auto_nets))
+    live_cfg = load_liveness(project_root)
+    if env.get("LIVENESS_ENGINE"):
+        live_cfg.engine = env["LIVENESS_ENGINE"].lower()
+    if env.get("LIVENESS_CACHE") == "0":
+        live_cfg.cache = False
+    exclusions = load_exclusions(project_root)
+    # глобальный бюджет проб; пока параллельно идут потоковые батчи — только доля
+    throttle = load_throttle(project_root)
+    live_cfg.pps = throttle.pps
+    if on_alive is not None and throttle.pps:
+        live_cfg.pps = max(1, int(throttle.pps * throttle.liveness_share))
+
+    # --- 1a. Широкие автосети: пробуем выборку в каждом блоке, целиком — только живые блоки ---
+    if auto_nets:
+        auto_nets = sample_autodiscovery(
+            auto_nets, load_discovery(project_root), live_cfg, exclusions, agg_dir, throttle
+        )
 
     # сохраняем сырые источники
-    write_text(str(agg_dir / "raw_tg.txt"), "\n".join(tg_lines))
-    write_text(str(agg_dir / "raw_local.txt"), "\n".join(local_lines))
-    write_text(str(agg_dir / "raw_all.txt"), "\n".join(raw_all))
-    write_text(str(agg_dir / "raw_autodiscovery.txt"), "\n".join(auto_nets))
-
-    # --- 3. Если совсем пусто — просто создаём пустые файлы и выходим ---
-    if not raw_all:
-        write_text(str(agg_dir / "expanded.txt"), "")
+    write_lines(agg_dir / "raw_tg.txt", iter_lines(tg_file))
+    write_lines(agg_dir / "raw_local.txt", iter_lines(local_file))
+    write_lines(agg_dir / "raw_autodiscovery.txt", auto_nets)
+
+    # --- 2. Хэши и счётчики источников (один потоковый проход по каждому) ---
+    source_files: Dict[str, Path] = {
+        "ftp": ftp_file,
+        "tg": agg_dir / "raw_tg.txt",
+        "local": agg_dir / "raw_local.txt",
+        "autodiscovery": agg_dir / "raw_autodiscovery.txt",
+    }
+    hashes: Dict[str, str] = {}
+    counts: Dict[str, int] = {}
+    for name, path in source_files.items():
+        hashes[name], counts[name] = lines_digest(iter_lines(path))
+    hashes["exclude"] = lines_hash(iter_lines(exclude_file(project_root)))
+    # порядок и вид expanded.txt тоже часть ключа: иначе reuse оставит прошлый
+    # порядок обхода (или expanded.txt, которого с lazy_text быть не должно, и наоборот)
+    lazy_text = load_target_files(project_root).lazy_text
+    hashes["order"] = f"{throttle.order}/{throttle.block_prefix}"
+    hashes["lazy_text"] = str(int(lazy_text))
+
+    def _all_lines():
+        for path in source_files.values():
+            yield from iter_lines(path)
+
+    state = AggState.load(project_root) if env.get("AGG_INCREMENTAL", "1") == "1" else None
+    expanded = state.expanded() if state is not None and state.unchanged(hashes) else None
+
+    def _source_sets():
+        # при включённом состоянии разворачиваются только изменившиеся источники
+        sets: Dict[str, TargetSet] = {}
+        reused: List[str] = []
+        for name, path in source_files.items():
+            if state is None:
+                sets[name] = TargetSet(iter_lines(path))
+                continue
+            sets[name], hit = state.source_set(name, hashes[name], iter_lines(path))
+            if hit:
+                reused.append(name)
+        return sets, reused
+
+    if expanded is not None:
+        # --- 3-4. Источники не менялись: берём прошлое расширение как есть ---
+        prev_dir = state.prev_agg_dir()
+        for name in ("raw_all.txt", "expanded.bin", "expanded.txt"):
+            if (prev_dir / name).exists():
+                link_or_copy(prev_dir / name, agg_dir / name)
+        if not (agg_dir / "expanded.bin").exists():
+            write_target_file(agg_dir / "expanded.bin", expanded)
+        raw_all_cnt = int(state.data.get("raw_all", 0))
+        excluded = int(state.data.get("excluded", 0))
+        agg_mode = "reuse"
+        source_sets, _ = _source_sets()
+    else:
+        # --- 3. Объединяем «сырой» список (потоково, дубли схлопнет расширение) ---
+        raw_all_cnt = write_lines(agg_dir / "raw_all.txt", _all_lines())
+
+        # --- 4. Расширение (диапазоны/CIDR -> интервалы IP + hostnames) ---
+        # по источникам отдельно: их множества нужны и для provenance
+        source_sets, reused = _source_sets()
+        expanded = TargetSet()
+        for ts in source_sets.values():
+            expanded = expanded | ts
+        agg_mode = "delta" if reused else "full"
+
+        # --- 4a. Исключения из config/exclude.txt (вычитание интервалов) ---
+        excluded = 0
+        if exclusions:
+            before = len(expanded)
+            expanded = expanded - exclusions
+            excluded = before - len(expanded)
+        # expanded.bin — компактные интервалы (mmap); expanded.txt — по требованию
+        write_target_file(agg_dir / "expanded.bin", expanded)
+        if not lazy_text:
+            write_lines(agg_dir / "expanded.txt", target_order(expanded, throttle))
+
+    # --- 4b. Происхождение целей: маска источников на интервал/hostname ---
+    prov = Provenance.build(source_sets, exclusions)
+    prov_stats: Dict[str, Dict[str, int]] = {"targets": prov.counts()}
+    prov.save(agg_dir / "provenance.json", prov_stats)
+
+    if state is not None:
+        try:
+            state.save(hashes, agg_dir, expanded, {"raw_all": raw_all_cnt, "excluded": excluded})
+        except Exception as e:
+            print(f"[01] aggregation: WARNING: failed to save aggregate state: {e}", file=sys.stderr)
+
+    # --- Если совсем пусто — просто создаём пустые файлы и выходим ---
+    if not raw_all_cnt:
         write_text(str(agg_dir / "alive.txt"), "")
+        write_text(str(agg_dir / "alive_ips.txt"), "")
         return {
-            "ftp": len(ftp_lines),
-            "tg": len(tg_lines),
-            "local": len(local_lines),
-            "autodiscovery": len(auto_nets),
+            "ftp": counts["ftp"],
+            "tg": counts["tg"],
+            "local": counts["local"],
+            "autodiscovery": counts["autodiscovery"],
             "raw_all": 0,
-            "expanded": [],
+            "excluded": 0,
+            "aggregation": agg_mode,
+            "expanded": TargetSet(),
             "alive": [],
+            "alive_ips": [],
+            "host_map": {},
+            "endpoints": 0,
+            "rtt": {},
+            "loss": {},
+            "liveness": {},
+            "provenance": prov_stats,
         }
 
-    # --- 4. Расширение (диапазоны/CIDR -> отдельные IP/host) ---
-    expanded = expand_targets(raw_all)
-    write_text(str(agg_dir / "expanded.txt"), "\n".join(expanded))
+    # --- 4c. Резолвинг hostnames (параллельно, с кэшем) ---
+    # IP-часть пробуем как есть, hostnames — по их адресам (каждый IP один раз)
+    dns_cfg = load_dns(project_root)
+    host_map: Dict[str, List[str]] = {}
+    probe = expanded
+    if expanded.hostnames and dns_cfg.enabled:
+        host_map = resolve_hosts(
+            expanded.hostnames,
+            home=project_root,
+            concurrency=dns_cfg.concurrency,
+            timeout=dns_cfg.timeout,
+            default_ttl=dns_cfg.ttl,
+        )
+        # адреса из исключений не трогаем и через hostname
+        host_map = {h: [ip for ip in ips if ip not in exclusions] for h, ips in host_map.items()}
+        probe = expanded.ip_set()
+        for ips in host_map.values():
+            for ip in ips:
+                probe.add_ip(ip)
+        write_text(str(agg_dir / "hosts_map.json"), json.dumps(host_map, ensure_ascii=False, indent=2))
+        write_text(
+            str(agg_dir / "unresolved.txt"),
+            "\n".join(h for h, ips in host_map.items() if not ips),
+        )
 
     # --- 5. Живые хосты через fping/TCP ---
-    alive = fping_alive(expanded)
-
-    write_text(str(agg_dir / "alive.txt"), "\n".join(alive))
+    # on_alive получает цели в исходных терминах: IP из скоупа и имена по их адресам
+    emit = on_alive
+    if on_alive is not None and host_map:
+        ip_names: Dict[str, List[str]] = {}
+        for h, ips in host_map.items():
+            for ip in ips:
+                ip_names.setdefault(ip, []).append(h)
+
+        def emit(ip: str, r: float | None) -> None:
+            if ip in expanded:
+                on_alive(ip, r)
+            for name in ip_names.get(ip, ()):
+                on_alive(name, r)
+
+    # цели идут вперемешку по подсетям, чтобы не упираться в лимиты одного /24
+    live_stats: Dict[str, object] = {"order": throttle.order, "pps": live_cfg.pps}
+    probe_view = target_order(probe, throttle)
+    ip_loss: Dict[str, float] = {}
+    if live_cfg.cache:
+        # соседи из ARP-таблицы ядра — бесплатная подсказка живости
+        hints = [ip for ip in discovery.neighbours() if ip in probe]
+        write_text(str(agg_dir / "neighbours.txt"), "\n".join(hints))
+        ip_rtt = probe_alive_cached(
+            project_root, probe_view, live_cfg, on_alive=emit, stats=live_stats, hints=hints, loss=ip_loss
+        )
+    else:
+        ip_rtt = probe_alive(probe_view, live_cfg, on_alive=emit, stats=live_stats, loss=ip_loss)
+    write_text(str(agg_dir / "liveness.json"), json.dumps(live_stats, ensure_ascii=False, indent=2))
+
+    # alive.txt — в терминах исходных целей (IP + имена для name-aware тулов),
+    # alive_ips.txt — уникальные адреса для IP-level тулов (nmap и т.п.)
+    rtt = alive_by_name(ip_rtt, expanded, host_map)
+    # в том же порядке обхода, что и проверка живости (а не в порядке ответов)
+    alive = list(target_order(TargetSet(rtt), throttle))
+    alive_ips = list(target_order(TargetSet(ip_rtt), throttle))
+
+    write_lines(agg_dir / "alive.txt", alive)
+    write_lines(agg_dir / "alive_ips.txt", alive_ips)
+    write_target_file(agg_dir / "alive.bin", TargetSet(alive))
+
+    # --- 5a. RTT/потери -> подсказки таймаутов плагинам (rtt.tsv, {{timeout_ms}}) ---
+    loss = alive_by_name(ip_loss, expanded, host_map)
+    tcfg = load_timeouts(project_root)
+    max_timeout = write_rtt_file(agg_dir / "rtt.tsv", alive, rtt, loss, tcfg)
+    write_rtt_file(agg_dir / "rtt_ips.tsv", alive_ips, ip_rtt, ip_loss, tcfg)
+    write_text(str(agg_dir / "timeout_ms.txt"), str(max_timeout))
+
+    # живые по источникам (для распределения стоимости скана)
+    prov.add_resolved(host_map)
+    prov_stats["alive"] = prov.counts(alive)
+    prov.save(agg_dir / "provenance.json", prov_stats)
+
+    # --- 6. Endpoint'ы (URL, host:port) живых хостов: web-тулы бьют только по ним,
+    # nmap может ограничиться известными портами ---
+    alive_eps = {h: list(expanded.endpoints[h]) for h in alive if h in expanded.endpoints}
+    write_lines(agg_dir / "endpoints.txt", (ep for eps in alive_eps.values() for ep in eps))
+    write_text(str(agg_dir / "endpoints.json"), json.dumps(alive_eps, ensure_ascii=False, indent=2))
+    ports = sorted({p for eps in alive_eps.values() for p in map(endpoint_port, eps) if p})
+    write_text(str(agg_dir / "endpoint_ports.txt"), ",".join(map(str, ports)))
+    write_target_file(agg_dir / "alive_ips.bin", TargetSet(alive_ips))
 
     return {
-        "ftp": len(ftp_lines),
-        "tg": len(tg_lines),
-        "local": len(local_lines),
-        "autodiscovery": len(auto_nets),
-        "raw_all": len(raw_all),
+        "ftp": counts["ftp"],
+        "tg": counts["tg"],
+        "local": counts["local"],
+        "autodiscovery": counts["autodiscovery"],
+        "raw_all": raw_all_cnt,
+        "excluded": excluded,
+        "aggregation": agg_mode,
         "expanded": expanded,
         "alive": alive,
+        "alive_ips": alive_ips,
+        "host_map": host_map,
+        "endpoints": sum(len(v) for v in alive_eps.values()),
+        "rtt": rtt,
+        "loss": loss,
+        "liveness": live_stats,
+        "provenance": prov_stats,
     }
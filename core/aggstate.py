@@ -0,0 +1,114 @@
+# core/aggstate.py
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+import sys
+from typing import Dict, Iterable, Optional, Tuple
+
+from .targets import TargetSet
+
+
+def lines_digest(lines: Iterable[str]) -> Tuple[str, int]:
+    """sha256 содержимого источника (по нормализованным строкам) и число строк — за один проход."""
+    h = hashlib.sha256()
+    n = 0
+    for line in lines:
+        h.update(line.encode("utf-8", errors="replace"))
+        h.update(b"\n")
+        n += 1
+    return h.hexdigest(), n
+
+
+def lines_hash(lines: Iterable[str]) -> str:
+    return lines_digest(lines)[0]
+
+
+def link_or_copy(src: pathlib.Path, dst: pathlib.Path) -> None:
+    """Хардлинк (мгновенно, без копирования данных), если нельзя — копия."""
+    if dst.exists():
+        dst.unlink()
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+class AggState:
+    """
+    Состояние последней агрегации: AUTOPEN_HOME/state/aggregate/
+      state.json        — хэши источников, путь к 01-aggregated прошлого прогона
+      src_<name>.json   — развёрнутый TargetSet каждого источника (интервалы)
+      expanded.json     — итоговый TargetSet после исключений
+    """
+
+    def __init__(self, root: pathlib.Path):
+        self.root = pathlib.Path(root)
+        self.data: Dict[str, object] = {}
+
+    @classmethod
+    def load(cls, home: pathlib.Path) -> "AggState":
+        st = cls(pathlib.Path(home) / "state" / "aggregate")
+        p = st.root / "state.json"
+        if p.exists():
+            try:
+                st.data = json.loads(p.read_text(encoding="utf-8")) or {}
+            except Exception as e:
+                print(f"[01] aggregation: WARNING: aggregate state is broken, ignoring: {e}", file=sys.stderr)
+                st.data = {}
+        return st
+
+    def _write_json(self, name: str, obj) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.root / (name + ".tmp")
+        tmp.write_text(json.dumps(obj, separators=(",", ":")), encoding="utf-8")
+        os.replace(tmp, self.root / name)
+
+    def _read_set(self, name: str) -> Optional[TargetSet]:
+        p = self.root / name
+        if not p.exists():
+            return None
+        try:
+            return TargetSet.from_dict(json.loads(p.read_text(encoding="utf-8")))
+        except Exception:
+            return None
+
+    # --- решения ---
+
+    @property
+    def hashes(self) -> Dict[str, str]:
+        return dict(self.data.get("sources") or {})
+
+    def prev_agg_dir(self) -> Optional[pathlib.Path]:
+        d = self.data.get("agg_dir")
+        if not d:
+            return None
+        p = pathlib.Path(str(d))
+        if (p / "expanded.bin").exists() or (p / "expanded.txt").exists():
+            return p
+        return None
+
+    def unchanged(self, hashes: Dict[str, str]) -> bool:
+        return self.hashes == hashes and self.prev_agg_dir() is not None
+
+    def source_set(self, name: str, digest: str, lines: Iterable[str]) -> Tuple[TargetSet, bool]:
+        """
+        TargetSet источника: из состояния, если хэш не изменился,
+        иначе разворачиваем заново (и сохраняем). Второй элемент — reused.
+        """
+        if self.hashes.get(name) == digest:
+            ts = self._read_set(f"src_{name}.json")
+            if ts is not None:
+                return ts, True
+        ts = TargetSet(lines)
+        self._write_json(f"src_{name}.json", ts.to_dict())
+        return ts, False
+
+    def expanded(self) -> Optional[TargetSet]:
+        return self._read_set("expanded.json")
+
+    def save(self, hashes: Dict[str, str], agg_dir: pathlib.Path, expanded: TargetSet, extra: Dict[str, object]) -> None:
+        self._write_json("expanded.json", expanded.to_dict())
+        self.data = {"sources": hashes, "agg_dir": str(agg_dir), **extra}
+        self._write_json("state.json", self.data)
@@ -1,8 +1,22 @@
-import argparse, os, uuid, datetime, pathlib, sys, json, traceback
-from core.pipeline import load_pipeline
-from core.pipeline import load_pipeline
-from core.plugins import run_plugin
+import argparse, os, uuid, datetime, pathlib, sys, json, threading, time, traceback
+from core.pipeline import (
+    load_cache, load_images, load_incremental, load_pipeline, load_pool, load_streaming, load_throttle,
+    load_timeouts,
+)
+from core.rtt import write_rtt_file
+from core.utils import read_lines
+from core.executor import TIMEOUT_RC
+from core.images import prepull
+from core.plugins import batch_dir, ensure_text_views, load_plugin, plugin_streamable, run_plugin, split_rate
+from core.registry import plugin_spec, validate as validate_specs
+from core.plugcache import PluginCache
+from core.pool import PoolManager, pool_volumes
+from core.streaming import BatchStreamer
+from core.scheduler import load_step_times, run_dag, save_step_times
 from core.parse_engine import parse_and_merge
+from core.incremental import ScanState, carried_assets, carry_findings, narrow_aggregated
+from core.provenance import Provenance
+from core.scope import load_exclusions
 from core.report_html import load_findings, render_html
 from core.pdf import html_to_pdf
 from . import aggregator
@@ -15,7 +29,21 @@ def _mk(p: pathlib.Path):
     p.mkdir(parents=True, exist_ok=True)
     return p
 
-def _write_metrics_empty_run(home: pathlib.Path, rid: str, reason: str) -> None:
+def _liveness_metrics(rid: str, live: dict) -> list:
+    """Строки .prom по этапу проверки живости: общее время и время каждого шарда fping."""
+    if not live:
+        return []
+    lines = [
+        f'autopen_liveness_seconds{{run_id="{rid}",engine="{live.get("engine", "")}"}} {live.get("seconds", 0)}'
+    ]
+    for sh in live.get("shards") or []:
+        lbl = f'run_id="{rid}",shard="{sh["shard"]}"'
+        lines.append(f"autopen_liveness_shard_seconds{{{lbl}}} {sh['seconds']}")
+        lines.append(f"autopen_liveness_shard_hosts{{{lbl}}} {sh['hosts']}")
+        lines.append(f"autopen_liveness_shard_alive{{{lbl}}} {sh['alive']}")
+    return lines
+
+def _write_metrics_empty_run(home: pathlib.Path, rid: str, reason: str, extra: list | None = None) -> None:
     """
     Записать метрики для случая, когда мы решили не запускать тулзы
     (нет целей / нет alive). run_status=0, findings_total=0.
@@ -31,11 +59,94 @@ def _write_metrics_empty_run(home: pathlib.Path, rid: str, reason: str) -> None:
                 "autopen_tools_errors 0",
                 f'autopen_empty_reason{{run_id="{rid}"}} "{reason}"',
             ]
+            + (extra or [])
         )
         + "\n",
         encoding="utf-8",
     )
 
+def _prepull_images(home, pipe) -> dict:
+    """
+    Pre-flight [02]: образы всех шагов pipeline.steps — локально (параллельно),
+    digest'ы — в state/images.json. Сводка для .prom (пусто — нечего делать).
+    """
+    cfg = load_images(home)
+    if not cfg.prepull:
+        return {}
+    images = []
+    for step in pipe.steps:
+        img = str(load_plugin(home, step).get("image") or "")
+        # образ из шаблона ({{...}}) заранее не известен
+        if img and img != "none" and "{{" not in img:
+            images.append(img)
+    if not images:
+        return {}
+    t0 = time.monotonic()
+    res = prepull(home, images, cfg.workers, cfg.pull_timeout, cfg.recheck)
+    secs = round(time.monotonic() - t0, 3)
+    for img, r in res.items():
+        if r["error"] or r["warning"]:
+            print(f"[02] images: WARNING: {img}: {r['error'] or r['warning']}")
+    ready = sum(1 for r in res.values() if r["id"])
+    pulled = sum(1 for r in res.values() if r["pulled"])
+    checked = sum(1 for r in res.values() if r["checked"])
+    print(f"[02] images: ready={ready}/{len(res)} pulled={pulled} rechecked={checked} in {secs}s")
+    return {"seconds": secs, "images": len(res), "pulled": pulled, "failed": len(res) - ready}
+
+def _prepull_metrics(rid: str, st: dict) -> list:
+    if not st:
+        return []
+    return [
+        f'autopen_image_prepull_seconds{{run_id="{rid}"}} {st["seconds"]}',
+        f'autopen_images_pulled{{run_id="{rid}"}} {st["pulled"]}',
+        f'autopen_images_failed{{run_id="{rid}"}} {st["failed"]}',
+    ]
+
+def _stream_rate(home, workers: int) -> int:
+    """
+    {{rate}} потокового батча: пока идёт [01], бюджет делят проверка живости
+    (throttle.liveness_share) и параллельные батчи. 0 — без ограничения.
+    """
+    th = load_throttle(home)
+    return split_rate(th.pps * (1 - th.liveness_share), workers)
+
+def _run_stream_batch(home, rid, steps, targets_file, batch_id, continues, rate=0, rtt=None, pools=None):
+    """
+    Прогнать один батч живых хостов по всем потоковым шагам (по порядку).
+    continues(step) — продолжать ли батч после ошибки шага.
+    rtt — RTT хостов из проверки живости: батч получает свой {{rtt_file}}
+    и {{timeout_ms}} по самому медленному хосту именно этого батча.
+    """
+    errors = []
+    targets_file = pathlib.Path(targets_file)
+    rtt_file = targets_file.with_suffix(".rtt.tsv")
+    timeout_ms = write_rtt_file(rtt_file, read_lines(targets_file), rtt or {}, {}, load_timeouts(home))
+    for i, step in steps:
+        ctx = {
+            "targets_file": str(targets_file),
+            "batch_id": batch_id,
+            "out_dir": str(batch_dir(home, rid, step, batch_id)),
+            "rtt_file": str(rtt_file),
+            "timeout_ms": timeout_ms,
+        }
+        if rate:
+            ctx["rate"] = rate
+        try:
+            rc = run_plugin(home, rid, step, ctx, pools=pools)
+        except Exception as e:
+            errors.append({"step": step, "batch": batch_id, "error": str(e)})
+            print(f"[02.{i:02d}] {step} batch {batch_id}: ERROR -> {e}")
+            if not continues(step):
+                break
+            continue
+        if rc != 0:
+            why = "timeout" if rc == TIMEOUT_RC else f"exit {rc}"
+            errors.append({"step": step, "batch": batch_id, "error": why})
+            print(f"[02.{i:02d}] {step} batch {batch_id}: ERROR ({why})")
+        else:
+            print(f"[02.{i:02d}] {step} batch {batch_id}: ok")
+    return errors
+
 def cmd_run(args):
     home = pathlib.Path(os.getenv("AUTOPEN_HOME", "/workspace"))
     out_root = _mk(home / "out")
@@ -70,6 +181,9 @@ def cmd_run(args):
 
     errors = []
     pdf_failed = 0
+    streamer = None
+    pools = None
+    incremental = getattr(args, "incremental", False)
 
     try:
         # 00: meta
@@ -84,16 +198,81 @@ def cmd_run(args):
             encoding="utf-8",
         )
 
+        pipe = load_pipeline(home)
+        # plugins.d/parsers.d проверяем целиком до [01], а не на первом батче
+        spec_errors = validate_specs(home, pipe.steps)
+        if spec_errors:
+            for e in spec_errors:
+                print(f"[ERROR] config: {e}")
+            sys.exit(2)
+        # тёплые контейнеры для плагинов с exec: — на весь прогон
+        pool_cfg = load_pool(home)
+        try:
+            if pool_cfg.enabled:
+                pools = PoolManager(home, rid, pool_cfg, pipe.concurrency)
+            elif any(plugin_spec(home, s).exec is not None for s in pipe.steps):
+                # exec без пула — docker run --rm с тем же томом
+                pool_volumes(home, pool_cfg)
+        except ValueError as e:
+            print(f"[ERROR] config: {e}")
+            sys.exit(2)
+
+        # образы шагов тянем параллельно с [01], а не внутри первого docker run шага
+        prepull_stats = {}
+
+        def _prepull():
+            try:
+                prepull_stats.update(_prepull_images(home, pipe))
+            except Exception as e:
+                print(f"[02] images: WARNING: pre-pull failed: {e}")
+
+        prepull_thread = threading.Thread(target=_prepull, name="prepull", daemon=True)
+        prepull_thread.start()
+
+        # шаги, умеющие работать по батчам ({{targets_file}}), в конвейерном режиме
+        # стартуют прямо во время [01] — на уже найденных живых хостах
+        # (кроме шагов с needs: им нужно дождаться других шагов)
+        stream_cfg = load_streaming(home)
+        stream_steps = []
+        if incremental and (getattr(args, "pipelined", False) or stream_cfg.enabled):
+            # батчам нужен уже суженный список живых, его нет до конца [01]
+            print("[02] pipeline: --incremental — потоковый режим отключён")
+        elif getattr(args, "pipelined", False) or stream_cfg.enabled:
+            stream_steps = [
+                (i, s)
+                for i, s in enumerate(pipe.steps, 1)
+                if not pipe.spec(s).needs and plugin_streamable(home, s)
+            ]
+        if stream_steps:
+            # потоковые батчи стартуют во время [01] — образы нужны сразу
+            prepull_thread.join()
+            stream_rate = _stream_rate(home, pipe.concurrency)
+            streamer = BatchStreamer(
+                rid_root / "02-scan" / "_stream",
+                lambda path, bid: _run_stream_batch(
+                    home, rid, stream_steps, path, bid, pipe.continues, stream_rate,
+                    streamer.rtt, pools,
+                ),
+                batch_size=stream_cfg.batch_size,
+                flush_seconds=stream_cfg.flush_seconds,
+                workers=pipe.concurrency,
+            ).start()
+            print(f"[02] pipeline: streaming steps={[s for _, s in stream_steps]}")
+
         # [01] aggregation
         run_dir = str(rid_root)      # /workspace/out/<run_id>
         env = dict(os.environ)       # FTP_*, AUTO_DISCOVERY и т.п.
-        agg_res = aggregator.aggregate(run_dir, env)
+        agg_res = aggregator.aggregate(
+            run_dir, env, on_alive=streamer.push if streamer else None
+        )
 
         local_cnt = agg_res.get("local", 0) or 0
         ftp_cnt = agg_res.get("ftp", 0) or 0
         autodiscovery_cnt = agg_res.get("autodiscovery", 0) or 0
         raw_all_cnt = agg_res.get("raw_all", 0) or 0
+        excluded_cnt = agg_res.get("excluded", 0) or 0
         alive = agg_res.get("alive") or []
+        live_metrics = _liveness_metrics(rid, agg_res.get("liveness") or {})
 
         print(
             "[01] aggregation: "
@@ -101,7 +280,9 @@ def cmd_run(args):
             f"ftp={ftp_cnt} "
             f"autodiscovery={autodiscovery_cnt} "
             f"raw_all={raw_all_cnt} "
-            f"alive={len(alive)}"
+            f"excluded={excluded_cnt} "
+            f"alive={len(alive)} "
+            f"mode={agg_res.get('aggregation', 'full')}"
         )
 
         # если вообще нет целей — выходим без запуска тулов
@@ -113,13 +294,44 @@ def cmd_run(args):
         # если есть цели, но никто не живой — тоже не запускаем тулзы
         if not alive:
             print("[01] aggregation: ни один хост не отвечает (alive=0) — тулзы не запускаем")
-            _write_metrics_empty_run(home, rid, reason="no_alive")
+            _write_metrics_empty_run(home, rid, reason="no_alive", extra=live_metrics)
             return
 
         print("[01] aggregation: ok")
 
-        # 02: scan — читаем внешний pipeline и запускаем реальные шаги
-        pipe = load_pipeline(home)
+        # --incremental: сканируем только новые и давно не сканированные хосты,
+        # находки остальных переносим из прошлого успешного прогона
+        host_map = agg_res.get("host_map") or {}
+        scan_hosts, carry_hosts = alive, []
+        inc_state = ScanState.load(home)
+        prev_merge = None
+        if incremental:
+            if inc_state.run_id:
+                prev_merge = out_root / inc_state.run_id / "03-merge" / "findings_merged.ndjson"
+            if prev_merge is None or not prev_merge.exists():
+                print("[02] incremental: нет прошлого успешного прогона — сканируем всё")
+                inc_state.scanned = {}
+            scan_hosts, carry_hosts = inc_state.split(alive, load_incremental(home))
+            narrow_aggregated(rid_root / "01-aggregated", scan_hosts, host_map)
+            (rid_root / "00-meta" / "incremental.json").write_text(
+                json.dumps(
+                    {"prev_run_id": inc_state.run_id, "scan": len(scan_hosts), "carry": len(carry_hosts)},
+                    ensure_ascii=False,
+                    indent=2,
+                ),
+                encoding="utf-8",
+            )
+            print(
+                f"[02] incremental: scan={len(scan_hosts)} carry={len(carry_hosts)} "
+                f"prev={inc_state.run_id or '-'}"
+            )
+
+        # 02: scan — запускаем реальные шаги (потоковые уже идут по батчам)
+        prepull_thread.join()
+        # lazy_text: текстовые списки целей — до шагов, а не по упоминанию в cmd
+        views = ensure_text_views(home, rid, pipe.steps)
+        if views:
+            print(f"[02] pipeline: text views: {', '.join(views)}")
         print(
             f"[02] pipeline: steps={pipe.steps}, "
             f"concurrency={pipe.concurrency}, "
@@ -127,23 +339,89 @@ def cmd_run(args):
         )
         scan_root = _mk(rid_root / "02-scan" / "_global")
 
-        for i, step in enumerate(pipe.steps, 1):
-            try:
-                rc = run_plugin(home, rid, step)
-                if rc != 0:
-                    errors.append({"step": step, "error": f"exit {rc}"})
-                    print(f"[02.{i:02d}] {step}: ERROR (exit {rc}) — продолжим")
-                else:
-                    print(f"[02.{i:02d}] {step}: ok")
-            except Exception as e:
-                errors.append({"step": step, "error": str(e)})
-                print(f"[02.{i:02d}] {step}: ERROR -> {e} — продолжим")
-                if not pipe.continue_on_error:
-                    raise
+        streamed = {s for _, s in stream_steps}
+        step_idx = {s: i for i, s in enumerate(pipe.steps, 1)}
+        stream_lock = threading.Lock()
+        stream_errors = None
+
+        def _finish_stream():
+            # потоковые шаги «завершаются», когда отработали все их батчи
+            nonlocal streamer, stream_errors
+            with stream_lock:
+                if stream_errors is None:
+                    stream_errors = streamer.close() if streamer is not None else []
+                    errors.extend(stream_errors)
+                    if streamer is not None:
+                        print(
+                            f"[02] pipeline: streamed batches={streamer.batches} hosts={streamer.hosts}"
+                        )
+                    streamer = None
+            return stream_errors
+
+        # бюджет pps делят шаги, которые могут идти одновременно (fanout-шаг
+        # делит свою долю ещё и между воркерами батчей)
+        step_rate = split_rate(
+            load_throttle(home).pps, min(pipe.concurrency, len(pipe.steps) - len(streamed))
+        )
+
+        def _run_step(step):
+            if step in streamed:
+                failed = [e for e in _finish_stream() if e.get("step") == step]
+                return f"{len(failed)} batch(es) failed" if failed else None
+            rc = run_plugin(home, rid, step, {"rate": step_rate}, pools=pools)
+            if rc == TIMEOUT_RC:
+                return "timeout"
+            return None if rc == 0 else f"exit {rc}"
+
+        def _step_done(step, res):
+            i = step_idx[step]
+            if res["status"] == "ok":
+                print(f"[02.{i:02d}] {step}: ok")
+                return
+            if res["status"] == "skipped":
+                print(f"[02.{i:02d}] {step}: SKIPPED ({res['error']})")
+            else:
+                tail = "продолжим" if pipe.continues(step) else "зависящие шаги пропускаем"
+                print(f"[02.{i:02d}] {step}: ERROR ({res['error']}) — {tail}")
+            # ошибки потоковых шагов уже учтены по батчам
+            if step not in streamed or res["status"] == "skipped":
+                errors.append({"step": step, "error": res["error"]})
+
+        # шаги — DAG по needs: независимые идут параллельно (до concurrency),
+        # первыми — шаги с самым длинным хвостом зависящих от них
+        if scan_hosts:
+            step_results = run_dag(pipe, _run_step, durations=load_step_times(home), on_done=_step_done)
+        else:
+            print("[02] incremental: новых и устаревших хостов нет — шаги не запускаем")
+            step_results = {}
+        _finish_stream()
+        if pools is not None:
+            pools.close()
+            pools = None
+        try:
+            save_step_times(home, step_results)
+        except Exception as e:
+            print(f"[WARN] run: failed to save step times: {e}")
+        cache_cfg = load_cache(home)
+        if cache_cfg.enabled:
+            pruned = PluginCache.load(home, cache_cfg).prune()
+            if pruned:
+                print(f"[02] cache: pruned {pruned} expired entries")
 
         # 03: merge
         n = parse_and_merge(rid_root, home)
         print(f"[03] merge: parsed={n}")
+        carried = 0
+        if carry_hosts:
+            carried = carry_findings(
+                prev_merge,
+                rid_root / "03-merge" / "findings_merged.ndjson",
+                carried_assets(carry_hosts, scan_hosts, host_map),
+                inc_state.run_id,
+                load_exclusions(home),
+                Provenance.load(rid_root / "01-aggregated"),
+            )
+            print(f"[03] merge: carried={carried} (из {inc_state.run_id})")
 
         # 04: report (HTML + попытка PDF; PDF-fail не валит весь run)
         rep_dir = _mk(rid_root / "04-report")
@@ -153,6 +431,13 @@ def cmd_run(args):
         html_path.write_text(html_str, encoding="utf-8")
         print("[04] report: html ok")
 
+        # прогон без ошибок шагов — база для следующего --incremental
+        if not errors:
+            try:
+                inc_state.save(rid, scan_hosts, carry_hosts)
+            except Exception as e:
+                print(f"[WARN] run: failed to save incremental state: {e}")
+
         pdf_path = rep_dir / "report.pdf"
         try:
             html_to_pdf(html_path, pdf_path)
@@ -173,12 +458,26 @@ def cmd_run(args):
                     f"autopen_findings_total {findings_total}",
                     f"autopen_pdf_failed {pdf_failed}",
                     f"autopen_tools_errors {tools_err}",
+                    f"autopen_hosts_scanned {len(scan_hosts)}",
+                    f"autopen_hosts_carried {len(carry_hosts)}",
+                    f"autopen_findings_carried {carried}",
+                ]
+                + [
+                    f'autopen_step_seconds{{run_id="{rid}",step="{st}",status="{res["status"]}"}} {res["seconds"]}'
+                    for st, res in step_results.items()
                 ]
+                + live_metrics
+                + _prepull_metrics(rid, prepull_stats)
             )
             + "\n",
             encoding="utf-8",
         )
     finally:
+        # потоковые батчи дожидаемся в любом случае (ранний выход/ошибка)
+        if streamer is not None:
+            streamer.close()
+        if pools is not None:
+            pools.close()
         # Снимаем lock в любом случае
         try:
             if lock_path.exists():
@@ -209,7 +508,18 @@ def cmd_stop(args):
 def main():
     p = argparse.ArgumentParser(prog="autopen")
     sub = p.add_subparsers(dest="cmd", required=True)
-    sub.add_parser("run").set_defaults(fn=cmd_run)
+    p_run = sub.add_parser("run")
+    p_run.add_argument(
+        "--pipelined",
+        action="store_true",
+        help="запускать шаги с {{targets_file}} по батчам прямо во время проверки живости",
+    )
+    p_run.add_argument(
+        "--incremental",
+        action="store_true",
+        help="сканировать только новые и давно не сканированные живые хосты, находки остальных перенести",
+    )
+    p_run.set_defaults(fn=cmd_run)
     sub.add_parser("status").set_defaults(fn=cmd_status)
     sub.add_parser("stop").set_defaults(fn=cmd_stop)
     args = p.parse_args()
@@ -1,30 +1,149 @@
 # core/discovery.py
-import subprocess
 import ipaddress
+import random
+import socket
+import struct
+from pathlib import Path
 
+# флаги маршрутов из <linux/route.h> / <linux/ipv6_route.h>
+RTF_UP = 0x0001
+RTF_GATEWAY = 0x0002
+RTF_REJECT = 0x0200
+RTF_CACHE = 0x01000000
+RTF_LOCAL = 0x80000000
 
-def routes_cidr() -> list[str]:
+# ARP: запись завершена (ATF_COM)
+ATF_COM = 0x02
+
+PROC_NET = Path("/proc/net")
+
+
+def _read_table(path: Path) -> list[list[str]]:
+    try:
+        return [line.split() for line in path.read_text().splitlines() if line.strip()]
+    except OSError:
+        return []
+
+
+def _ipv4_routes(proc: Path) -> list[str]:
+    """/proc/net/route: адреса/маски — hex little-endian."""
+    nets: list[str] = []
+    for cols in _read_table(proc / "route")[1:]:
+        if len(cols) < 8 or cols[0] == "lo":
+            continue
+        try:
+            flags = int(cols[3], 16)
+            dest = socket.inet_ntoa(struct.pack("<I", int(cols[1], 16)))
+            mask = socket.inet_ntoa(struct.pack("<I", int(cols[7], 16)))
+        except ValueError:
+            continue
+        # только поднятые линк-маршруты без шлюза; default (маска 0) пропускаем
+        if not flags & RTF_UP or flags & (RTF_GATEWAY | RTF_REJECT) or mask == "0.0.0.0":
+            continue
+        try:
+            nets.append(str(ipaddress.ip_network(f"{dest}/{mask}", strict=False)))
+        except ValueError:
+            continue
+    return nets
+
+
+def _ipv6_routes(proc: Path, min_prefix: int) -> list[str]:
     """
-    Берём линк-сети из `ip -o route` (Linux), исключаем default/loopback.
-    Возвращаем список строк вида '10.0.0.0/24'.
+    /proc/net/ipv6_route. IPv6-линк-сети обычно /64 — целиком их не перебрать,
+    поэтому берём только сети не шире /min_prefix.
     """
-    cmd = r"ip -o route | awk '$1 !~ /^(default|unreachable)$/ && $3 == \"link\" {print $1}'"
-    p = subprocess.run(
-        ["bash", "-lc", cmd],
-        capture_output=True,
-        text=True,
-        check=False,
-    )
     nets: list[str] = []
-    for line in p.stdout.splitlines():
-        s = line.strip()
-        if not s:
+    for cols in _read_table(proc / "ipv6_route"):
+        if len(cols) < 10 or cols[9] == "lo":
             continue
         try:
-            ipaddress.ip_network(s, strict=False)  # валидация
-            nets.append(s)
+            dest = ipaddress.IPv6Address(bytes.fromhex(cols[0]))
+            plen = int(cols[1], 16)
+            flags = int(cols[8], 16)
         except ValueError:
-            # вдруг какая-то странная строка в ip route
             continue
+        if not flags & RTF_UP or flags & (RTF_GATEWAY | RTF_REJECT | RTF_LOCAL | RTF_CACHE):
+            continue
+        if int(cols[4], 16) != 0 or plen == 0 or plen < min_prefix:
+            continue
+        if dest.is_link_local or dest.is_multicast or dest.is_loopback:
+            continue
+        nets.append(str(ipaddress.IPv6Network(f"{dest}/{plen}", strict=False)))
+    return nets
+
+
+def routes_cidr(proc: Path = PROC_NET, ipv6_min_prefix: int = 120) -> list[str]:
+    """
+    Линк-сети (без шлюза) из /proc/net/route и /proc/net/ipv6_route,
+    исключаем default/loopback/reject.
+    Возвращаем список строк вида '10.0.0.0/24'.
+    """
+    nets = _ipv4_routes(proc) + _ipv6_routes(proc, ipv6_min_prefix)
     # убираем дубли, сортируем
     return sorted(set(nets))
+
+
+def neighbours(proc: Path = PROC_NET) -> list[str]:
+    """
+    Уже известные ядру соседи из /proc/net/arp (только завершённые записи):
+    подсказка «скорее всего жив» для проверки живости.
+    IPv6-соседи в /proc не публикуются (только netlink) — их не берём.
+    """
+    out: list[str] = []
+    for cols in _read_table(proc / "arp")[1:]:
+        if len(cols) < 4:
+            continue
+        try:
+            flags = int(cols[2], 16)
+            ip = ipaddress.IPv4Address(cols[0])
+        except ValueError:
+            continue
+        if not flags & ATF_COM or cols[3] == "00:00:00:00:00:00":
+            continue
+        out.append(str(ip))
+    return sorted(set(out), key=lambda s: int(ipaddress.IPv4Address(s)))
+
+
+def sample_blocks(
+    nets: list[str],
+    ratio: float = 0.02,
+    hints: list[str] = (),
+    block_prefix: int = 24,
+) -> tuple[list[str], dict[str, list[str]]]:
+    """
+    Разреженная выборка для широких линк-сетей.
+    Сети не шире /block_prefix (и IPv6) возвращаются как есть (первый элемент),
+    остальные режутся на блоки /block_prefix, и для каждого блока берём выборку:
+    .1, .254 (шлюзовые адреса), известных соседей в блоке и ещё ~ratio адресов
+    (детерминированно — одни и те же от прогона к прогону).
+    Возвращает (сети целиком, блок -> адреса выборки).
+    """
+    whole: list[str] = []
+    blocks: dict[str, list[str]] = {}
+    by_block: dict[int, list[str]] = {}
+    for h in hints:
+        try:
+            a = ipaddress.IPv4Address(h)
+        except ValueError:
+            continue
+        by_block.setdefault(int(a) >> (32 - block_prefix), []).append(h)
+
+    for s in nets:
+        net = ipaddress.ip_network(s, strict=False)
+        if net.version != 4 or net.prefixlen >= block_prefix:
+            whole.append(s)
+            continue
+        for block in net.subnets(new_prefix=block_prefix):
+            base = int(block.network_address)
+            size = block.num_addresses
+            picks = {1, size - 2}
+            extra = max(0, int(round(ratio * (size - 2))))
+            if extra:
+                rnd = random.Random(base)
+                picks.update(rnd.sample(range(2, size - 2), min(extra, size - 4)))
+            sample = [str(ipaddress.IPv4Address(base + i)) for i in sorted(picks)]
+            for h in by_block.get(base >> (32 - block_prefix), []):
+                if h not in sample:
+                    sample.append(h)
+            blocks[str(block)] = sample
+    return whole, blocks
@@ -0,0 +1,147 @@
+# core/executor.py
+import asyncio
+import os
+import pathlib
+import signal
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Union
+
+# код возврата при таймауте (как у coreutils timeout)
+TIMEOUT_RC = 124
+
+_CHUNK = 64 * 1024
+
+
+class RotatingLog:
+    """
+    Лог с ограничением размера: при превышении max_bytes файл уходит в .1,
+    .1 -> .2 и т.д., старше backups — удаляются. Итого не больше
+    (backups + 1) * max_bytes на поток.
+    """
+
+    def __init__(self, path: Union[str, pathlib.Path], max_bytes: int, backups: int):
+        self.path = pathlib.Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max(1, int(max_bytes))
+        self.backups = max(0, int(backups))
+        self._fh = open(self.path, "ab")
+        self._size = self._fh.tell()
+
+    def _rotate(self) -> None:
+        self._fh.close()
+        if self.backups:
+            for i in range(self.backups - 1, 0, -1):
+                src = self.path.with_name(f"{self.path.name}.{i}")
+                if src.exists():
+                    os.replace(src, self.path.with_name(f"{self.path.name}.{i + 1}"))
+            os.replace(self.path, self.path.with_name(f"{self.path.name}.1"))
+        self._fh = open(self.path, "wb")
+        self._size = 0
+
+    def write(self, data: bytes) -> None:
+        while data:
+            room = self.max_bytes - self._size
+            if room <= 0:
+                self._rotate()
+                continue
+            part, data = data[:room], data[room:]
+            self._fh.write(part)
+            self._size += len(part)
+
+    def close(self) -> None:
+        self._fh.close()
+
+
+@dataclass
+class ExecResult:
+    rc: int
+    seconds: float
+    timed_out: bool = False
+    # последние строки stderr (для сообщения об ошибке)
+    tail: str = ""
+
+
+def _killpg(proc: asyncio.subprocess.Process, sig: int) -> None:
+    try:
+        os.killpg(proc.pid, sig)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+async def _pump(stream: asyncio.StreamReader, log: RotatingLog, keep: Optional[bytearray] = None) -> None:
+    while True:
+        chunk = await stream.read(_CHUNK)
+        if not chunk:
+            return
+        log.write(chunk)
+        if keep is not None:
+            keep += chunk
+            del keep[:-4096]
+
+
+async def run_command(
+    cmd: Union[str, List[str]],
+    log_dir: Union[str, pathlib.Path],
+    log_name: str,
+    timeout: Optional[float] = None,
+    kill_grace: float = 10.0,
+    log_max_bytes: int = 10 * 1024 * 1024,
+    log_backups: int = 3,
+) -> ExecResult:
+    """
+    Запустить команду (строка — через shell, список — argv без shell) в отдельной
+    группе процессов. stdout/stderr пишутся в <log_dir>/<log_name>.stdout.log / .stderr.log
+    с ротацией. По таймауту вся группа получает SIGTERM, через kill_grace секунд — SIGKILL;
+    rc в этом случае TIMEOUT_RC.
+    """
+    log_dir = pathlib.Path(log_dir)
+    out_log = RotatingLog(log_dir / f"{log_name}.stdout.log", log_max_bytes, log_backups)
+    err_log = RotatingLog(log_dir / f"{log_name}.stderr.log", log_max_bytes, log_backups)
+    t0 = time.monotonic()
+    spawn = asyncio.create_subprocess_shell if isinstance(cmd, str) else asyncio.create_subprocess_exec
+    args = [cmd] if isinstance(cmd, str) else list(cmd)
+    proc = await spawn(
+        *args,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        start_new_session=True,
+    )
+    tail = bytearray()
+    pumps = asyncio.gather(_pump(proc.stdout, out_log), _pump(proc.stderr, err_log, tail))
+    timed_out = False
+    try:
+        try:
+            await asyncio.wait_for(proc.wait(), timeout)
+        except asyncio.TimeoutError:
+            timed_out = True
+            _killpg(proc, signal.SIGTERM)
+            try:
+                await asyncio.wait_for(proc.wait(), kill_grace)
+            except asyncio.TimeoutError:
+                _killpg(proc, signal.SIGKILL)
+                await proc.wait()
+        # потомки, унаследовавшие stdout, могут держать пайп и после выхода лидера
+        try:
+            await asyncio.wait_for(asyncio.shield(pumps), kill_grace)
+        except asyncio.TimeoutError:
+            _killpg(proc, signal.SIGKILL)
+            await pumps
+    finally:
+        if proc.returncode is None:
+            _killpg(proc, signal.SIGKILL)
+            await proc.wait()
+        out_log.close()
+        err_log.close()
+    return ExecResult(
+        rc=TIMEOUT_RC if timed_out else proc.returncode,
+        seconds=round(time.monotonic() - t0, 3),
+        timed_out=timed_out,
+        tail=tail.decode("utf-8", errors="replace").strip(),
+    )
+
+
+def run_command_sync(cmd: Union[str, List[str]], log_dir, log_name: str, **kw) -> ExecResult:
+    """Синхронная обёртка (шаги и батчи выполняются в потоках, у каждого — свой event loop)."""
+    return asyncio.run(run_command(cmd, log_dir, log_name, **kw))
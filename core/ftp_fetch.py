@@ -0,0 +1,118 @@
+# core/ftp_fetch.py
+import ftplib
+import json
+import os
+import pathlib
+import sys
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+
+def _remote_stamp(ftp: ftplib.FTP, path: str) -> Dict[str, Optional[str]]:
+    """MDTM/SIZE удалённого файла (None, если сервер не поддерживает)."""
+    stamp: Dict[str, Optional[str]] = {"mdtm": None, "size": None}
+    try:
+        stamp["mdtm"] = ftp.sendcmd(f"MDTM {path}").split(None, 1)[1].strip()
+    except (ftplib.Error, IndexError):
+        pass
+    try:
+        ftp.voidcmd("TYPE I")
+        size = ftp.size(path)
+        stamp["size"] = None if size is None else str(size)
+    except ftplib.Error:
+        pass
+    return stamp
+
+
+def _connect(src: Dict[str, object]) -> ftplib.FTP:
+    timeout = float(src.get("timeout") or 15)
+    if src["protocol"] == "ftps":
+        ftp: ftplib.FTP = ftplib.FTP_TLS(timeout=timeout)
+    else:
+        ftp = ftplib.FTP(timeout=timeout)
+    ftp.connect(str(src["host"]), int(src.get("port") or 21))
+    ftp.login(str(src["user"]), str(src["password"]))
+    if isinstance(ftp, ftplib.FTP_TLS):
+        ftp.prot_p()
+    return ftp
+
+
+def _fetch_ftp(src: Dict[str, object], cache_file: pathlib.Path, meta: Dict[str, object]) -> Tuple[str, Dict[str, object]]:
+    path = str(src["path"])
+    ftp = _connect(src)
+    try:
+        stamp = _remote_stamp(ftp, path)
+        known = stamp["mdtm"] or stamp["size"]
+        if known and cache_file.exists() and meta.get("stamp") == stamp:
+            return "not_modified", meta
+
+        # качаем построчно во временный файл, затем атомарно подменяем кэш
+        tmp = cache_file.with_suffix(".part")
+        with open(tmp, "w", encoding="utf-8") as fw:
+            ftp.retrlines(f"RETR {path}", lambda line: fw.write(line + "\n"))
+        os.replace(tmp, cache_file)
+        return "downloaded", {"stamp": stamp}
+    finally:
+        try:
+            ftp.quit()
+        except Exception:
+            ftp.close()
+
+
+def _fetch_url(src: Dict[str, object], cache_file: pathlib.Path, meta: Dict[str, object]) -> Tuple[str, Dict[str, object]]:
+    """Прочие схемы (http/https) — через urllib, с If-Modified-Since."""
+    url = f"{src['protocol']}://{src['host']}{src['path']}"
+    req = urllib.request.Request(url)
+    if meta.get("last_modified") and cache_file.exists():
+        req.add_header("If-Modified-Since", str(meta["last_modified"]))
+    try:
+        resp = urllib.request.urlopen(req, timeout=float(src.get("timeout") or 15))
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return "not_modified", meta
+        raise
+    tmp = cache_file.with_suffix(".part")
+    with resp, open(tmp, "wb") as fw:
+        for chunk in iter(lambda: resp.read(64 * 1024), b""):
+            fw.write(chunk)
+    os.replace(tmp, cache_file)
+    return "downloaded", {"last_modified": resp.headers.get("Last-Modified")}
+
+
+def fetch_source(src: Dict[str, object], cache_dir: pathlib.Path) -> Tuple[Optional[pathlib.Path], str]:
+    """
+    Скачать один источник в cache_dir/<name>.txt (если изменился).
+    Возвращает (путь к локальной копии или None, статус).
+    При ошибке отдаём прошлую локальную копию, если она есть.
+    """
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    name = str(src["name"])
+    cache_file = cache_dir / f"{name}.txt"
+    meta_file = cache_dir / f"{name}.meta.json"
+    try:
+        meta = json.loads(meta_file.read_text(encoding="utf-8")) if meta_file.exists() else {}
+    except Exception:
+        meta = {}
+
+    try:
+        if src["protocol"] in ("ftp", "ftps"):
+            status, meta = _fetch_ftp(src, cache_file, meta)
+        else:
+            status, meta = _fetch_url(src, cache_file, meta)
+        meta_file.write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+        return cache_file, status
+    except Exception as e:
+        print(f"[01] aggregation: WARNING: ftp source {name}: {e}", file=sys.stderr)
+        if cache_file.exists():
+            return cache_file, "stale"
+        return None, "failed"
+
+
+def fetch_sources(sources: List[Dict[str, object]], cache_dir: pathlib.Path) -> List[Tuple[str, Optional[pathlib.Path], str]]:
+    """Все источники параллельно; у каждого свой таймаут (src['timeout'])."""
+    if not sources:
+        return []
+    with ThreadPoolExecutor(max_workers=len(sources)) as pool:
+        results = list(pool.map(lambda s: fetch_source(s, cache_dir), sources))
+    return [(str(s["name"]), path, status) for s, (path, status) in zip(sources, results)]
@@ -0,0 +1,179 @@
+# core/images.py
+import json
+import os
+import pathlib
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional, Tuple
+
+_lock = threading.Lock()
+# image -> digest, в пределах процесса (docker inspect не дёргаем на каждый батч)
+_digests: Dict[str, str] = {}
+
+
+def _inspect_full(image: str) -> Tuple[str, str]:
+    """(Id, RepoDigests через запятую) локального образа; ("", "") — образа нет/docker недоступен."""
+    try:
+        proc = subprocess.run(
+            ["docker", "image", "inspect", "--format", '{{.Id}} {{join .RepoDigests ","}}', image],
+            capture_output=True,
+            text=True,
+            timeout=30,
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return "", ""
+    if proc.returncode != 0:
+        return "", ""
+    parts = proc.stdout.strip().split(" ", 1)
+    return parts[0], (parts[1] if len(parts) > 1 else "")
+
+
+def _inspect(image: str) -> str:
+    return _inspect_full(image)[0]
+
+
+def image_digest(image: str) -> str:
+    """
+    Digest локального образа (sha256:... из docker image inspect; после
+    prepull — из его результата). Пусто/"none" — плагин без образа; если
+    docker недоступен или образа нет — возвращается само имя образа.
+    """
+    if not image or image == "none":
+        return ""
+    with _lock:
+        if image in _digests:
+            return _digests[image]
+    digest = _inspect(image) or image
+    with _lock:
+        _digests[image] = digest
+    return digest
+
+
+class DigestIndex:
+    """
+    Локальный индекс образов: AUTOPEN_HOME/state/images.json
+      image -> {"id": sha256:..., "repo_digests": [...], "checked": unix time}
+    checked — когда тег последний раз сверялся с реестром (docker pull).
+    """
+
+    def __init__(self, path: pathlib.Path):
+        self.path = pathlib.Path(path)
+        self.entries: Dict[str, Dict[str, object]] = {}
+
+    @classmethod
+    def load(cls, home: pathlib.Path) -> "DigestIndex":
+        idx = cls(pathlib.Path(home) / "state" / "images.json")
+        if idx.path.exists():
+            try:
+                idx.entries = json.loads(idx.path.read_text(encoding="utf-8")) or {}
+            except Exception as e:
+                print(f"[02] images: WARNING: digest index is broken, ignoring: {e}", file=sys.stderr)
+                idx.entries = {}
+        return idx
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.entries, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def fresh(self, image: str, image_id: str, recheck: float, now: float) -> bool:
+        """
+        Сверять тег с реестром не нужно: локальный образ тот же, что в индексе,
+        и проверен не раньше recheck секунд назад (или закреплён по @sha256).
+        """
+        e = self.entries.get(image)
+        if not image_id or not e or e.get("id") != image_id:
+            return False
+        return "@sha256:" in image or now - float(e.get("checked") or 0) <= recheck
+
+
+def _pull(image: str, pull_timeout: float) -> Optional[str]:
+    """docker pull; None — успешно, иначе текст ошибки."""
+    try:
+        proc = subprocess.run(
+            ["docker", "pull", "--quiet", image], capture_output=True, text=True, timeout=pull_timeout
+        )
+    except subprocess.TimeoutExpired:
+        return f"pull timeout after {pull_timeout}s"
+    except OSError as e:
+        return str(e)
+    if proc.returncode != 0:
+        lines = (proc.stderr or proc.stdout).strip().splitlines()
+        return lines[-1] if lines else f"exit {proc.returncode}"
+    return None
+
+
+def _ensure(
+    image: str, pull_timeout: float, idx: Optional[DigestIndex] = None, recheck: float = 0, now: float = 0
+) -> Dict[str, object]:
+    """
+    Образ есть локально и его digest. Нет образа — docker pull; есть, но
+    индекс говорит, что тег давно не сверялся, — тоже docker pull (тег мог
+    уехать в реестре). pulled — образ скачан/обновлён, checked — сверен
+    с реестром сейчас, error — образа нет, warning — остался локальный.
+    """
+    t0 = time.monotonic()
+    image_id, repo = _inspect_full(image)
+    pulled = checked = False
+    error = warning = None
+    if not image_id or idx is None or not idx.fresh(image, image_id, recheck, now):
+        err = _pull(image, pull_timeout)
+        if err is None:
+            checked = True
+            new_id, repo = _inspect_full(image)
+            pulled = new_id != image_id
+            image_id = new_id
+        elif image_id:
+            # реестр недоступен — работаем с локальным, сверим в следующий раз
+            warning = f"recheck failed, using local image: {err}"
+        else:
+            error = err
+    return {
+        "id": image_id,
+        "repo_digests": [d for d in repo.split(",") if d],
+        "pulled": pulled,
+        "checked": checked,
+        "error": error,
+        "warning": warning,
+        "seconds": round(time.monotonic() - t0, 3),
+    }
+
+
+def prepull(
+    home: pathlib.Path,
+    images: Iterable[str],
+    workers: int = 4,
+    pull_timeout: float = 600,
+    recheck: float = 86400,
+) -> Dict[str, Dict[str, object]]:
+    """
+    Pre-flight: все образы шагов — локально (недостающие и давно не
+    сверявшиеся с реестром теги тянутся параллельно, до workers одновременно),
+    digest'ы — в state/images.json и в кэш image_digest() этого процесса.
+    Образ, который индекс считает свежим, проверяется только docker image inspect.
+    Возвращает image -> результат.
+    """
+    todo = sorted({i for i in images if i and i != "none"})
+    if not todo:
+        return {}
+    idx = DigestIndex.load(home)
+    now = time.time()
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(todo)))) as pool:
+        results = dict(zip(todo, pool.map(lambda i: _ensure(i, pull_timeout, idx, recheck, now), todo)))
+    for image, res in results.items():
+        if not res["id"]:
+            continue
+        with _lock:
+            _digests[image] = str(res["id"])
+        prev = idx.entries.get(image) or {}
+        checked = now if res["checked"] else float(prev.get("checked") or 0)
+        idx.entries[image] = {"id": res["id"], "repo_digests": res["repo_digests"], "checked": checked}
+    try:
+        idx.save()
+    except OSError as e:
+        print(f"[02] images: WARNING: cannot save digest index: {e}", file=sys.stderr)
+    return results
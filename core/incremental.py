@@ -0,0 +1,174 @@
+# core/incremental.py
+import json
+import os
+import pathlib
+import sys
+import time
+from typing import Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+from .pipeline import Incremental
+from .provenance import Provenance
+from .rtt import RTT_HEADER
+from .scope import in_scope
+from .targetbin import write_target_file
+from .targets import TargetSet, normalize_host
+from .utils import iter_lines, write_lines, write_text
+
+
+class ScanState:
+    """
+    Что и когда полностью сканировалось: AUTOPEN_HOME/state/incremental.json
+      {"run_id": последний успешный прогон, "scanned": {host: unix time}}
+    scanned — живые хосты того прогона (его alive_full.txt) и время их
+    последнего настоящего скана (у перенесённых — время исходного прогона).
+    """
+
+    def __init__(self, path: pathlib.Path):
+        self.path = pathlib.Path(path)
+        self.run_id: Optional[str] = None
+        self.scanned: Dict[str, float] = {}
+
+    @classmethod
+    def load(cls, home: pathlib.Path) -> "ScanState":
+        st = cls(pathlib.Path(home) / "state" / "incremental.json")
+        if st.path.exists():
+            try:
+                data = json.loads(st.path.read_text(encoding="utf-8")) or {}
+                st.run_id = data.get("run_id")
+                st.scanned = {str(h): float(t) for h, t in (data.get("scanned") or {}).items()}
+            except Exception as e:
+                print(f"[02] incremental: WARNING: state is broken, ignoring: {e}", file=sys.stderr)
+                st.run_id, st.scanned = None, {}
+        return st
+
+    def split(
+        self, alive: Iterable[str], cfg: Incremental, now: Optional[float] = None
+    ) -> Tuple[List[str], List[str]]:
+        """
+        (сканировать, перенести): новые относительно прошлого прогона хосты и
+        сканированные раньше stale_after — в скан, остальные — перенос находок.
+        """
+        now = time.time() if now is None else now
+        scan: List[str] = []
+        carry: List[str] = []
+        for h in alive:
+            t = self.scanned.get(h)
+            if t is None or now - t > cfg.stale_after:
+                scan.append(h)
+            else:
+                carry.append(h)
+        return scan, carry
+
+    def save(self, run_id: str, scanned: Iterable[str], carried: Iterable[str], now: Optional[float] = None) -> None:
+        now = time.time() if now is None else now
+        # хосты, которых в этом прогоне нет среди живых, забываем:
+        # вернувшись, они будут новыми
+        data = {h: now for h in scanned}
+        for h in carried:
+            data[h] = self.scanned.get(h, now)
+        self.run_id, self.scanned = run_id, data
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(
+            json.dumps({"run_id": run_id, "scanned": data}, separators=(",", ":")), encoding="utf-8"
+        )
+        os.replace(tmp, self.path)
+
+
+def _filter_tsv(path: pathlib.Path, keep: Set[str]) -> int:
+    """Оставить в rtt.tsv только строки хостов из keep; наибольший timeout_ms."""
+    rows = [r for r in iter_lines(path) if r != RTT_HEADER and r.split("\t", 1)[0] in keep]
+    write_lines(path, [RTT_HEADER] + rows)
+    return max((int(r.split("\t")[3]) for r in rows), default=0)
+
+
+def narrow_aggregated(
+    agg_dir: pathlib.Path, scan: List[str], host_map: Mapping[str, Iterable[str]]
+) -> List[str]:
+    """
+    Сузить списки целей в 01-aggregated до хостов скана: alive/alive_ips
+    (.txt/.bin), endpoints, rtt. Полные списки остаются в alive_full.txt /
+    alive_ips_full.txt. Возвращает адреса скана (alive_ips).
+    """
+    agg_dir = pathlib.Path(agg_dir)
+    os.replace(agg_dir / "alive.txt", agg_dir / "alive_full.txt")
+    os.replace(agg_dir / "alive_ips.txt", agg_dir / "alive_ips_full.txt")
+
+    keep = set(scan)
+    ips: Set[str] = {h for h in scan if h not in host_map}
+    for h in scan:
+        ips.update(host_map.get(h, ()))
+    scan_ips = [ip for ip in iter_lines(agg_dir / "alive_ips_full.txt") if ip in ips]
+
+    write_lines(agg_dir / "alive.txt", scan)
+    write_lines(agg_dir / "alive_ips.txt", scan_ips)
+    write_target_file(agg_dir / "alive.bin", TargetSet(scan))
+    write_target_file(agg_dir / "alive_ips.bin", TargetSet(scan_ips))
+
+    eps_file = agg_dir / "endpoints.json"
+    if eps_file.exists():
+        eps = {h: v for h, v in json.loads(eps_file.read_text(encoding="utf-8")).items() if h in keep}
+        write_text(str(eps_file), json.dumps(eps, ensure_ascii=False, indent=2))
+        write_lines(agg_dir / "endpoints.txt", (ep for v in eps.values() for ep in v))
+        # порты endpoint'ов оставляем как есть: это подсказка, а не список целей
+
+    worst = 0
+    if (agg_dir / "rtt.tsv").exists():
+        worst = _filter_tsv(agg_dir / "rtt.tsv", keep)
+    if (agg_dir / "rtt_ips.tsv").exists():
+        _filter_tsv(agg_dir / "rtt_ips.tsv", set(scan_ips))
+    if worst:
+        write_text(str(agg_dir / "timeout_ms.txt"), str(worst))
+    return scan_ips
+
+
+def carried_assets(
+    carry: Iterable[str], scan: Iterable[str], host_map: Mapping[str, Iterable[str]]
+) -> Set[str]:
+    """
+    Хосты, чьи находки переносятся: сами цели плюс их адреса (находки
+    IP-level тулов пишутся по IP), кроме адресов, которые сканируются заново.
+    """
+    carry = list(carry)
+    out: Set[str] = {h.lower() for h in carry}
+    for h in carry:
+        out.update(host_map.get(h, ()))
+    for h in scan:
+        out.discard(h.lower())
+        for ip in host_map.get(h, ()):
+            out.discard(ip)
+    return out
+
+
+def carry_findings(
+    prev_merge: pathlib.Path,
+    out_merge: pathlib.Path,
+    hosts: Set[str],
+    prev_run_id: str,
+    exclusions: Optional[TargetSet] = None,
+    prov: Optional[Provenance] = None,
+) -> int:
+    """
+    Дописать в findings_merged.ndjson находки прошлого прогона по hosts
+    с пометкой carried: true и carried_from (прогон, где находка получена).
+    Скоуп и источники пересчитываются по текущему прогону.
+    """
+    n = 0
+    with open(out_merge, "a", encoding="utf-8") as fw:
+        for line in iter_lines(prev_merge):
+            try:
+                obj = json.loads(line)
+            except Exception:
+                continue
+            asset = str(obj.get("asset") or "")
+            if normalize_host(asset).lower().rstrip(".") not in hosts:
+                continue
+            if exclusions and not in_scope(asset, exclusions):
+                continue
+            obj["carried"] = True
+            obj.setdefault("carried_from", obj.get("run_id") or prev_run_id)
+            if prov is not None:
+                obj["sources"] = prov.sources(asset)
+            fw.write(json.dumps(obj, ensure_ascii=False) + "\n")
+            n += 1
+    return n
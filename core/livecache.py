@@ -0,0 +1,200 @@
+# core/livecache.py
+import ipaddress
+import json
+import os
+import pathlib
+import sys
+import time
+from typing import Dict, Iterable, Iterator, List, Optional
+
+# Запись хоста (только хосты, хоть раз бывшие живыми):
+#   [last_alive, last_dead, rtt, dead_streak, skipped]
+#   last_alive/last_dead — unix time (0 — никогда)
+#   dead_streak — сколько проверок подряд хост не отвечал
+#   skipped     — сколько прогонов подряд мёртвый хост пропускали
+_LA, _LD, _RTT, _STREAK, _SKIP = range(5)
+# Запись блока (/24, для IPv6 — /64; hostname — сам себе блок) для адресов,
+# которые живыми не бывали: [last_dead, dead_streak, skipped] — отдельной
+# записи на каждый неответивший IP нет (на /12 это был бы миллион записей)
+_BLD, _BSTREAK, _BSKIP = range(3)
+
+
+def block_of(host: str) -> str:
+    """Ключ блока: a.b.c для IPv4, первые 4 группы для IPv6, иначе сам host."""
+    if ":" in host:
+        try:
+            return str(ipaddress.IPv6Network(f"{host}/64", strict=False).network_address)
+        except ValueError:
+            return host
+    head, dot, tail = host.rpartition(".")
+    if dot and tail.isdigit() and head.replace(".", "").isdigit() and head.count(".") == 2:
+        return head
+    return host
+
+
+class AliveCache:
+    """
+    Персистентное состояние живости хостов между прогонами:
+    AUTOPEN_HOME/state/alive_cache.json.
+
+    - хост был жив не позднее ttl секунд назад — не пробуем, считаем живым;
+    - хост не отвечал dead_after раз подряд — пробуем только раз в dead_every прогонов.
+    Адреса, ни разу не бывшие живыми, учитываются по блокам (block_of): блок,
+    где такие адреса не ответили dead_after прогонов подряд, пробуется раз в
+    dead_every прогонов.
+    Формат файла: {"hosts": {host: запись}, "blocks": {блок: запись}}.
+    """
+
+    def __init__(
+        self,
+        path: pathlib.Path,
+        ttl: float,
+        dead_after: int = 3,
+        dead_every: int = 4,
+        max_age: float = 30 * 86400,
+    ):
+        self.path = pathlib.Path(path)
+        self.ttl = ttl
+        self.dead_after = dead_after
+        self.dead_every = dead_every
+        self.max_age = max_age
+        self.entries: Dict[str, List] = {}
+        self.blocks: Dict[str, List] = {}
+
+    @classmethod
+    def load(cls, home: pathlib.Path, **kw) -> "AliveCache":
+        cache = cls(pathlib.Path(home) / "state" / "alive_cache.json", **kw)
+        if cache.path.exists():
+            try:
+                data = json.loads(cache.path.read_text(encoding="utf-8")) or {}
+                if "hosts" in data and isinstance(data["hosts"], dict):
+                    cache.entries = data["hosts"]
+                    cache.blocks = data.get("blocks") or {}
+                else:
+                    # старый формат (host -> запись): оставляем только бывавших живыми
+                    cache.entries = {h: e for h, e in data.items() if e[_LA] > 0}
+            except Exception as e:
+                print(f"[01] aggregation: WARNING: alive cache is broken, ignoring: {e}", file=sys.stderr)
+                cache.entries, cache.blocks = {}, {}
+        return cache
+
+    def save(self, now: Optional[float] = None) -> None:
+        now = time.time() if now is None else now
+        # давно не виденные хосты (вышли из скоупа) выкидываем
+        self.entries = {
+            h: e for h, e in self.entries.items() if now - max(e[_LA], e[_LD]) <= self.max_age
+        }
+        self.blocks = {b: e for b, e in self.blocks.items() if now - e[_BLD] <= self.max_age}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(
+            json.dumps({"hosts": self.entries, "blocks": self.blocks}, separators=(",", ":")),
+            encoding="utf-8",
+        )
+        os.replace(tmp, self.path)
+
+    # --- политика ---
+
+    def is_fresh(self, e: Optional[List], now: float) -> bool:
+        return bool(e) and self.ttl > 0 and e[_LA] > 0 and now - e[_LA] <= self.ttl
+
+    def _backoff(self, streak: int, skipped: int) -> bool:
+        return self.dead_every > 1 and streak >= self.dead_after and skipped < self.dead_every - 1
+
+    def is_backed_off(self, e: Optional[List]) -> bool:
+        return bool(e) and self._backoff(e[_STREAK], e[_SKIP])
+
+    def block_backed_off(self, b: Optional[List]) -> bool:
+        return bool(b) and self._backoff(b[_BSTREAK], b[_BSKIP])
+
+    def should_probe(self, host: str, now: float) -> bool:
+        e = self.entries.get(host)
+        if e is None:
+            return not self.block_backed_off(self.blocks.get(block_of(host)))
+        return not (self.is_fresh(e, now) or self.is_backed_off(e))
+
+    def fresh(self, hosts, now: float) -> Dict[str, Optional[float]]:
+        """Хосты из hosts (поддерживает `in`), живые по кэшу: host -> RTT."""
+        return {
+            h: e[_RTT] for h, e in self.entries.items() if self.is_fresh(e, now) and h in hosts
+        }
+
+    def to_probe(self, hosts: Iterable[str], now: float) -> "_ProbeView":
+        """Ленивый фильтр: только те хосты, которые в этом прогоне надо пробовать."""
+        return _ProbeView(self, hosts, now)
+
+    def seed(self, hosts: Iterable[str], now: float) -> int:
+        """
+        Подсказки «скорее всего жив» (например, соседи из ARP-таблицы):
+        такие хосты считаются только что живыми и в этом прогоне не пробуются.
+        """
+        n = 0
+        for h in hosts:
+            e = self.entries.get(h)
+            if self.is_fresh(e, now):
+                continue
+            if e is None:
+                e = self.entries[h] = [0, 0, None, 0, 0]
+            e[_LA], e[_STREAK], e[_SKIP] = now, 0, 0
+            n += 1
+        return n
+
+    # --- обновление после прогона ---
+
+    def update(self, hosts: Iterable[str], alive: Dict[str, Optional[float]], now: float) -> Dict[str, int]:
+        """
+        Второй проход по тем же hosts: решение should_probe повторяется
+        на ещё не изменённом состоянии, так что список проверенных хранить не нужно.
+        Блоки обновляются после прохода: ответил хоть один новый адрес — streak
+        блока сбрасывается, иначе растёт (по разу за прогон).
+        """
+        cnt = {"probed": 0, "cached_alive": 0, "skipped_dead": 0}
+        # блок -> ответил ли в нём кто-то из ранее не живых (None — блок пропущен)
+        touched: Dict[str, Optional[bool]] = {}
+        for h in hosts:
+            e = self.entries.get(h)
+            if e is None:
+                b = block_of(h)
+                if self.block_backed_off(self.blocks.get(b)):
+                    touched[b] = None
+                    cnt["skipped_dead"] += 1
+                    continue
+                cnt["probed"] += 1
+                touched[b] = touched.get(b, False) or h in alive
+                if h in alive:
+                    self.entries[h] = [now, 0, alive[h], 0, 0]
+                continue
+            if self.is_fresh(e, now):
+                cnt["cached_alive"] += 1
+                continue
+            if self.is_backed_off(e):
+                e[_SKIP] += 1
+                cnt["skipped_dead"] += 1
+                continue
+            cnt["probed"] += 1
+            e[_SKIP] = 0
+            if h in alive:
+                e[_LA], e[_RTT], e[_STREAK] = now, alive[h], 0
+            else:
+                e[_LD] = now
+                e[_STREAK] += 1
+        for b, answered in touched.items():
+            be = self.blocks.setdefault(b, [now, 0, 0])
+            if answered is None:
+                be[_BSKIP] += 1
+            else:
+                be[_BLD], be[_BSKIP] = now, 0
+                be[_BSTREAK] = 0 if answered else be[_BSTREAK] + 1
+        return cnt
+
+
+class _ProbeView:
+    """Переитерируемый фильтр (нужен для отката fping -> TCP по тому же списку)."""
+
+    def __init__(self, cache: AliveCache, hosts: Iterable[str], now: float):
+        self.cache, self.hosts, self.now = cache, hosts, now
+
+    def __iter__(self) -> Iterator[str]:
+        for h in self.hosts:
+            if self.cache.should_probe(h, self.now):
+                yield h
@@ -0,0 +1,325 @@
+# core/liveness.py
+import asyncio
+import errno
+import math
+import re
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+DEFAULT_TCP_PORTS = [22, 80, 443, 3389, 445]
+# дескрипторы, которые оставляем процессу (логи, пайпы fping, DNS-пул)
+_FD_RESERVE = 64
+# EMFILE/ENFILE: повторы connect с растущей паузой, потом — ошибка
+_FD_RETRIES = 20
+_FD_WAIT = 0.05
+
+# fping -a -e: "10.0.0.1 (0.12 ms)" / "10.0.0.1 is alive (0.12 ms)"
+_FPING_LINE = re.compile(r"^(\S+)(?:\s+is alive)?(?:\s+\(([\d.]+) ms\))?")
+# fping -c: ответ "10.0.0.1 : [0], 64 bytes, 0.12 ms (0.12 avg, 0% loss)"
+_FPING_REPLY = re.compile(r"^(\S+)\s+:\s+\[\d+\],.*?([\d.]+) ms")
+# fping -c, итог в stderr: "10.0.0.1 : xmt/rcv/%loss = 3/2/33%, min/avg/max = 0.1/0.2/0.3"
+_FPING_SUMMARY = re.compile(
+    r"^(\S+)\s+:\s+xmt/rcv/%loss = (\d+)/(\d+)/\d+%(?:.*?min/avg/max = [\d.]+/([\d.]+)/)?"
+)
+
+
+class RateLimiter:
+    """
+    Общий бюджет попыток в секунду для всех корутин одного event loop:
+    попытки равномерно разносятся во времени (pps <= 0 — без ограничения).
+    """
+
+    def __init__(self, pps: float = 0):
+        self.interval = 1.0 / pps if pps and pps > 0 else 0.0
+        self._next = 0.0
+
+    async def acquire(self) -> None:
+        if not self.interval:
+            return
+        now = time.monotonic()
+        slot = max(now, self._next)
+        self._next = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+def socket_budget(concurrency: int) -> int:
+    """Сколько connect держать одновременно: concurrency, но не больше RLIMIT_NOFILE минус запас."""
+    try:
+        import resource
+
+        soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    except (ImportError, OSError, ValueError):
+        return max(1, concurrency)
+    if soft == resource.RLIM_INFINITY:
+        return max(1, concurrency)
+    return max(1, min(concurrency, soft - _FD_RESERVE))
+
+
+async def _connect_rtt(
+    host: str, port: int, timeout: float, sockets: Optional[asyncio.Semaphore] = None
+) -> Optional[float]:
+    """
+    Одна TCP-попытка. RTT в мс, если хост ответил (SYN/ACK или RST),
+    None — таймаут/недостижим. sockets — общий лимит открытых сокетов.
+    Нехватка дескрипторов (EMFILE/ENFILE) — не «хост мёртв»: попытка
+    повторяется, а если дескрипторы так и не освободились — OSError.
+    """
+    for attempt in range(_FD_RETRIES):
+        if sockets is not None:
+            await sockets.acquire()
+        try:
+            t0 = time.monotonic()
+            try:
+                _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+            except ConnectionRefusedError:
+                # RST — хост жив, просто порт закрыт
+                return (time.monotonic() - t0) * 1000.0
+            except OSError as e:
+                if e.errno in (errno.EMFILE, errno.ENFILE):
+                    await asyncio.sleep(_FD_WAIT * (attempt + 1))
+                    continue
+                return None
+            except asyncio.TimeoutError:
+                return None
+            rtt = (time.monotonic() - t0) * 1000.0
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+            return rtt
+        finally:
+            if sockets is not None:
+                sockets.release()
+    raise OSError(errno.EMFILE, f"TCP probe {host}:{port}: out of file descriptors (lower tcp_concurrency)")
+
+
+async def probe_host(
+    host: str,
+    ports: Sequence[int],
+    timeout: float,
+    limiter: Optional[RateLimiter] = None,
+    sockets: Optional[asyncio.Semaphore] = None,
+) -> Optional[float]:
+    """
+    Параллельно стучимся на все порты, первый успешный/отвергнутый connect
+    признаёт хост живым — остальные попытки отменяются.
+    С limiter попытки запускаются по одной в рамках бюджета: если хост ответил,
+    пока ждали очереди, остальные порты не пробуются вовсе.
+    """
+    pending = set()
+    try:
+        for p in ports:
+            if limiter is not None:
+                await limiter.acquire()
+                done = {t for t in pending if t.done()}
+                pending -= done
+                for t in done:
+                    rtt = t.result()
+                    if rtt is not None:
+                        return rtt
+            pending.add(asyncio.ensure_future(_connect_rtt(host, p, timeout, sockets)))
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for t in done:
+                rtt = t.result()
+                if rtt is not None:
+                    return rtt
+        return None
+    finally:
+        for t in pending:
+            t.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+async def tcp_probe(
+    hosts: Iterable[str],
+    ports: Sequence[int] = DEFAULT_TCP_PORTS,
+    timeout: float = 1.0,
+    concurrency: int = 512,
+    on_alive: Optional[Callable[[str, float], None]] = None,
+    pps: float = 0,
+) -> Dict[str, float]:
+    """
+    Асинхронная проверка живости по TCP.
+    concurrency — сколько хостов проверяется одновременно и сколько connect
+    (сокетов) открыто одновременно, не больше RLIMIT_NOFILE минус запас;
+    хосты берутся из итератора по мере освобождения воркеров (список
+    целиком не строится).
+    pps — общий лимит connect-попыток в секунду (0 — без ограничения).
+    Возвращает host -> RTT (мс) для живых.
+    """
+    alive: Dict[str, float] = {}
+    it: Iterator[str] = iter(hosts)
+    limiter = RateLimiter(pps)
+    sockets = asyncio.Semaphore(socket_budget(concurrency))
+
+    async def worker():
+        for h in it:
+            rtt = await probe_host(h, ports, timeout, limiter, sockets)
+            if rtt is None:
+                continue
+            alive[h] = rtt
+            if on_alive is not None:
+                on_alive(h, rtt)
+
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    return alive
+
+
+def tcp_alive(
+    hosts: Iterable[str],
+    ports: Sequence[int] = DEFAULT_TCP_PORTS,
+    timeout: float = 1.0,
+    concurrency: int = 512,
+    on_alive: Optional[Callable[[str, float], None]] = None,
+    pps: float = 0,
+) -> Dict[str, float]:
+    """Синхронная обёртка над tcp_probe (для aggregator)."""
+    return asyncio.run(tcp_probe(hosts, ports, timeout, concurrency, on_alive, pps))
+
+
+def fping_interval_for(pps: float, shards: int) -> Optional[int]:
+    """
+    -i (мс между пакетами одного процесса), при котором shards процессов fping
+    вместе не превышают pps пакетов в секунду. None — без ограничения.
+    """
+    if not pps or pps <= 0:
+        return None
+    return max(1, math.ceil(1000.0 * max(1, shards) / pps))
+
+
+def fping_argv(
+    interval: Optional[int] = None,
+    retries: Optional[int] = None,
+    timeout: Optional[int] = None,
+    binary: str = "fping",
+    count: Optional[int] = None,
+) -> List[str]:
+    """
+    Команда fping одного шарда (без shell): цели читаются из stdin.
+    count — режим -c: каждый ответ печатается сразу, потери — в итоге (stderr).
+    """
+    argv = [binary, "-c", str(int(count))] if count else [binary, "-a", "-e"]
+    if interval is not None:
+        argv += ["-i", str(int(interval))]
+    if retries is not None:
+        argv += ["-r", str(int(retries))]
+    if timeout is not None:
+        argv += ["-t", str(int(timeout))]
+    return argv
+
+
+async def fping_probe(
+    hosts: Iterable[str],
+    shards: int = 4,
+    interval: Optional[int] = None,
+    retries: Optional[int] = None,
+    timeout: Optional[int] = None,
+    on_alive: Optional[Callable[[str, Optional[float]], None]] = None,
+    binary: str = "fping",
+    count: Optional[int] = None,
+    loss: Optional[Dict[str, float]] = None,
+) -> Tuple[Dict[str, Optional[float]], List[Dict[str, object]]]:
+    """
+    Делим цели на shards частей (round-robin, по мере итерации) и запускаем
+    столько же процессов fping параллельно. Живые хосты отдаются в on_alive
+    сразу, как только fping их напечатал.
+    count — fping -c: в loss (если передан) попадает доля потерь живых хостов,
+    RTT — среднее по ответам.
+    Возвращает (host -> RTT мс, статистика по шардам).
+    RuntimeError — если какой-то шард завершился с ошибкой (код >= 3).
+    """
+    n = max(1, int(shards))
+    argv = fping_argv(interval, retries, timeout, binary, count)
+    procs = [
+        await asyncio.create_subprocess_exec(
+            *argv,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE if count else asyncio.subprocess.DEVNULL,
+        )
+        for _ in range(n)
+    ]
+    t0 = time.monotonic()
+    stats: List[Dict[str, object]] = [
+        {"shard": i, "hosts": 0, "alive": 0, "seconds": 0.0, "rc": None} for i in range(n)
+    ]
+    alive: Dict[str, Optional[float]] = {}
+
+    async def feed():
+        try:
+            for i, h in enumerate(hosts):
+                k = i % n
+                procs[k].stdin.write((h + "\n").encode())
+                stats[k]["hosts"] += 1
+                if i % 4096 == 4095:
+                    await asyncio.gather(*(p.stdin.drain() for p in procs))
+            await asyncio.gather(*(p.stdin.drain() for p in procs))
+        finally:
+            for p in procs:
+                p.stdin.close()
+
+    line_re = _FPING_REPLY if count else _FPING_LINE
+    # итоги -c: host -> (отправлено, получено, средний RTT)
+    summaries: Dict[str, Tuple[int, int, Optional[float]]] = {}
+
+    async def read_summary(k: int):
+        async for raw in procs[k].stderr:
+            m = _FPING_SUMMARY.match(raw.decode(errors="ignore").strip())
+            if m:
+                avg = float(m.group(4)) if m.group(4) else None
+                summaries[m.group(1)] = (int(m.group(2)), int(m.group(3)), avg)
+
+    async def read(k: int):
+        proc = procs[k]
+        summary = asyncio.ensure_future(read_summary(k)) if count else None
+        async for raw in proc.stdout:
+            m = line_re.match(raw.decode(errors="ignore").strip())
+            if not m:
+                continue
+            host = m.group(1)
+            rtt = float(m.group(2)) if m.group(2) else None
+            if host in alive:
+                continue
+            alive[host] = rtt
+            stats[k]["alive"] += 1
+            if on_alive is not None:
+                on_alive(host, rtt)
+        if summary is not None:
+            await summary
+        stats[k]["rc"] = await proc.wait()
+        stats[k]["seconds"] = round(time.monotonic() - t0, 3)
+
+    await asyncio.gather(feed(), *(read(k) for k in range(n)))
+
+    for host, (xmt, rcv, avg) in summaries.items():
+        if host not in alive or not rcv:
+            continue
+        if loss is not None and xmt:
+            loss[host] = round(1 - rcv / xmt, 3)
+        if avg is not None:
+            alive[host] = avg
+
+    failed = [s for s in stats if (s["rc"] or 0) > 2]
+    if failed:
+        raise RuntimeError(f"fping shard(s) failed: {[(s['shard'], s['rc']) for s in failed]}")
+    return alive, stats
+
+
+def fping_alive_sharded(
+    hosts: Iterable[str],
+    shards: int = 4,
+    interval: Optional[int] = None,
+    retries: Optional[int] = None,
+    timeout: Optional[int] = None,
+    on_alive: Optional[Callable[[str, Optional[float]], None]] = None,
+    count: Optional[int] = None,
+    loss: Optional[Dict[str, float]] = None,
+) -> Tuple[Dict[str, Optional[float]], List[Dict[str, object]]]:
+    """Синхронная обёртка над fping_probe (для aggregator)."""
+    return asyncio.run(
+        fping_probe(hosts, shards, interval, retries, timeout, on_alive, count=count, loss=loss)
+    )
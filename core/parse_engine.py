@@ -1,26 +1,26 @@
 import os, json, glob, datetime, pathlib
-import yaml, jmespath
 from lxml import etree as ET
+from core.scope import load_exclusions, in_scope
+from core.provenance import Provenance
+from core.registry import parser_specs
 
-def _sub_literals(s: str, ctx: dict) -> str:
-    out = s
-    for k, v in ctx.items():
-        out = out.replace(f"{{{{{k}}}}}", str(v))
-    return out
+# поля парсеров скомпилированы реестром: ("lit", Template) или ("expr", выражение)
 
-def _eval_jmes(expr, record, ctx):
-    if isinstance(expr, str) and len(expr) >= 2 and expr[0] == expr[-1] == "'":
-        return _sub_literals(expr[1:-1], ctx)
+def _eval_jmes(field, record, ctx):
+    kind, expr = field
+    if kind == "lit":
+        return expr.render(ctx)
     try:
-        return jmespath.search(expr, record)
+        return expr.search(record)
     except Exception:
         return None
 
-def _eval_xpath(expr, elem, ctx):
-    if isinstance(expr, str) and len(expr) >= 2 and expr[0] == expr[-1] == "'":
-        return _sub_literals(expr[1:-1], ctx)
+def _eval_xpath(field, elem, ctx):
+    kind, expr = field
+    if kind == "lit":
+        return expr.render(ctx)
     try:
-        val = elem.xpath(expr)
+        val = expr(elem)
     except Exception:
         return None
     # lxml возвращает list или scalar
@@ -55,25 +55,41 @@ def _ensure_soft_schema(obj: dict, ctx: dict) -> dict:
 
     return obj
 
-def _emit(obj, ctx, out_records):
+def _emit(obj, ctx, out_records, exclusions=None, prov=None):
     obj = _ensure_soft_schema(obj, ctx)
     if not obj.get("tool") or not obj.get("asset") or not obj.get("summary"):
         return
+    # находки по активам вне скоупа (config/exclude.txt) отбрасываем
+    if exclusions and not in_scope(obj["asset"], exclusions):
+        return
+    # из каких источников целей пришёл актив (ftp/tg/local/autodiscovery)
+    if prov is not None:
+        obj["sources"] = prov.sources(obj["asset"])
     out_records.append(obj)
 
+def _glob_outputs(run_root: pathlib.Path, pattern: str) -> list:
+    """
+    Файлы по glob парсера плюс те же имена в батчах шага:
+      02-scan/nmap/*.xml -> ещё и 02-scan/nmap/batch_*/*.xml (fanout/потоковые батчи).
+    """
+    found = glob.glob(str(run_root / pattern))
+    head, tail = os.path.split(pattern)
+    if head and tail:
+        found += glob.glob(str(run_root / head / "batch_*" / tail))
+    return sorted(set(found))
+
 def parse_and_merge(run_root: pathlib.Path, home: pathlib.Path) -> int:
     out_records = []
-    parsers = sorted(glob.glob(str(home / "parsers.d" / "*.yaml")))
+    # parsers.d — из реестра (перечитываются только изменившиеся файлы)
+    parsers = parser_specs(home)
     ctx_global = {"run_id": run_root.name}
+    exclusions = load_exclusions(home)
+    prov = Provenance.load(run_root / "01-aggregated")
 
-    for p in parsers:
-        meta = yaml.safe_load(open(p, "rb")) or {}
-        ptype = meta.get("type")
-        if ptype == "ndjson":
-            glob_pat = meta.get("glob", "")
-            rec_expr = meta.get("record_jmes", "@")
-            fields = meta.get("fields", {})
-            for path in glob.glob(str(run_root / glob_pat)):
+    for spec in parsers:
+        fields = spec.fields
+        if spec.type == "ndjson":
+            for path in _glob_outputs(run_root, spec.glob):
                 try:
                     fh = open(path, "r", encoding="utf-8", errors="ignore")
                 except Exception:
@@ -87,7 +103,7 @@ def parse_and_merge(run_root: pathlib.Path, home: pathlib.Path) -> int:
                             raw = json.loads(line)
                         except Exception:
                             continue
-                        base = jmespath.search(rec_expr, raw)
+                        base = spec.record.search(raw)
                         items = base if isinstance(base, list) else [base]
                         for itm in items:
                             if itm is None:
@@ -95,25 +111,20 @@ def parse_and_merge(run_root: pathlib.Path, home: pathlib.Path) -> int:
                             obj = {}
                             for k, expr in fields.items():
                                 obj[k] = _eval_jmes(expr, itm, ctx_global)
-                            _emit(obj, ctx_global, out_records)
+                            _emit(obj, ctx_global, out_records, exclusions, prov)
 
-        elif ptype == "xml":
-            glob_pat = meta.get("glob", "")
-            rx = meta.get("record_xpath", "")
-            fields = meta.get("fields", {})
-            for path in glob.glob(str(run_root / glob_pat)):
+        elif spec.type == "xml":
+            for path in _glob_outputs(run_root, spec.glob):
                 try:
                     tree = ET.parse(path)
                     root = tree.getroot()
                 except Exception:
                     continue
-                for elem in root.xpath(rx):
+                for elem in spec.record(root):
                     obj = {}
                     for k, expr in fields.items():
                         obj[k] = _eval_xpath(expr, elem, ctx_global)
-                    _emit(obj, ctx_global, out_records)
-        else:
-            continue
+                    _emit(obj, ctx_global, out_records, exclusions, prov)
 
     merge_dir = run_root / "03-merge"
     merge_dir.mkdir(parents=True, exist_ok=True)
@@ -1,24 +1,418 @@
-from dataclasses import dataclass
-from typing import List
+from dataclasses import dataclass, field
+from typing import Dict, List
 import pathlib, yaml
 
+@dataclass
+class Step:
+    name: str
+    # шаги, которые должны завершиться раньше этого
+    needs: List[str] = field(default_factory=list)
+    # None — как у пайплайна; false — при ошибке пропустить зависящие шаги этой ветки
+    continue_on_error: bool | None = None
+
 @dataclass
 class Pipeline:
     steps: List[str]
     concurrency: int = 4
     continue_on_error: bool = True
+    # описание шагов (needs и т.п.) по имени; шаги без записи — без зависимостей
+    specs: Dict[str, Step] = field(default_factory=dict)
 
-def load_pipeline(home: pathlib.Path) -> Pipeline:
+    def spec(self, name: str) -> Step:
+        return self.specs.get(name) or Step(name)
+
+    def continues(self, name: str) -> bool:
+        """Продолжать ли ветку после ошибки шага name."""
+        coe = self.spec(name).continue_on_error
+        return self.continue_on_error if coe is None else coe
+
+@dataclass
+class Liveness:
+    # auto — fping, если он есть в системе, иначе TCP; fping | tcp — принудительно
+    engine: str = "auto"
+    tcp_ports: List[int] = field(default_factory=lambda: [22, 80, 443, 3389, 445])
+    tcp_timeout: float = 1.0
+    tcp_concurrency: int = 512
+    # fping: число параллельных процессов и их -i/-r/-t (None — дефолт fping)
+    fping_shards: int = 4
+    fping_interval: int | None = None
+    fping_retries: int | None = None
+    fping_timeout: int | None = None
+    # fping -c N: N пакетов на хост — кроме RTT меряем и потери (None — обычный -a режим)
+    fping_count: int | None = None
+    # кэш живости между прогонами (AUTOPEN_HOME/state/alive_cache.json)
+    cache: bool = True
+    cache_ttl: float = 6 * 3600
+    dead_after: int = 3
+    dead_every: int = 4
+    # общий лимит проб в секунду (выставляет aggregator из секции throttle; 0 — без лимита)
+    pps: int = 0
+
+@dataclass
+class Dns:
+    # резолвинг hostnames из целей перед проверкой живости
+    enabled: bool = True
+    concurrency: int = 64
+    timeout: float = 5.0
+    # TTL кэша, если резолвер не сообщил свой
+    ttl: float = 3600
+
+@dataclass
+class Discovery:
+    # разреженная выборка для сетей из AUTO_DISCOVERY шире /block_prefix
+    sampling: bool = True
+    block_prefix: int = 24
+    # доля случайных адресов блока в выборке (помимо .1/.254 и ARP-соседей)
+    sample_ratio: float = 0.02
+
+@dataclass
+class Streaming:
+    # конвейер [01] -> [02]: шаги с {{targets_file}} получают живые хосты батчами
+    # прямо во время проверки живости
+    enabled: bool = False
+    batch_size: int = 256
+    flush_seconds: float = 10.0
+
+@dataclass
+class Throttle:
+    # порядок обхода целей: interleave — по кругу через подсети /block_prefix,
+    # sorted — подряд по возрастанию адресов
+    order: str = "interleave"
+    block_prefix: int = 24
+    # глобальный бюджет пакетов/соединений в секунду (0 — без ограничения):
+    # проверка живости соблюдает его сама, плагины получают как {{rate}}
+    pps: int = 0
+    # доля бюджета для проверки живости, пока параллельно идут потоковые батчи
+    liveness_share: float = 0.5
+
+@dataclass
+class Timeouts:
+    # подсказки таймаутов плагинам по RTT/потерям из проверки живости:
+    # timeout = clamp(rtt * factor, min_ms, max_ms); RTT неизвестен — default_ms
+    factor: float = 4.0
+    min_ms: int = 100
+    max_ms: int = 5000
+    default_ms: int = 1000
+    # повторы: retries, +1 при потерях, +2 при потерях от lossy (доля)
+    retries: int = 1
+    lossy: float = 0.3
+
+@dataclass
+class Executor:
+    # таймауты запуска плагина, секунды (None — без ограничения):
+    # timeout — одна команда (батч), step_timeout — шаг целиком со всеми батчами;
+    # плагин может переопределить их в своём yaml
+    timeout: float | None = None
+    step_timeout: float | None = None
+    # после SIGTERM группе процессов — столько секунд до SIGKILL
+    kill_grace: float = 10.0
+    # логи stdout/stderr в 02-scan/<step>/logs/: размер файла и число ротаций
+    log_max_bytes: int = 10 * 1024 * 1024
+    log_backups: int = 3
+
+@dataclass
+class Cache:
+    # кэш результатов плагинов (state/plugin_cache): ключ — описание плагина,
+    # digest образа, команда и содержимое входных списков целей
+    enabled: bool = False
+    # записи старше max_age секунд не используются и удаляются
+    max_age: float = 86400.0
+
+@dataclass
+class Pool:
+    # плагины с exec: выполняются через docker exec в заранее поднятых
+    # контейнерах своего образа (на прогон), а не docker run на каждый запуск
+    enabled: bool = False
+    # контейнеров на образ; 0 — pipeline.concurrency
+    size: int = 0
+    # после стольких запусков контейнер пересоздаётся
+    max_jobs: int = 50
+    # доп. аргументы docker run и тома (пусто — AUTOPEN_HOME по тому же пути)
+    run_args: List[str] = field(default_factory=lambda: ["--network", "host"])
+    volumes: List[str] = field(default_factory=list)
+    # чем держать контейнер живым (entrypoint + аргументы)
+    keepalive: List[str] = field(default_factory=lambda: ["sleep", "infinity"])
+
+@dataclass
+class Images:
+    # pre-flight перед [02]: образы всех шагов — локально (docker pull
+    # параллельно, до workers одновременно), digest'ы — в state/images.json
+    prepull: bool = True
+    workers: int = 4
+    pull_timeout: float = 600.0
+    # через сколько секунд после последней проверки тег (не @sha256) сверяется
+    # с реестром повторным docker pull; 0 — на каждом прогоне
+    recheck: float = 86400.0
+
+@dataclass
+class Incremental:
+    # autopen run --incremental: хосты, полностью сканированные не раньше
+    # stale_after секунд назад, не сканируются — их находки переносятся
+    stale_after: float = 7 * 86400.0
+
+@dataclass
+class TargetFiles:
+    # expanded.txt не пишется сразу: есть expanded.bin (mmap), а текст
+    # генерируется при первом обращении плагина
+    lazy_text: bool = False
+
+# pipeline.yaml -> ((mtime_ns, size), данные): load_* зовутся на каждый батч
+_yaml_cache: Dict[pathlib.Path, tuple] = {}
+
+def _load_yaml(home: pathlib.Path) -> dict | None:
     cfg = home / "config" / "pipeline.yaml"
-    if not cfg.exists():
+    try:
+        st = cfg.stat()
+    except FileNotFoundError:
+        return None
+    stamp = (st.st_mtime_ns, st.st_size)
+    hit = _yaml_cache.get(cfg)
+    if hit is not None and hit[0] == stamp:
+        return hit[1]
+    data = yaml.safe_load(cfg.read_text(encoding="utf-8")) or {}
+    _yaml_cache[cfg] = (stamp, data)
+    return data
+
+def load_pipeline(home: pathlib.Path) -> Pipeline:
+    data = _load_yaml(home)
+    if data is None:
         # дефолт, если файла нет
         return Pipeline(steps=["httpx", "nmap"], concurrency=4, continue_on_error=True)
-    data = yaml.safe_load(cfg.read_text(encoding="utf-8")) or {}
-    steps = data.get("steps") or []
-    if not isinstance(steps, list) or not all(isinstance(x, str) for x in steps):
-        raise ValueError("pipeline.steps must be a list of strings")
-    return Pipeline(
-        steps=steps,
-        concurrency=int(data.get("concurrency", 4)),
+    raw_steps = data.get("steps") or []
+    if not isinstance(raw_steps, list):
+        raise ValueError("pipeline.steps must be a list")
+    specs = [_load_step(x) for x in raw_steps]
+    names = [st.name for st in specs]
+    if len(set(names)) != len(names):
+        raise ValueError("pipeline.steps: duplicate step names")
+    for st in specs:
+        unknown = [n for n in st.needs if n not in names]
+        if unknown:
+            raise ValueError(f"pipeline.steps.{st.name}.needs: unknown steps {unknown}")
+    pipe = Pipeline(
+        steps=names,
+        concurrency=max(1, int(data.get("concurrency", 4))),
         continue_on_error=bool(data.get("continue_on_error", True)),
+        specs={st.name: st for st in specs},
+    )
+    _check_acyclic(pipe)
+    return pipe
+
+def _load_step(x) -> Step:
+    """Шаг — строка (имя плагина) или {name, needs, continue_on_error}."""
+    if isinstance(x, str):
+        return Step(x)
+    if not isinstance(x, dict) or not isinstance(x.get("name"), str):
+        raise ValueError("pipeline.steps: each step must be a name or a mapping with 'name'")
+    needs = x.get("needs") or []
+    if isinstance(needs, str):
+        needs = [needs]
+    if not isinstance(needs, list) or not all(isinstance(n, str) for n in needs):
+        raise ValueError(f"pipeline.steps.{x['name']}.needs must be a list of step names")
+    coe = x.get("continue_on_error")
+    return Step(name=x["name"], needs=needs, continue_on_error=None if coe is None else bool(coe))
+
+def _check_acyclic(pipe: Pipeline) -> None:
+    state: Dict[str, int] = {}  # 1 — в обходе, 2 — проверен
+
+    def visit(name: str, path: List[str]) -> None:
+        if state.get(name) == 2:
+            return
+        if state.get(name) == 1:
+            raise ValueError(f"pipeline.steps: dependency cycle {' -> '.join(path + [name])}")
+        state[name] = 1
+        for dep in pipe.spec(name).needs:
+            visit(dep, path + [name])
+        state[name] = 2
+
+    for name in pipe.steps:
+        visit(name, [])
+
+def _opt_int(v) -> int | None:
+    return None if v is None else int(v)
+
+def load_liveness(home: pathlib.Path) -> Liveness:
+    """Секция liveness: из pipeline.yaml (всё опционально)."""
+    data = (_load_yaml(home) or {}).get("liveness") or {}
+    if not isinstance(data, dict):
+        raise ValueError("pipeline.liveness must be a mapping")
+    dflt = Liveness()
+    engine = str(data.get("engine", dflt.engine)).lower()
+    if engine not in ("auto", "fping", "tcp"):
+        raise ValueError(f"pipeline.liveness.engine: unknown engine {engine!r}")
+    return Liveness(
+        engine=engine,
+        tcp_ports=[int(p) for p in (data.get("tcp_ports") or dflt.tcp_ports)],
+        tcp_timeout=float(data.get("tcp_timeout", dflt.tcp_timeout)),
+        tcp_concurrency=int(data.get("tcp_concurrency", dflt.tcp_concurrency)),
+        fping_shards=max(1, int(data.get("fping_shards", dflt.fping_shards))),
+        fping_interval=_opt_int(data.get("fping_interval")),
+        fping_retries=_opt_int(data.get("fping_retries")),
+        fping_timeout=_opt_int(data.get("fping_timeout")),
+        fping_count=_opt_int(data.get("fping_count")),
+        cache=bool(data.get("cache", dflt.cache)),
+        cache_ttl=float(data.get("cache_ttl", dflt.cache_ttl)),
+        dead_after=int(data.get("dead_after", dflt.dead_after)),
+        dead_every=int(data.get("dead_every", dflt.dead_every)),
+    )
+
+def load_dns(home: pathlib.Path) -> Dns:
+    """Секция dns: из pipeline.yaml (всё опционально)."""
+    data = (_load_yaml(home) or {}).get("dns") or {}
+    if not isinstance(data, dict):
+        raise ValueError("pipeline.dns must be a mapping")
+    dflt = Dns()
+    return Dns(
+        enabled=bool(data.get("enabled", dflt.enabled)),
+        concurrency=max(1, int(data.get("concurrency", dflt.concurrency))),
+        timeout=float(data.get("timeout", dflt.timeout)),
+        ttl=float(data.get("ttl", dflt.ttl)),
+    )
+
+def load_discovery(home: pathlib.Path) -> Discovery:
+    """Секция discovery: из pipeline.yaml (всё опционально)."""
+    data = (_load_yaml(home) or {}).get("discovery") or {}
+    if not isinstance(data, dict):
+        raise ValueError("pipeline.discovery must be a mapping")
+    dflt = Discovery()
+    block_prefix = int(data.get("block_prefix", dflt.block_prefix))
+    if not 16 <= block_prefix <= 28:
+        raise ValueError("pipeline.discovery.block_prefix must be in 16..28")
+    return Discovery(
+        sampling=bool(data.get("sampling", dflt.sampling)),
+        block_prefix=block_prefix,
+        sample_ratio=float(data.get("sample_ratio", dflt.sample_ratio)),
+    )
+
+def load_streaming(home: pathlib.Path) -> Streaming:
+    """Секция streaming: из pipeline.yaml (всё опционально)."""
+    data = (_load_yaml(home) or {}).get("streaming") or {}
+    if not isinstance(data, dict):
+        raise ValueError("pipeline.streaming must be a mapping")
+    dflt = Streaming()
+    return Streaming(
+        enabled=bool(data.get("enabled", dflt.enabled)),
+        batch_size=max(1, int(data.get("batch_size", dflt.batch_size))),
+        flush_seconds=float(data.get("flush_seconds", dflt.flush_seconds)),
     )
+
+def load_throttle(home: pathlib.Path) -> Throttle:
+    """Секция throttle: из pipeline.yaml (всё опционально)."""
+    data = (_load_yaml(home) or {}).get("throttle") or {}
+    if not isinstance(data, dict):
+        raise ValueError("pipeline.throttle must be a mapping")
+    dflt = Throttle()
+    order = str(data.get("order", dflt.order)).lower()
+    if order not in ("interleave", "sorted"):
+        raise ValueError(f"pipeline.throttle.order: unknown order {order!r}")
+    block_prefix = int(data.get("block_prefix", dflt.block_prefix))
+    if not 8 <= block_prefix <= 30:
+        raise ValueError("pipeline.throttle.block_prefix must be in 8..30")
+    share = float(data.get("liveness_share", dflt.liveness_share))
+    if not 0 < share <= 1:
+        raise ValueError("pipeline.throttle.liveness_share must be in (0, 1]")
+    return Throttle(
+        order=order,
+        block_prefix=block_prefix,
+        pps=max(0, int(data.get("pps", dflt.pps))),
+        liveness_share=share,
+    )
+
+def load_timeouts(home: pathlib.Path) -> Timeouts:
+    """Секция timeouts: из pipeline.yaml (всё опционально)."""
+    data = (_load_yaml(home) or {}).get("timeouts") or {}
+    if not isinstance(data, dict):
+        raise ValueError("pipeline.timeouts must be a mapping")
+    dflt = Timeouts()
+    out = Timeouts(
+        factor=float(data.get("factor", dflt.factor)),
+        min_ms=int(data.get("min_ms", dflt.min_ms)),
+        max_ms=int(data.get("max_ms", dflt.max_ms)),
+        default_ms=int(data.get("default_ms", dflt.default_ms)),
+        retries=max(0, int(data.get("retries", dflt.retries))),
+        lossy=float(data.get("lossy", dflt.lossy)),
+    )
+    if not 0 < out.min_ms <= out.max_ms:
+        raise ValueError("pipeline.timeouts: need 0 < min_ms <= max_ms")
+    return out
+
+def _opt_float(v) -> float | None:
+    return None if v is None else float(v)
+
+def load_executor(home: pathlib.Path) -> Executor:
+    """Секция executor: из pipeline.yaml (всё опционально)."""
+    data = (_load_yaml(home) or {}).get("executor") or {}
+    if not isinstance(data, dict):
+        raise ValueError("pipeline.executor must be a mapping")
+    dflt = Executor()
+    return Executor(
+        timeout=_opt_float(data.get("timeout")),
+        step_timeout=_opt_float(data.get("step_timeout")),
+        kill_grace=float(data.get("kill_grace", dflt.kill_grace)),
+        log_max_bytes=max(4096, int(data.get("log_max_bytes", dflt.log_max_bytes))),
+        log_backups=max(0, int(data.get("log_backups", dflt.log_backups))),
+    )
+
+def load_cache(home: pathlib.Path) -> Cache:
+    """Секция cache: из pipeline.yaml (всё опционально)."""
+    data = (_load_yaml(home) or {}).get("cache") or {}
+    if not isinstance(data, dict):
+        raise ValueError("pipeline.cache must be a mapping")
+    max_age = float(data.get("max_age", Cache().max_age))
+    if max_age <= 0:
+        raise ValueError("pipeline.cache.max_age must be > 0")
+    return Cache(enabled=bool(data.get("enabled", Cache().enabled)), max_age=max_age)
+
+def _str_list(data: dict, key: str, dflt: List[str]) -> List[str]:
+    v = data.get(key, dflt)
+    if not isinstance(v, list):
+        raise ValueError(f"pipeline.pool.{key} must be a list")
+    return [str(x) for x in v]
+
+def load_pool(home: pathlib.Path) -> Pool:
+    """Секция pool: из pipeline.yaml (всё опционально)."""
+    data = (_load_yaml(home) or {}).get("pool") or {}
+    if not isinstance(data, dict):
+        raise ValueError("pipeline.pool must be a mapping")
+    dflt = Pool()
+    keepalive = _str_list(data, "keepalive", dflt.keepalive)
+    if not keepalive:
+        raise ValueError("pipeline.pool.keepalive must not be empty")
+    return Pool(
+        enabled=bool(data.get("enabled", dflt.enabled)),
+        size=max(0, int(data.get("size", dflt.size))),
+        max_jobs=max(1, int(data.get("max_jobs", dflt.max_jobs))),
+        run_args=_str_list(data, "run_args", dflt.run_args),
+        volumes=_str_list(data, "volumes", dflt.volumes),
+        keepalive=keepalive,
+    )
+
+def load_images(home: pathlib.Path) -> Images:
+    """Секция images: из pipeline.yaml (всё опционально)."""
+    data = (_load_yaml(home) or {}).get("images") or {}
+    if not isinstance(data, dict):
+        raise ValueError("pipeline.images must be a mapping")
+    dflt = Images()
+    return Images(
+        prepull=bool(data.get("prepull", dflt.prepull)),
+        workers=max(1, int(data.get("workers", dflt.workers))),
+        pull_timeout=float(data.get("pull_timeout", dflt.pull_timeout)),
+        recheck=max(0.0, float(data.get("recheck", dflt.recheck))),
+    )
+
+def load_incremental(home: pathlib.Path) -> Incremental:
+    """Секция incremental: из pipeline.yaml (всё опционально)."""
+    data = (_load_yaml(home) or {}).get("incremental") or {}
+    if not isinstance(data, dict):
+        raise ValueError("pipeline.incremental must be a mapping")
+    stale_after = float(data.get("stale_after", Incremental().stale_after))
+    if stale_after < 0:
+        raise ValueError("pipeline.incremental.stale_after must be >= 0")
+    return Incremental(stale_after=stale_after)
+
+def load_target_files(home: pathlib.Path) -> TargetFiles:
+    """Секция targets: из pipeline.yaml (всё опционально)."""
+    data = (_load_yaml(home) or {}).get("targets") or {}
+    if not isinstance(data, dict):
+        raise ValueError("pipeline.targets must be a mapping")
+    return TargetFiles(lazy_text=bool(data.get("lazy_text", TargetFiles().lazy_text)))
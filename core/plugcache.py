@@ -0,0 +1,159 @@
+# core/plugcache.py
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+import sys
+import time
+import uuid
+from typing import Dict, Iterable, Iterator, Optional
+
+from .pipeline import Cache
+
+# в кэш не попадают: логи, батчи fanout (у них свои записи), сводка и входные
+# список целей и RTT батча
+_SKIP = {"logs", "batches.json", "targets.txt", "rtt.tsv"}
+
+
+def file_hash(path: pathlib.Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _outputs(out_dir: pathlib.Path) -> Iterator[pathlib.Path]:
+    """Файлы результата шага/батча (пути относительно out_dir)."""
+    if not out_dir.is_dir():
+        return
+    for top in sorted(out_dir.iterdir()):
+        if top.name in _SKIP or top.name.startswith("batch_"):
+            continue
+        if top.is_file():
+            yield top.relative_to(out_dir)
+        elif top.is_dir():
+            for p in sorted(top.rglob("*")):
+                if p.is_file():
+                    yield p.relative_to(out_dir)
+
+
+def _link(src: pathlib.Path, dst: pathlib.Path) -> None:
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    if dst.exists():
+        dst.unlink()
+    try:
+        os.link(src, dst)
+    except OSError:
+        # другая ФС / нет прав на hardlink
+        shutil.copy2(src, dst)
+
+
+class PluginCache:
+    """
+    Кэш результатов плагинов: AUTOPEN_HOME/state/plugin_cache/<ключ>/.
+
+    Ключ — sha256 от описания плагина, digest образа, команды (без run_id и путей
+    прогона), содержимого списков целей шага и входных файлов, упомянутых
+    в команде. При попадании
+    файлы результата хардлинкаются в 02-scan, плагин не запускается.
+    """
+
+    def __init__(self, root: pathlib.Path, cfg: Cache):
+        self.root = pathlib.Path(root)
+        self.cfg = cfg
+
+    @classmethod
+    def load(cls, home: pathlib.Path, cfg: Cache) -> "PluginCache":
+        return cls(pathlib.Path(home) / "state" / "plugin_cache", cfg)
+
+    @staticmethod
+    def key(
+        meta: dict,
+        digest: str,
+        cmd: str,
+        run_dir: pathlib.Path,
+        run_id: str,
+        out_dir: pathlib.Path,
+        inputs: Iterable[pathlib.Path],
+        targets: Iterable[pathlib.Path] = (),
+    ) -> str:
+        """
+        targets — списки целей шага: в ключ идут всегда (команда может читать
+        их через смонтированный каталог, и путь в cmd не виден).
+        inputs — прочие файлы, которые могут читаться командой; в ключ идут те,
+        чей путь встречается в cmd. Файлы учитываются по содержимому, а не по пути.
+        """
+        norm = cmd.replace(str(out_dir), "{{out_dir}}").replace(str(run_dir), "{{run_dir}}")
+        norm = norm.replace(run_id, "{{run_id}}")
+        hashes: Dict[str, str] = {}
+        targets = list(targets)
+        for p in targets + [p for p in inputs if str(p) in cmd]:
+            if p.is_file():
+                name = str(p).replace(str(out_dir), "{{out_dir}}").replace(str(run_dir), "{{run_dir}}")
+                hashes[name] = file_hash(p)
+        blob = json.dumps(
+            {"plugin": meta, "image": digest, "cmd": norm, "inputs": hashes},
+            sort_keys=True,
+            ensure_ascii=False,
+            default=str,
+        )
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def _entry(self, key: str) -> pathlib.Path:
+        return self.root / key[:2] / key
+
+    def restore(self, key: str, out_dir: pathlib.Path, now: Optional[float] = None) -> Optional[int]:
+        """Хардлинки результата в out_dir; число файлов или None (промах/устарело)."""
+        entry = self._entry(key)
+        try:
+            meta = json.loads((entry / "meta.json").read_text(encoding="utf-8"))
+        except Exception:
+            return None
+        now = time.time() if now is None else now
+        if now - float(meta.get("created", 0)) > self.cfg.max_age:
+            shutil.rmtree(entry, ignore_errors=True)
+            return None
+        files = [pathlib.Path(f) for f in meta.get("files", [])]
+        if not all((entry / "files" / f).is_file() for f in files):
+            return None
+        for f in files:
+            _link(entry / "files" / f, out_dir / f)
+        return len(files)
+
+    def store(self, key: str, out_dir: pathlib.Path, now: Optional[float] = None) -> int:
+        """Сохранить результат из out_dir; шаг без файлов в out_dir не кэшируется."""
+        files = list(_outputs(out_dir))
+        if not files:
+            return 0
+        entry = self._entry(key)
+        tmp = entry.with_name(f".{key}.{uuid.uuid4().hex[:8]}")
+        try:
+            for f in files:
+                _link(out_dir / f, tmp / "files" / f)
+            meta = {"created": time.time() if now is None else now, "files": [str(f) for f in files]}
+            (tmp / "meta.json").write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+            shutil.rmtree(entry, ignore_errors=True)
+            os.replace(tmp, entry)
+        except OSError as e:
+            print(f"[02] cache: WARNING: cannot store {key[:12]}: {e}", file=sys.stderr)
+            shutil.rmtree(tmp, ignore_errors=True)
+            return 0
+        return len(files)
+
+    def prune(self, now: Optional[float] = None) -> int:
+        """Удалить записи старше max_age; возвращает число удалённых."""
+        now = time.time() if now is None else now
+        removed = 0
+        if not self.root.is_dir():
+            return 0
+        for meta_file in self.root.glob("*/*/meta.json"):
+            try:
+                created = float(json.loads(meta_file.read_text(encoding="utf-8")).get("created", 0))
+            except Exception:
+                created = 0.0
+            if now - created > self.cfg.max_age:
+                shutil.rmtree(meta_file.parent, ignore_errors=True)
+                removed += 1
+        return removed
@@ -1,29 +1,342 @@
-import pathlib, yaml, subprocess, shlex
+import pathlib, shlex, json, hashlib, sys, time
+from concurrent.futures import ThreadPoolExecutor
+from core.targetbin import text_view
+from core.pipeline import load_cache, load_executor, load_pipeline, load_pool, load_throttle, load_timeouts
+from core.executor import TIMEOUT_RC, run_command_sync
+from core.images import image_digest
+from core.plugcache import PluginCache
+from core.pool import PoolManager, cold_argv, container_name, remove_container
+from core.registry import FANOUT_INPUTS, Command, PluginSpec, plugin_spec, template
+from core.rtt import read_rtt_file, write_rtt_file
+from core.targets import normalize_host
+from core.utils import iter_lines, write_lines, write_text
 
 def load_plugin(home: pathlib.Path, name: str) -> dict:
-    p = home / "plugins.d" / f"{name}.yaml"
-    if not p.exists():
-        raise FileNotFoundError(f"plugin yaml not found: {p}")
-    return yaml.safe_load(p.read_text(encoding="utf-8")) or {}
+    """YAML плагина как есть (из реестра: файл перечитывается, только если изменился)."""
+    return plugin_spec(home, name).raw
 
 def render_cmd(tpl: str, ctx: dict) -> str:
-    # простая подстановка {{var}}
-    cmd = tpl
-    for k, v in ctx.items():
-        cmd = cmd.replace(f"{{{{{k}}}}}", str(v))
-    return cmd
-
-def run_plugin(home: pathlib.Path, run_id: str, name: str) -> int:
-    meta = load_plugin(home, name)
-    image = meta.get("image", "")
-    cmd_tpl = meta.get("cmd", "")
-    if not cmd_tpl:
-        raise ValueError(f"{name}: empty cmd")
+    # подстановка {{var}} по заранее разобранному шаблону
+    return template(tpl).render(ctx)
+
+def plugin_uses(home: pathlib.Path, name: str, var: str) -> bool:
+    """Ссылается ли команда плагина на переменную {{var}}."""
+    return plugin_spec(home, name).uses(var)
+
+def plugin_streamable(home: pathlib.Path, name: str) -> bool:
+    """Может ли шаг работать на потоковых батчах [01]: принимает {{targets_file}}, а не одну цель."""
+    spec = plugin_spec(home, name)
+    return spec.uses("targets_file") and spec.fanout != "per_target"
+
+def batch_dir(home: pathlib.Path, run_id: str, step: str, batch_id: str) -> pathlib.Path:
+    """Каталог батча шага: 02-scan/<step>/batch_<id> (его же получает плагин как {{out_dir}})."""
+    d = home / "out" / run_id / "02-scan" / step / f"batch_{batch_id}"
+    d.mkdir(parents=True, exist_ok=True)
+    return d
+
+def _fanout_input(agg_dir: pathlib.Path, spec: PluginSpec) -> pathlib.Path:
+    # input уже проверен реестром (alive | alive_ips | endpoints | expanded)
+    txt = agg_dir / f"{spec.input}.txt"
+    if not txt.exists() and (agg_dir / f"{spec.input}.bin").exists():
+        text_view(agg_dir / f"{spec.input}.bin", txt)
+    return txt
+
+def _target_lists(agg_dir: pathlib.Path) -> list:
+    """Списки целей 01-aggregated (бинарный, если есть: текстовый может появиться позже)."""
+    out = []
+    for name in FANOUT_INPUTS:
+        for p in (agg_dir / f"{name}.bin", agg_dir / f"{name}.txt"):
+            if p.exists():
+                out.append(p)
+                break
+    return out
+
+def _stable_batches(path: pathlib.Path, size: int):
+    """
+    Цели -> батчи по хэшу цели, а не по позиции в списке: корзин — степень
+    двойки не меньше n/batch_size, так что добавленный/пропавший хост меняет
+    только свою корзину (и кэш остальных батчей остаётся в силе), пока их
+    число не удвоится. Батч в среднем от batch_size/2 до batch_size целей,
+    внутри — в порядке хэша (подсети перемешаны). Пустые корзины пропускаются,
+    номер батча — номер корзины.
+    """
+    n = sum(1 for _ in iter_lines(path))
+    buckets = 1
+    while buckets * size < n:
+        buckets *= 2
+    groups: dict = {}
+    for t in iter_lines(path):
+        h = int.from_bytes(hashlib.blake2b(t.encode("utf-8"), digest_size=8).digest(), "big")
+        groups.setdefault(h % buckets, []).append((h, t))
+    for b in sorted(groups):
+        yield b + 1, [t for _, t in sorted(groups[b])]
+
+def ensure_text_views(home: pathlib.Path, run_id: str, steps: list) -> list:
+    """
+    lazy_text: .txt для списков 01-aggregated, записанных только в .bin, — один раз
+    перед [02], если есть шаг без fanout: такой плагин может читать любой список
+    по любому пути (в т.ч. через смонтированный в контейнер каталог).
+    fanout-шаги свой input готовят сами (_fanout_input). Возвращает имена созданных .txt.
+    """
+    if all(plugin_spec(home, s).fanout for s in steps):
+        return []
+    made = []
+    for b in sorted((home / "out" / run_id / "01-aggregated").glob("*.bin")):
+        if not b.with_suffix(".txt").exists():
+            made.append(text_view(b).name)
+    return made
+
+def _step_deadline(home: pathlib.Path, spec: PluginSpec) -> float | None:
+    """Момент (time.monotonic), к которому шаг должен завершиться целиком."""
+    step_timeout = spec.step_timeout if spec.step_timeout is not None else load_executor(home).step_timeout
+    return None if step_timeout is None else time.monotonic() + float(step_timeout)
+
+def _render(tpl: Command, ctx: dict) -> tuple:
+    """(команда для запуска, её текст): список — argv, шаблон-строка — как есть."""
+    if isinstance(tpl, list):
+        argv = [t.render(ctx) for t in tpl]
+        return argv, shlex.join(argv)
+    cmd = tpl.render(ctx)
+    return cmd, cmd
+
+def split_rate(rate, parts: int) -> int:
+    """
+    Доля бюджета {{rate}} (пакетов/соединений в секунду) на один из parts
+    одновременных запусков; 0 — без ограничения.
+    """
+    if not rate:
+        return 0
+    return max(1, int(rate) // max(1, parts))
+
+def _run_fanout(
+    home: pathlib.Path,
+    run_id: str,
+    spec: PluginSpec,
+    pools: PoolManager | None = None,
+    rate: int | None = None,
+) -> int:
+    """
+    fanout: per_target | per_batch — живые цели режутся на батчи
+    (per_target — по одной цели, per_batch — около batch_size, раскладка
+    по хэшу цели, см. _stable_batches), каждый батч —
+    отдельный запуск cmd в пуле из workers воркеров (по умолчанию pipeline.concurrency).
+    Батч получает {{targets_file}}, {{batch_id}}, {{out_dir}} (и {{target}} при per_target),
+    а также свой {{rtt_file}} (rtt.tsv рядом с targets.txt) и {{timeout_ms}} по самому
+    медленному хосту именно этого батча, а не всего прогона.
+    rate — бюджет шага (по умолчанию весь throttle.pps), каждый батч получает
+    {{rate}} = rate / workers.
+    С включённым cache заново выполняются только батчи, чьи цели изменились.
+    Код возврата — первый ненулевой среди батчей; сводка — 02-scan/<step>/batches.json.
+    step_timeout ограничивает все батчи вместе: не успевшие стартовать не запускаются.
+    """
+    name, fanout = spec.name, spec.fanout
+    size = 1 if fanout == "per_target" else spec.batch_size
+    workers = spec.workers or max(1, load_pipeline(home).concurrency)
+    agg_dir = home / "out" / run_id / "01-aggregated"
+    src = _fanout_input(agg_dir, spec)
+    deadline = _step_deadline(home, spec)
+    # RTT/потери живых (по именам и по адресам) — для подсказок таймаутов батчей
+    rtt, loss = read_rtt_file(agg_dir / "rtt.tsv")
+    ip_rtt, ip_loss = read_rtt_file(agg_dir / "rtt_ips.tsv")
+    rtt.update(ip_rtt)
+    loss.update(ip_loss)
+    tcfg = load_timeouts(home)
+    batch_rate = split_rate(load_throttle(home).pps if rate is None else rate, workers)
+
+    def _chunks():
+        # per_target — по одной цели подряд; per_batch — стабильные корзины
+        if fanout != "per_target":
+            yield from _stable_batches(src, size)
+            return
+        for n, t in enumerate(iter_lines(src), 1):
+            yield n, [t]
+
+    def _batches():
+        for n, chunk in _chunks():
+            bid = f"{n:04d}"
+            out_dir = batch_dir(home, run_id, name, bid)
+            targets_file = out_dir / "targets.txt"
+            write_lines(targets_file, chunk)
+            # endpoint'ы (URL, host:port) — по RTT своего хоста
+            keys = {t: normalize_host(t) for t in chunk}
+            rtt_file = out_dir / "rtt.tsv"
+            timeout_ms = write_rtt_file(
+                rtt_file,
+                chunk,
+                {t: rtt.get(k) for t, k in keys.items()},
+                {t: loss[k] for t, k in keys.items() if k in loss},
+                tcfg,
+            )
+            ctx = {
+                "targets_file": str(targets_file),
+                "batch_id": bid,
+                "out_dir": str(out_dir),
+                "rtt_file": str(rtt_file),
+                "timeout_ms": timeout_ms,
+                "rate": batch_rate,
+            }
+            if fanout == "per_target":
+                ctx["target"] = chunk[0]
+            yield bid, ctx
+
+    results = {}
+    cached: list = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # батчи нарезаются лениво, не больше чем на workers вперёд
+        pending = {}
+        for bid, ctx in _batches():
+            pending[bid] = pool.submit(run_plugin, home, run_id, name, ctx, deadline, cached, pools)
+            if len(pending) >= workers * 2:
+                done = next(iter(pending))
+                results[done] = pending.pop(done).result()
+        for bid, fut in pending.items():
+            results[bid] = fut.result()
+    write_text(
+        str(home / "out" / run_id / "02-scan" / name / "batches.json"),
+        json.dumps(
+            {"fanout": fanout, "batch_size": size, "rc": results, "cached": sorted(cached)},
+            ensure_ascii=False,
+            indent=2,
+        ),
+    )
+    if cached:
+        print(f"[02] {name}: {len(cached)}/{len(results)} batches from cache")
+    return next((rc for rc in results.values() if rc != 0), 0)
+
+def run_plugin(
+    home: pathlib.Path,
+    run_id: str,
+    name: str,
+    extra_ctx: dict | None = None,
+    deadline: float | None = None,
+    cached: list | None = None,
+    pools: PoolManager | None = None,
+) -> int:
+    """
+    Запустить плагин (или один его батч, если в extra_ctx есть targets_file).
+    {{rate}} — доля бюджета pps этого запуска: её передаёт вызывающий в extra_ctx
+    (см. split_rate), без неё запуск считается единственным и получает весь throttle.pps.
+    Команда — cmd (через shell) или argv (список, без shell); выполняется
+    в своей группе процессов с таймаутами из executor/плагина, вывод —
+    в 02-scan/<step>/logs/. deadline — общий срок шага (time.monotonic).
+    При включённом cache (и cache: false не задан в плагине) результат берётся
+    из state/plugin_cache, если команда и её входы не менялись; в cached
+    (если передан) добавляется batch_id попавшего в кэш батча.
+    exec — команда внутри образа image: с pools — docker exec в тёплый
+    контейнер пула, без них (если нет cmd/argv) — docker run --rm.
+    """
+    # схема уже проверена реестром (SpecError при ошибке)
+    spec = plugin_spec(home, name)
+    # fanout-плагин без готового батча — режем живые цели на батчи сами
+    if spec.fanout and "targets_file" not in (extra_ctx or {}):
+        return _run_fanout(home, run_id, spec, pools, (extra_ctx or {}).get("rate"))
+    image = spec.image
+    # exec в образе: через пул, либо если другой команды нет
+    use_exec = spec.exec is not None and (pools is not None or not (spec.cmd or spec.argv))
+    run_dir = home / "out" / run_id
+    agg_dir = run_dir / "01-aggregated"
+    ports_file = agg_dir / "endpoint_ports.txt"
+    timeout_file = agg_dir / "timeout_ms.txt"
     ctx = {
         "image": image,
         "run_id": run_id,
+        # живые цели в исходных терминах и их адреса (каждый IP один раз)
+        "alive_file": str(agg_dir / "alive.txt"),
+        "alive_ips_file": str(agg_dir / "alive_ips.txt"),
+        # явные endpoint'ы живых хостов (URL, host:port) и их порты через запятую
+        "endpoints_file": str(agg_dir / "endpoints.txt"),
+        "endpoint_ports": ports_file.read_text(encoding="utf-8").strip() if ports_file.exists() else "",
+        # бюджет пакетов/соединений в секунду (0 — без ограничения); доля
+        # запуска среди параллельных приходит в extra_ctx
+        "rate": load_throttle(home).pps,
+        # RTT/потери живых хостов и подсказки таймаутов (TSV), наибольший таймаут в мс
+        "rtt_file": str(agg_dir / "rtt.tsv"),
+        "timeout_ms": (
+            timeout_file.read_text(encoding="utf-8").strip()
+            if timeout_file.exists()
+            else load_timeouts(home).default_ms
+        ),
+        # каталог результатов шага (у батчей — свой, 02-scan/<step>/batch_<id>)
+        "out_dir": str(run_dir / "02-scan" / name),
     }
-    cmd = render_cmd(cmd_tpl, ctx)
-    # Выполним как shell-команду (нам нужно пайплайны/редиректы, docker run и т.п.)
-    proc = subprocess.run(cmd, shell=True)
-    return proc.returncode
+    # targets_file / batch_id и т.п. — для запуска по батчам
+    ctx.update(extra_ctx or {})
+    log_name = f"batch_{ctx['batch_id']}" if "batch_id" in (extra_ctx or {}) else name
+    # имя контейнера запуска: docker run --name {{container_name}} — по таймауту
+    # контейнер удаляется (убитый клиент docker run его не останавливает)
+    ctx["container_name"] = container_name(run_id, name, (extra_ctx or {}).get("batch_id"))
+    if use_exec:
+        # команда внутри контейнера (строка — через sh -c)
+        cmd, shown = _render(spec.exec, ctx)
+    elif spec.argv:
+        cmd, shown = _render(spec.argv, ctx)
+    else:
+        # shell-команда: нужны пайплайны/редиректы, docker run и т.п.
+        cmd, shown = _render(spec.cmd, ctx)
+    ex = load_executor(home)
+    timeout = spec.timeout if spec.timeout is not None else ex.timeout
+    if extra_ctx is None or "batch_id" not in extra_ctx:
+        deadline = deadline if deadline is not None else _step_deadline(home, spec)
+    if deadline is not None:
+        left = deadline - time.monotonic()
+        if left <= 0:
+            print(f"[02] {name}: step timeout reached, batch not started", file=sys.stderr)
+            return TIMEOUT_RC
+        timeout = left if timeout is None else min(timeout, left)
+
+    who = name if log_name == name else f"{name} {log_name}"
+    log_dir = run_dir / "02-scan" / name / "logs"
+    out_dir = pathlib.Path(ctx["out_dir"])
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    cache_cfg = load_cache(home)
+    cache = key = None
+    if cache_cfg.enabled and spec.cache:
+        cache = PluginCache.load(home, cache_cfg)
+        inputs = [p for p in agg_dir.iterdir()] if agg_dir.is_dir() else []
+        inputs.append(pathlib.Path(ctx["rtt_file"]))
+        # цели шага — в ключе всегда: у батча его список, иначе списки 01-aggregated
+        if ctx.get("targets_file"):
+            targets = [pathlib.Path(ctx["targets_file"])]
+        else:
+            targets = _target_lists(agg_dir)
+        key = cache.key(spec.raw, image_digest(image), shown, run_dir, run_id, out_dir, inputs, targets)
+        hit = cache.restore(key, out_dir)
+        if hit is not None:
+            if cached is not None:
+                cached.append(ctx.get("batch_id", name))
+            else:
+                print(f"[02] {who}: cache hit {key[:12]} ({hit} files)")
+            return 0
+
+    container = img_pool = res = None
+    if use_exec and pools is not None:
+        img_pool = pools.get(image, spec.pool_size)
+        container = img_pool.acquire()
+        cmd = img_pool.exec_argv(container, cmd)
+    elif use_exec:
+        cmd = cold_argv(home, load_pool(home), image, cmd, ctx["container_name"])
+    try:
+        res = run_command_sync(
+            cmd,
+            log_dir,
+            log_name,
+            timeout=timeout,
+            kill_grace=ex.kill_grace,
+            log_max_bytes=ex.log_max_bytes,
+            log_backups=ex.log_backups,
+        )
+    finally:
+        if container is not None:
+            # по таймауту убит только docker exec, процесс в контейнере мог остаться
+            img_pool.release(container, broken=res is None or res.timed_out)
+        elif (res is None or res.timed_out) and (use_exec or spec.uses("container_name")):
+            remove_container(ctx["container_name"])
+    if res.rc == 0 and cache is not None:
+        cache.store(key, out_dir)
+    if res.rc != 0:
+        what = f"timeout after {res.seconds}s" if res.timed_out else f"exit {res.rc}"
+        print(f"[02] {who}: {what}, logs: {log_dir}/{log_name}.*.log", file=sys.stderr)
+        for line in res.tail.splitlines()[-5:]:
+            print(f"    {line}", file=sys.stderr)
+    return res.rc
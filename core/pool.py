@@ -0,0 +1,224 @@
+# core/pool.py
+import os
+import pathlib
+import queue
+import re
+import subprocess
+import sys
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Union
+
+from .pipeline import Pool
+
+# метка контейнеров пула: по ней подчищаются и осиротевшие контейнеры прогона
+LABEL = "autopen.pool"
+
+
+@dataclass
+class Container:
+    name: str
+    image: str
+    jobs: int = 0
+
+
+def _docker(args: List[str], timeout: float = 120) -> subprocess.CompletedProcess:
+    return subprocess.run(["docker"] + args, capture_output=True, text=True, timeout=timeout)
+
+
+def _in_container() -> bool:
+    return os.path.exists("/.dockerenv") or os.path.exists("/run/.containerenv")
+
+
+def host_home(home: pathlib.Path) -> str:
+    """
+    Путь AUTOPEN_HOME на хосте docker-демона: AUTOPEN_HOST_HOME, иначе сам home.
+    Внутри контейнера (autopen-core через docker.sock) home на хосте другой —
+    без AUTOPEN_HOST_HOME смонтировался бы пустой каталог хоста, поэтому ошибка.
+    """
+    env = os.getenv("AUTOPEN_HOST_HOME", "").strip()
+    if env:
+        return env
+    if _in_container():
+        raise ValueError(
+            f"pool: running inside a container, host path of {home} is unknown: "
+            "set AUTOPEN_HOST_HOME or pipeline.pool.volumes"
+        )
+    return str(home)
+
+
+def pool_volumes(home: pathlib.Path, cfg: Pool) -> List[str]:
+    """Аргументы -v для контейнеров exec: pool.volumes или AUTOPEN_HOME хоста по пути home."""
+    vols = cfg.volumes or [f"{host_home(home)}:{home}"]
+    return [a for v in vols for a in ("-v", v)]
+
+
+def container_name(run_id: str, step: str, batch_id: Optional[str] = None) -> str:
+    """Имя контейнера одного запуска плагина ({{container_name}}): по нему он снимается при таймауте."""
+    raw = f"autopen-{run_id}-{step}" + (f"-b{batch_id}" if batch_id else "")
+    return re.sub(r"[^a-zA-Z0-9_.-]+", "-", raw).strip("-")
+
+
+def remove_container(name: str) -> None:
+    """
+    docker rm -f: убитый по таймауту клиент docker run/exec контейнер не
+    останавливает (PID 1 в нём SIGTERM часто игнорирует, SIGKILL не пересылается).
+    """
+    try:
+        _docker(["rm", "-f", name], timeout=60)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        print(f"[02] pool: WARNING: cannot remove {name}: {e}", file=sys.stderr)
+
+
+def cold_argv(
+    home: pathlib.Path, cfg: Pool, image: str, cmd: Union[str, List[str]], name: Optional[str] = None
+) -> List[str]:
+    """
+    Разовый запуск той же команды без пула: docker run --rm (так же монтируется
+    AUTOPEN_HOME); name — имя контейнера, чтобы снять его по таймауту.
+    """
+    inner = ["sh", "-c", cmd] if isinstance(cmd, str) else list(cmd)
+    named = ["--name", name] if name else []
+    return ["docker", "run", "--rm", "-i"] + named + cfg.run_args + pool_volumes(home, cfg) + [
+        "--entrypoint", inner[0], image,
+    ] + inner[1:]
+
+
+class ImagePool:
+    """
+    Тёплые контейнеры одного образа: не больше size штук, поднимаются по
+    требованию, работа отдаётся через docker exec. Контейнер, отработавший
+    max_jobs запусков (или снятый по таймауту), удаляется и при нужде
+    поднимается новый.
+    """
+
+    def __init__(self, home: pathlib.Path, run_id: str, image: str, cfg: Pool, size: int):
+        self.home = pathlib.Path(home)
+        self.run_id = run_id
+        self.image = image
+        self.cfg = cfg
+        self.size = max(1, size)
+        self._idle: "queue.Queue[Container]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._live: Dict[str, Container] = {}
+        # живые + поднимающиеся контейнеры (не больше size)
+        self._count = 0
+        self._seq = 0
+        self.stats = {"started": 0, "jobs": 0, "recycled": 0}
+
+    def _start(self) -> Container:
+        with self._lock:
+            self._seq += 1
+            slug = re.sub(r"[^a-zA-Z0-9_.-]+", "-", self.image).strip("-")[:40]
+            name = f"autopen-{self.run_id}-{slug}-{self._seq}"
+        argv = (
+            ["run", "-d", "--name", name, "--label", f"{LABEL}={self.run_id}"]
+            + self.cfg.run_args
+            + pool_volumes(self.home, self.cfg)
+            + ["--entrypoint", self.cfg.keepalive[0], self.image]
+            + self.cfg.keepalive[1:]
+        )
+        proc = _docker(argv)
+        if proc.returncode != 0:
+            raise RuntimeError(f"pool: cannot start {self.image}: {proc.stderr.strip()}")
+        c = Container(name, self.image)
+        with self._lock:
+            self._live[name] = c
+            self.stats["started"] += 1
+        return c
+
+    def acquire(self) -> Container:
+        """Свободный контейнер; если все заняты и лимит не выбран — поднимаем новый."""
+        while True:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+            with self._lock:
+                # место занимаем сразу, чтобы параллельные acquire не превысили size
+                grow = self._count < self.size
+                if grow:
+                    self._count += 1
+            if grow:
+                try:
+                    return self._start()
+                except Exception:
+                    with self._lock:
+                        self._count -= 1
+                    raise
+            # ждём освободившийся; пересозданный взамен удалённого тоже подойдёт
+            try:
+                return self._idle.get(timeout=1.0)
+            except queue.Empty:
+                continue
+
+    def exec_argv(self, c: Container, cmd: Union[str, List[str]]) -> List[str]:
+        inner = ["sh", "-c", cmd] if isinstance(cmd, str) else list(cmd)
+        return ["docker", "exec", "-i", c.name] + inner
+
+    def release(self, c: Container, broken: bool = False) -> None:
+        """
+        Вернуть контейнер в пул. broken — процесс внутри мог остаться (таймаут)
+        или контейнер отработал max_jobs: удаляем его.
+        """
+        c.jobs += 1
+        with self._lock:
+            self.stats["jobs"] += 1
+        if broken or c.jobs >= self.cfg.max_jobs:
+            self._remove(c)
+            with self._lock:
+                self.stats["recycled"] += 1
+            return
+        self._idle.put(c)
+
+    def _remove(self, c: Container) -> None:
+        with self._lock:
+            self._live.pop(c.name, None)
+            self._count -= 1
+        remove_container(c.name)
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._remove(self._idle.get_nowait())
+            except queue.Empty:
+                break
+        with self._lock:
+            rest = list(self._live.values())
+        for c in rest:
+            self._remove(c)
+
+
+class PoolManager:
+    """Пулы по образам на время одного прогона; close() — в конце run."""
+
+    def __init__(self, home: pathlib.Path, run_id: str, cfg: Pool, default_size: int):
+        self.home = pathlib.Path(home)
+        self.run_id = run_id
+        self.cfg = cfg
+        self.size = cfg.size or default_size
+        # путь тома проверяем сразу, а не на первом exec (ValueError)
+        pool_volumes(self.home, cfg)
+        self._pools: Dict[str, ImagePool] = {}
+        self._lock = threading.Lock()
+
+    def get(self, image: str, size: Optional[int] = None) -> ImagePool:
+        with self._lock:
+            if image not in self._pools:
+                self._pools[image] = ImagePool(self.home, self.run_id, image, self.cfg, size or self.size)
+            return self._pools[image]
+
+    def close(self) -> None:
+        with self._lock:
+            pools = list(self._pools.values())
+        for p in pools:
+            p.close()
+            s = p.stats
+            print(f"[02] pool: {p.image}: containers={s['started']} jobs={s['jobs']} recycled={s['recycled']}")
+        # контейнеры прогона, оставшиеся после падения процесса/потока
+        try:
+            left = _docker(["ps", "-aq", "--filter", f"label={LABEL}={self.run_id}"], timeout=60).stdout.split()
+            if left:
+                _docker(["rm", "-f"] + left, timeout=120)
+        except (OSError, subprocess.TimeoutExpired):
+            pass
@@ -0,0 +1,194 @@
+# core/provenance.py
+import bisect
+import ipaddress
+import json
+import pathlib
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple, Union
+
+from .targets import TargetSet, normalize_host
+from .utils import write_text
+
+# Источники целей и их биты в маске (порядок фиксирован — маски пишутся на диск)
+SOURCES = ("ftp", "tg", "local", "autodiscovery")
+BITS = {name: 1 << i for i, name in enumerate(SOURCES)}
+
+# (start, end, mask) — включительный интервал адресов с одинаковой маской источников
+Segment = Tuple[int, int, int]
+
+
+def source_bit(name: str) -> int:
+    """Бит источника по имени; неизвестное имя — ValueError."""
+    try:
+        return BITS[name]
+    except KeyError:
+        raise ValueError(f"unknown target source: {name!r} (known: {', '.join(SOURCES)})")
+
+
+def source_names(mask: int) -> List[str]:
+    return [name for name in SOURCES if mask & BITS[name]]
+
+
+def _sweep(parts: List[Tuple[int, List[Tuple[int, int]]]], drop: List[Tuple[int, int]]) -> List[Segment]:
+    """
+    Проход по границам интервалов всех источников: O(n log n) от числа интервалов.
+    parts — (бит, слитые интервалы источника), drop — вычитаемые интервалы (исключения).
+    Соседние сегменты с одинаковой маской склеиваются.
+    """
+    DROP = -1
+    events: Dict[int, List[int]] = {}
+    for bit, ranges in parts + [(DROP, drop)]:
+        for s, e in ranges:
+            events.setdefault(s, []).append(bit)
+            events.setdefault(e + 1, []).append(bit)
+
+    out: List[Segment] = []
+    mask, dropped = 0, False
+    points = sorted(events)
+    for i, pos in enumerate(points):
+        for bit in events[pos]:
+            if bit == DROP:
+                dropped = not dropped
+            else:
+                # интервалы одного источника слиты, так что вход/выход чередуются
+                mask ^= bit
+        if not mask or dropped or i + 1 == len(points):
+            continue
+        end = points[i + 1] - 1
+        if out and out[-1][1] + 1 == pos and out[-1][2] == mask:
+            out[-1] = (out[-1][0], end, mask)
+        else:
+            out.append((pos, end, mask))
+    return out
+
+
+class Provenance:
+    """
+    Происхождение целей: битовая маска источников (ftp/tg/local/autodiscovery).
+    IP-часть — отсортированные непересекающиеся сегменты (start, end, mask),
+    так что /16 из одного источника — одна запись, а не 65k;
+    hostnames — host -> mask.
+    Лежит рядом с множеством целей: 01-aggregated/provenance.json.
+    """
+
+    def __init__(self):
+        self._segs: Dict[int, List[Segment]] = {4: [], 6: []}
+        self._starts: Dict[int, List[int]] = {4: [], 6: []}
+        self.hostnames: Dict[str, int] = {}
+        # IP, полученные резолвингом hostnames (hosts_map.json) -> маска имён
+        self.resolved: Dict[str, int] = {}
+
+    @classmethod
+    def build(cls, sources: Mapping[str, TargetSet], exclusions: Optional[TargetSet] = None) -> "Provenance":
+        """Маски по TargetSet'ам источников; адреса из исключений не попадают."""
+        out = cls()
+        for v in (4, 6):
+            parts = [(source_bit(name), ts.ranges(v)) for name, ts in sources.items()]
+            drop = exclusions.ranges(v) if exclusions else []
+            out._segs[v] = _sweep(parts, drop)
+        excluded = exclusions.hostnames if exclusions else {}
+        for name, ts in sources.items():
+            bit = source_bit(name)
+            for h in ts.hostnames:
+                if h not in excluded:
+                    out.hostnames[h] = out.hostnames.get(h, 0) | bit
+        out._index()
+        return out
+
+    def _index(self) -> None:
+        for v in (4, 6):
+            self._starts[v] = [s for s, _, _ in self._segs[v]]
+
+    def add_resolved(self, host_map: Mapping[str, Iterable[str]]) -> None:
+        """IP hostname'ов наследуют его маску (находки часто приходят по адресу)."""
+        for h, ips in host_map.items():
+            m = self.hostnames.get(h, 0)
+            if not m:
+                continue
+            for ip in ips:
+                self.resolved[ip] = self.resolved.get(ip, 0) | m
+
+    # --- запросы ---
+
+    def mask(self, asset: str) -> int:
+        """Маска источников актива (IP, host, URL, host:port); 0 — неизвестен."""
+        s = normalize_host(str(asset))
+        try:
+            ip = ipaddress.ip_address(s)
+        except ValueError:
+            return self.hostnames.get(s.lower().rstrip("."), 0)
+        m = self.resolved.get(str(ip), 0)
+        segs = self._segs[ip.version]
+        i = bisect.bisect_right(self._starts[ip.version], int(ip)) - 1
+        if i >= 0 and segs[i][1] >= int(ip):
+            m |= segs[i][2]
+        return m
+
+    def sources(self, asset: str) -> List[str]:
+        return source_names(self.mask(asset))
+
+    def counts(self, hosts: Optional[Iterable[str]] = None) -> Dict[str, int]:
+        """
+        Число целей на источник (цель из нескольких источников считается в каждом).
+        hosts=None — по всему множеству (по сегментам, без перебора адресов).
+        """
+        out = {name: 0 for name in SOURCES}
+        if hosts is None:
+            pairs = [(e - s + 1, m) for v in (4, 6) for s, e, m in self._segs[v]]
+            pairs += [(1, m) for m in self.hostnames.values()]
+        else:
+            pairs = [(1, self.mask(h)) for h in hosts]
+        for n, m in pairs:
+            for name in SOURCES:
+                if m & BITS[name]:
+                    out[name] += n
+        return out
+
+    # --- сериализация ---
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "sources": list(SOURCES),
+            "v4": [list(seg) for seg in self._segs[4]],
+            "v6": [list(seg) for seg in self._segs[6]],
+            "hostnames": self.hostnames,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, object]) -> "Provenance":
+        out = cls()
+        # маски переводим на текущий порядок SOURCES, если он поменялся
+        names = list(data.get("sources") or SOURCES)
+        remap = {1 << i: BITS.get(n, 0) for i, n in enumerate(names)}
+
+        def _m(mask: int) -> int:
+            return sum(b for old, b in remap.items() if mask & old)
+
+        for v in (4, 6):
+            out._segs[v] = [(int(s), int(e), _m(int(m))) for s, e, m in data.get(f"v{v}") or []]
+        out.hostnames = {h: _m(int(m)) for h, m in (data.get("hostnames") or {}).items()}
+        out._index()
+        return out
+
+    def save(self, path: Union[str, pathlib.Path], extra: Optional[Dict[str, object]] = None) -> None:
+        data = self.to_dict()
+        data.update(extra or {})
+        write_text(str(path), json.dumps(data, ensure_ascii=False, separators=(",", ":")))
+
+    @classmethod
+    def load(cls, agg_dir: Union[str, pathlib.Path]) -> Optional["Provenance"]:
+        """provenance.json прогона (+ адреса из hosts_map.json); нет файла — None."""
+        d = pathlib.Path(agg_dir)
+        p = d / "provenance.json"
+        if not p.exists():
+            return None
+        try:
+            out = cls.from_dict(json.loads(p.read_text(encoding="utf-8")))
+        except Exception:
+            return None
+        hm = d / "hosts_map.json"
+        if hm.exists():
+            try:
+                out.add_resolved(json.loads(hm.read_text(encoding="utf-8")) or {})
+            except Exception:
+                pass
+        return out
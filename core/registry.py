@@ -0,0 +1,268 @@
+# core/registry.py
+import glob
+import pathlib
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+import jmespath
+import yaml
+from lxml import etree as ET
+
+# списки целей из 01-aggregated, которые можно раздавать батчами (fanout)
+FANOUT_INPUTS = ("alive", "alive_ips", "endpoints", "expanded")
+FANOUT_MODES = ("per_target", "per_batch")
+PARSER_TYPES = ("ndjson", "xml")
+
+_VAR = re.compile(r"\{\{(\w+)\}\}")
+
+
+class Template:
+    """
+    Шаблон с {{var}}, разобранный один раз: чередование литералов и имён.
+    Переменные, которых нет в ctx, остаются как есть ({{var}}).
+    """
+
+    __slots__ = ("text", "_parts", "vars")
+
+    def __init__(self, text: str):
+        self.text = text
+        pieces = _VAR.split(text)
+        # чётные — литералы, нечётные — имена переменных
+        self._parts: List[Tuple[bool, str]] = [(i % 2 == 1, p) for i, p in enumerate(pieces) if p]
+        self.vars = frozenset(pieces[1::2])
+
+    def render(self, ctx: Dict[str, Any]) -> str:
+        out = []
+        for is_var, p in self._parts:
+            if not is_var:
+                out.append(p)
+            elif p in ctx:
+                out.append(str(ctx[p]))
+            else:
+                out.append("{{" + p + "}}")
+        return "".join(out)
+
+
+_templates: Dict[str, Template] = {}
+
+
+def template(text: str) -> Template:
+    """Скомпилированный шаблон (кэш в пределах процесса)."""
+    t = _templates.get(text)
+    if t is None:
+        t = _templates[text] = Template(text)
+    return t
+
+
+Command = Union[Template, List[Template]]
+
+
+@dataclass
+class PluginSpec:
+    name: str
+    path: pathlib.Path
+    # исходный YAML (для ключа кэша результатов)
+    raw: Dict[str, Any]
+    image: str = ""
+    cmd: Optional[Template] = None
+    argv: Optional[List[Template]] = None
+    exec: Optional[Command] = None
+    fanout: Optional[str] = None
+    batch_size: int = 64
+    workers: Optional[int] = None
+    input: str = "alive"
+    timeout: Optional[float] = None
+    step_timeout: Optional[float] = None
+    cache: bool = True
+    pool_size: Optional[int] = None
+
+    def templates(self) -> List[Template]:
+        out = [self.cmd] if self.cmd else []
+        out += self.argv or []
+        if isinstance(self.exec, list):
+            out += self.exec
+        elif self.exec is not None:
+            out.append(self.exec)
+        return out
+
+    def uses(self, var: str) -> bool:
+        """Ссылается ли какая-то из команд плагина на {{var}}."""
+        return any(var in t.vars for t in self.templates())
+
+
+# значение поля парсера: литерал 'text' (с {{var}}) или скомпилированное выражение
+Field = Tuple[str, Any]
+
+
+@dataclass
+class ParserSpec:
+    name: str
+    path: pathlib.Path
+    type: str
+    glob: str
+    # ndjson: jmespath; xml: XPath
+    record: Any
+    fields: Dict[str, Field] = field(default_factory=dict)
+
+
+class SpecError(ValueError):
+    """Ошибка схемы plugins.d/parsers.d (с именем файла)."""
+
+
+def _num(path: pathlib.Path, data: dict, key: str, cast: Callable, positive: bool = True):
+    v = data.get(key)
+    if v is None:
+        return None
+    try:
+        v = cast(v)
+    except (TypeError, ValueError):
+        raise SpecError(f"{path}: {key} must be a number")
+    if positive and v <= 0:
+        raise SpecError(f"{path}: {key} must be > 0")
+    return v
+
+
+def _command(path: pathlib.Path, data: dict, key: str, allow_str: bool, allow_list: bool) -> Optional[Command]:
+    v = data.get(key)
+    if v is None or v == "":
+        return None
+    if isinstance(v, str) and allow_str:
+        return template(v)
+    if isinstance(v, list) and allow_list and v:
+        return [template(str(x)) for x in v]
+    kinds = " or ".join(k for k, ok in (("a string", allow_str), ("a non-empty list", allow_list)) if ok)
+    raise SpecError(f"{path}: {key} must be {kinds}")
+
+
+def compile_plugin(name: str, path: pathlib.Path, data: Any) -> PluginSpec:
+    if data is None:
+        data = {}
+    if not isinstance(data, dict):
+        raise SpecError(f"{path}: plugin must be a mapping")
+    spec = PluginSpec(
+        name=name,
+        path=path,
+        raw=data,
+        image=str(data.get("image") or ""),
+        cmd=_command(path, data, "cmd", True, False),
+        argv=_command(path, data, "argv", False, True),
+        exec=_command(path, data, "exec", True, True),
+        fanout=data.get("fanout") or None,
+        batch_size=_num(path, data, "batch_size", int) or 64,
+        workers=_num(path, data, "workers", int),
+        input=str(data.get("input") or "alive"),
+        timeout=_num(path, data, "timeout", float),
+        step_timeout=_num(path, data, "step_timeout", float),
+        cache=bool(data.get("cache", True)),
+        pool_size=_num(path, data, "pool_size", int),
+    )
+    if not spec.templates():
+        raise SpecError(f"{path}: empty cmd (need cmd, argv or exec)")
+    if spec.exec is not None and spec.image in ("", "none"):
+        raise SpecError(f"{path}: exec requires image")
+    if spec.fanout is not None and spec.fanout not in FANOUT_MODES:
+        raise SpecError(f"{path}: unknown fanout {spec.fanout!r} ({' | '.join(FANOUT_MODES)})")
+    if spec.input not in FANOUT_INPUTS:
+        raise SpecError(f"{path}: unknown input {spec.input!r} (known: {', '.join(FANOUT_INPUTS)})")
+    return spec
+
+
+def _literal(expr: Any) -> Optional[str]:
+    if isinstance(expr, str) and len(expr) >= 2 and expr[0] == expr[-1] == "'":
+        return expr[1:-1]
+    return None
+
+
+def _compile_expr(path: pathlib.Path, key: str, expr: Any, compile_fn: Callable) -> Field:
+    lit = _literal(expr)
+    if lit is not None:
+        return ("lit", template(lit))
+    if not isinstance(expr, str) or not expr:
+        raise SpecError(f"{path}: {key} must be a non-empty expression")
+    try:
+        return ("expr", compile_fn(expr))
+    except Exception as e:
+        raise SpecError(f"{path}: {key}: invalid expression {expr!r}: {e}")
+
+
+def compile_parser(name: str, path: pathlib.Path, data: Any) -> ParserSpec:
+    if not isinstance(data, dict):
+        raise SpecError(f"{path}: parser must be a mapping")
+    ptype = data.get("type")
+    if ptype not in PARSER_TYPES:
+        raise SpecError(f"{path}: unknown type {ptype!r} ({' | '.join(PARSER_TYPES)})")
+    pattern = data.get("glob")
+    if not isinstance(pattern, str) or not pattern:
+        raise SpecError(f"{path}: glob must be a non-empty string")
+    fields = data.get("fields") or {}
+    if not isinstance(fields, dict):
+        raise SpecError(f"{path}: fields must be a mapping")
+    key, compile_fn = ("record_jmes", jmespath.compile) if ptype == "ndjson" else ("record_xpath", ET.XPath)
+    rec = data.get(key, "@" if ptype == "ndjson" else None)
+    if not isinstance(rec, str) or not rec:
+        raise SpecError(f"{path}: {key} must be a non-empty expression")
+    try:
+        record = compile_fn(rec)
+    except Exception as e:
+        raise SpecError(f"{path}: {key}: invalid expression {rec!r}: {e}")
+    return ParserSpec(
+        name=name,
+        path=path,
+        type=ptype,
+        glob=pattern,
+        record=record,
+        fields={str(k): _compile_expr(path, f"fields.{k}", v, compile_fn) for k, v in fields.items()},
+    )
+
+
+# --- кэш по файлам: (mtime_ns, size) -> скомпилированный объект ---
+
+_lock = threading.Lock()
+_compiled: Dict[pathlib.Path, Tuple[Tuple[int, int], Any]] = {}
+
+
+def _load(path: pathlib.Path, compile_fn: Callable[[str, pathlib.Path, Any], Any]):
+    st = path.stat()
+    stamp = (st.st_mtime_ns, st.st_size)
+    with _lock:
+        hit = _compiled.get(path)
+    if hit is not None and hit[0] == stamp:
+        return hit[1]
+    try:
+        data = yaml.safe_load(path.read_text(encoding="utf-8"))
+    except yaml.YAMLError as e:
+        raise SpecError(f"{path}: invalid YAML: {e}")
+    obj = compile_fn(path.stem, path, data)
+    with _lock:
+        _compiled[path] = (stamp, obj)
+    return obj
+
+
+def plugin_spec(home: pathlib.Path, name: str) -> PluginSpec:
+    p = pathlib.Path(home) / "plugins.d" / f"{name}.yaml"
+    if not p.exists():
+        raise FileNotFoundError(f"plugin yaml not found: {p}")
+    return _load(p, compile_plugin)
+
+
+def parser_specs(home: pathlib.Path) -> List[ParserSpec]:
+    paths = sorted(glob.glob(str(pathlib.Path(home) / "parsers.d" / "*.yaml")))
+    return [_load(pathlib.Path(p), compile_parser) for p in paths]
+
+
+def validate(home: pathlib.Path, steps: List[str]) -> List[str]:
+    """Все ошибки схемы плагинов шагов и парсеров (пусто — всё в порядке)."""
+    errors = []
+    for step in steps:
+        try:
+            plugin_spec(home, step)
+        except (FileNotFoundError, SpecError) as e:
+            errors.append(str(e))
+    for p in sorted(glob.glob(str(pathlib.Path(home) / "parsers.d" / "*.yaml"))):
+        try:
+            _load(pathlib.Path(p), compile_parser)
+        except SpecError as e:
+            errors.append(str(e))
+    return errors
@@ -41,7 +41,7 @@ def render_html(run_id: str, findings: List[Dict[str, Any]]) -> str:
       - Executive summary с инфографикой (для начальства),
       - навигация по хостам (sidebar),
       - блоки по каждому хосту (для сисадминов),
-      - фильтры по severity, инструменту и тексту.
+      - фильтры по severity, инструменту, источнику целей и тексту.
     """
     severity_order = ["critical", "high", "medium", "low", "info", "unknown"]
     sev_rank = {name: idx for idx, name in enumerate(severity_order)}
@@ -57,6 +57,7 @@ def render_html(run_id: str, findings: List[Dict[str, Any]]) -> str:
     total_findings = len(findings)
     sev_counts: Counter = Counter()
     tool_counts: Counter = Counter()
+    src_counts: Counter = Counter()
 
     # Группировка по хостам
     hosts: Dict[str, Dict[str, Any]] = {}
@@ -68,15 +69,20 @@ def render_html(run_id: str, findings: List[Dict[str, Any]]) -> str:
 
         sev_counts[sev] += 1
         tool_counts[tool] += 1
+        # источники целей (ftp/tg/local/autodiscovery) — проставляет parse_engine
+        srcs = [str(x) for x in (f.get("sources") or [])]
+        src_counts.update(srcs)
 
         if asset not in hosts:
             hosts[asset] = {
                 "asset": asset,
                 "findings": [],
                 "sev_counts": Counter(),
+                "sources": {},
             }
         hosts[asset]["findings"].append(f)
         hosts[asset]["sev_counts"][sev] += 1
+        hosts[asset]["sources"].update(dict.fromkeys(srcs))
 
     total_assets = len(hosts)
 
@@ -105,6 +111,7 @@ def render_html(run_id: str, findings: List[Dict[str, Any]]) -> str:
 
     # список инструментов (для фильтра)
     tools_sorted = sorted(tool_counts.keys(), key=lambda x: x.lower()) if tool_counts else []
+    sources_sorted = sorted(src_counts.keys())
 
     # helper: id для якоря по хосту
     def host_id(asset: str) -> str:
@@ -169,6 +176,7 @@ def render_html(run_id: str, findings: List[Dict[str, Any]]) -> str:
                         f'<span class="sev-badge sev-{name}">{html.escape(name.upper())}: {c}</span>'
                     )
             sev_summary = " ".join(sev_summary_parts) if sev_summary_parts else "Нет находок"
+            host_sources = ", ".join(data["sources"]) or "—"
 
             # сортируем находки по severity, потом по summary
             host_findings = list(data["findings"])
@@ -236,6 +244,8 @@ def render_html(run_id: str, findings: List[Dict[str, Any]]) -> str:
                     extra_bits.append(f"CWE: {str(cwe)}")
                 if template_id:
                     extra_bits.append(f"ID: {str(template_id)}")
+                if f.get("carried"):
+                    extra_bits.append(f"перенесено из {f.get('carried_from') or 'прошлого прогона'}")
                 extra_str = " · ".join(extra_bits) if extra_bits else ""
                 extra_html = html.escape(extra_str) if extra_str else "—"
 
@@ -253,12 +263,14 @@ def render_html(run_id: str, findings: List[Dict[str, Any]]) -> str:
                 filter_text_attr = html.escape(filter_text, quote=True)
                 sev_attr = html.escape(sev, quote=True)
                 tool_attr = html.escape(raw_tool, quote=True)
+                src_attr = html.escape(" ".join(str(x) for x in (f.get("sources") or [])), quote=True)
 
                 rows.append(
                     "<tr "
                     f'class="finding-row" '
                     f'data-sev="{sev_attr}" '
                     f'data-tool="{tool_attr}" '
+                    f'data-src="{src_attr}" '
                     f'data-text="{filter_text_attr}">'
                     f"<td>{sev_html}</td>"
                     f"<td>{location_cell}</td>"
@@ -285,6 +297,10 @@ def render_html(run_id: str, findings: List[Dict[str, Any]]) -> str:
       <span class="host-summary-label">Худшая критичность:</span>
       <span class="host-summary-value">{html.escape(worst.upper())}</span>
     </div>
+    <div class="host-summary-line">
+      <span class="host-summary-label">Источник целей:</span>
+      <span class="host-summary-value">{html.escape(host_sources)}</span>
+    </div>
     <div class="host-summary-sev">
       {sev_summary}
     </div>
@@ -359,6 +375,12 @@ def render_html(run_id: str, findings: List[Dict[str, Any]]) -> str:
     else:
         tool_options_html = '<option value="all">Все</option>'
 
+    # опции источников целей для фильтра
+    src_options_html = '<option value="all">Все</option>' + "".join(
+        f'<option value="{html.escape(src, quote=True)}">{html.escape(src)} ({src_counts[src]})</option>'
+        for src in sources_sorted
+    )
+
     html_str = f"""<!DOCTYPE html>
 <html lang="ru">
 <head>
@@ -847,6 +869,9 @@ def render_html(run_id: str, findings: List[Dict[str, Any]]) -> str:
     var toolSelect = document.getElementById('tool-filter');
     var toolValue = toolSelect ? toolSelect.value : 'all';
 
+    var srcSelect = document.getElementById('src-filter');
+    var srcValue = srcSelect ? srcSelect.value : 'all';
+
     var textInput = document.getElementById('text-filter');
     var textValue = textInput ? textInput.value.toLowerCase().trim() : '';
 
@@ -855,6 +880,7 @@ def render_html(run_id: str, findings: List[Dict[str, Any]]) -> str:
       var sev = row.getAttribute('data-sev') || 'unknown';
       var tool = row.getAttribute('data-tool') || '';
       var text = row.getAttribute('data-text') || '';
+      var src = ' ' + (row.getAttribute('data-src') || '') + ' ';
 
       var ok = true;
 
@@ -866,6 +892,10 @@ def render_html(run_id: str, findings: List[Dict[str, Any]]) -> str:
         ok = false;
       }}
 
+      if (ok && srcValue && srcValue !== 'all' && !src.includes(' ' + srcValue + ' ')) {{
+        ok = false;
+      }}
+
       if (ok && textValue && !text.includes(textValue)) {{
         ok = false;
       }}
@@ -882,6 +912,10 @@ def render_html(run_id: str, findings: List[Dict[str, Any]]) -> str:
     if (toolSelect) {{
       toolSelect.addEventListener('change', applyFilters);
     }}
+    var srcSelect = document.getElementById('src-filter');
+    if (srcSelect) {{
+      srcSelect.addEventListener('change', applyFilters);
+    }}
     var textInput = document.getElementById('text-filter');
     if (textInput) {{
       textInput.addEventListener('input', function() {{
@@ -984,6 +1018,13 @@ def render_html(run_id: str, findings: List[Dict[str, Any]]) -> str:
             </select>
           </label>
         </div>
+        <div class="filters-group">
+          <label>Источник целей:
+            <select id="src-filter">
+              {src_options_html}
+            </select>
+          </label>
+        </div>
         <div class="filters-group">
           <label>Поиск:
             <input id="text-filter" type="text" placeholder="фильтр по описанию, сервису, CVE..." />
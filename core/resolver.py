@@ -0,0 +1,143 @@
+# core/resolver.py
+import asyncio
+import json
+import os
+import pathlib
+import socket
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+# резолвер: host -> (список IP, TTL в секундах или None, если TTL неизвестен)
+Resolver = Callable[[str], Awaitable[Tuple[List[str], Optional[float]]]]
+
+
+def system_resolver(pool: ThreadPoolExecutor) -> Resolver:
+    """Резолвер поверх getaddrinfo (в отдельном пуле потоков). TTL не знает."""
+
+    async def resolve(host: str) -> Tuple[List[str], Optional[float]]:
+        loop = asyncio.get_running_loop()
+        infos = await loop.run_in_executor(
+            pool, lambda: socket.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+        )
+        ips: List[str] = []
+        for info in infos:
+            ip = info[4][0]
+            if ip not in ips:
+                ips.append(ip)
+        return ips, None
+
+    return resolve
+
+
+class DnsCache:
+    """
+    Персистентный DNS-кэш: AUTOPEN_HOME/state/dns_cache.json,
+    host -> {"ips": [...], "exp": unix_time}. Пустой ips — отрицательный ответ.
+    """
+
+    def __init__(self, path: pathlib.Path):
+        self.path = pathlib.Path(path)
+        self.entries: Dict[str, Dict] = {}
+
+    @classmethod
+    def load(cls, home: pathlib.Path) -> "DnsCache":
+        cache = cls(pathlib.Path(home) / "state" / "dns_cache.json")
+        if cache.path.exists():
+            try:
+                cache.entries = json.loads(cache.path.read_text(encoding="utf-8")) or {}
+            except Exception as e:
+                print(f"[01] aggregation: WARNING: dns cache is broken, ignoring: {e}", file=sys.stderr)
+        return cache
+
+    def get(self, host: str, now: float) -> Optional[List[str]]:
+        e = self.entries.get(host)
+        if e and e.get("exp", 0) > now:
+            return list(e.get("ips") or [])
+        return None
+
+    def put(self, host: str, ips: List[str], ttl: float, now: float) -> None:
+        self.entries[host] = {"ips": ips, "exp": now + ttl}
+
+    def save(self, now: Optional[float] = None) -> None:
+        now = time.time() if now is None else now
+        self.entries = {h: e for h, e in self.entries.items() if e.get("exp", 0) > now}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.entries, separators=(",", ":")), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+
+async def resolve_all(
+    hosts: Iterable[str],
+    resolver: Resolver,
+    concurrency: int = 64,
+    timeout: float = 5.0,
+    cache: Optional[DnsCache] = None,
+    default_ttl: float = 3600,
+    negative_ttl: float = 300,
+) -> Dict[str, List[str]]:
+    """
+    Параллельный резолвинг с ограничением concurrency.
+    TTL из ответа резолвера уважается; если его нет — default_ttl.
+    Возвращает host -> [ip, ...] (пустой список — не резолвится).
+    """
+    now = time.time()
+    out: Dict[str, List[str]] = {}
+    todo: List[str] = []
+    for h in hosts:
+        cached = cache.get(h, now) if cache is not None else None
+        if cached is not None:
+            out[h] = cached
+        else:
+            todo.append(h)
+
+    sem = asyncio.Semaphore(max(1, concurrency))
+
+    async def one(h: str):
+        async with sem:
+            try:
+                ips, ttl = await asyncio.wait_for(resolver(h), timeout)
+            except Exception:
+                ips, ttl = [], None
+        out[h] = ips
+        if cache is not None:
+            if ips:
+                cache.put(h, ips, default_ttl if ttl is None else ttl, now)
+            else:
+                cache.put(h, [], negative_ttl, now)
+
+    await asyncio.gather(*(one(h) for h in todo))
+    return out
+
+
+def resolve_hosts(
+    hosts: Iterable[str],
+    home: Optional[pathlib.Path] = None,
+    concurrency: int = 64,
+    timeout: float = 5.0,
+    default_ttl: float = 3600,
+    resolver: Optional[Resolver] = None,
+) -> Dict[str, List[str]]:
+    """
+    Синхронная обёртка: резолвинг с персистентным кэшем (если задан home).
+    resolver можно подменить (тесты, свой DNS-клиент).
+    getaddrinfo не прервать: зависшие по timeout потоки не ждём, они
+    доработают в фоне, а результат их уже не нужен.
+    """
+    cache = DnsCache.load(home) if home is not None else None
+    pool = ThreadPoolExecutor(max_workers=max(1, concurrency))
+    try:
+        res = resolver or system_resolver(pool)
+        out = asyncio.run(
+            resolve_all(hosts, res, concurrency, timeout, cache, default_ttl)
+        )
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    if cache is not None:
+        try:
+            cache.save()
+        except Exception as e:
+            print(f"[01] aggregation: WARNING: failed to save dns cache: {e}", file=sys.stderr)
+    return out
@@ -0,0 +1,72 @@
+# core/rtt.py
+import math
+import pathlib
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+from .pipeline import Timeouts
+from .utils import iter_lines, write_lines
+
+RTT_HEADER = "host\trtt_ms\tloss\ttimeout_ms\tretries"
+
+
+def timeout_hint(rtt: Optional[float], loss: Optional[float], cfg: Timeouts) -> Tuple[int, int]:
+    """
+    (таймаут мс, число повторов) для хоста:
+      LAN с RTT 0.3 мс -> min_ms, медленный WAN с RTT 400 мс -> 400 * factor,
+      RTT неизвестен (TCP без ответа, кэш) -> default_ms.
+    Потери добавляют повторы, а не таймаут.
+    """
+    if rtt is None:
+        timeout = cfg.default_ms
+    else:
+        timeout = math.ceil(rtt * cfg.factor)
+    timeout = min(cfg.max_ms, max(cfg.min_ms, timeout))
+    retries = cfg.retries
+    if loss:
+        retries += 2 if loss >= cfg.lossy else 1
+    return timeout, retries
+
+
+def write_rtt_file(
+    path: Union[str, pathlib.Path],
+    hosts: Iterable[str],
+    rtt: Dict[str, Optional[float]],
+    loss: Dict[str, float],
+    cfg: Timeouts,
+) -> int:
+    """
+    Sidecar для плагинов ({{rtt_file}}): TSV с заголовком
+      host  rtt_ms  loss  timeout_ms  retries
+    ("-" — не измерялось). Возвращает наибольший таймаут (для {{timeout_ms}}).
+    """
+    worst = 0
+
+    def _rows():
+        nonlocal worst
+        yield RTT_HEADER
+        for h in hosts:
+            r, l = rtt.get(h), loss.get(h)
+            timeout, retries = timeout_hint(r, l, cfg)
+            worst = max(worst, timeout)
+            yield "\t".join(
+                [h, "-" if r is None else f"{r:.3f}", "-" if l is None else f"{l:.3f}", str(timeout), str(retries)]
+            )
+
+    write_lines(path, _rows())
+    return worst or cfg.default_ms
+
+
+def read_rtt_file(path: Union[str, pathlib.Path]) -> Tuple[Dict[str, Optional[float]], Dict[str, float]]:
+    """Обратно к write_rtt_file: (host -> RTT мс или None, host -> потери). Нет файла — пусто."""
+    rtt: Dict[str, Optional[float]] = {}
+    loss: Dict[str, float] = {}
+    for row in iter_lines(path):
+        if row == RTT_HEADER:
+            continue
+        cols = row.split("\t")
+        if len(cols) < 3:
+            continue
+        rtt[cols[0]] = None if cols[1] == "-" else float(cols[1])
+        if cols[2] != "-":
+            loss[cols[0]] = float(cols[2])
+    return rtt, loss
@@ -0,0 +1,130 @@
+# core/scheduler.py
+import json
+import os
+import pathlib
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional
+
+from .pipeline import Pipeline
+
+# Результат шага: {"status": ok|failed|skipped, "seconds": float, "error": str|None}
+StepResult = Dict[str, object]
+
+
+def _children(pipe: Pipeline) -> Dict[str, List[str]]:
+    out: Dict[str, List[str]] = {n: [] for n in pipe.steps}
+    for n in pipe.steps:
+        for dep in pipe.spec(n).needs:
+            out[dep].append(n)
+    return out
+
+
+def critical_path(pipe: Pipeline, durations: Dict[str, float]) -> Dict[str, float]:
+    """
+    Для каждого шага — длина самой длинной цепочки от него до конца графа
+    (включая сам шаг). Шаги с неизвестной длительностью считаются за 1 с.
+    """
+    children = _children(pipe)
+    memo: Dict[str, float] = {}
+
+    def length(n: str) -> float:
+        if n not in memo:
+            memo[n] = durations.get(n, 1.0) + max((length(c) for c in children[n]), default=0.0)
+        return memo[n]
+
+    return {n: length(n) for n in pipe.steps}
+
+
+def run_dag(
+    pipe: Pipeline,
+    run_step: Callable[[str], Optional[str]],
+    durations: Optional[Dict[str, float]] = None,
+    on_done: Optional[Callable[[str, StepResult], None]] = None,
+) -> Dict[str, StepResult]:
+    """
+    Выполнить шаги пайплайна как DAG (needs), не более pipe.concurrency одновременно.
+    Из готовых шагов первым стартует тот, у кого длиннее критический путь
+    (по durations прошлых прогонов), при равенстве — по порядку в pipeline.yaml.
+    run_step(name) -> None (ok) или текст ошибки; исключение — тоже ошибка.
+    Ошибка шага с continue_on_error: false пропускает только его ветку
+    (все зависящие шаги), независимые шаги продолжают выполняться.
+    """
+    order = {n: i for i, n in enumerate(pipe.steps)}
+    prio = critical_path(pipe, durations or {})
+    children = _children(pipe)
+    waiting = {n: set(pipe.spec(n).needs) for n in pipe.steps}
+    results: Dict[str, StepResult] = {}
+
+    def _done(n: str, res: StepResult) -> None:
+        results[n] = res
+        if on_done is not None:
+            on_done(n, res)
+
+    def _skip(n: str, cause: str) -> None:
+        if n in results:
+            return
+        _done(n, {"status": "skipped", "seconds": 0.0, "error": f"needs {cause}"})
+        for c in children[n]:
+            _skip(c, n)
+
+    def _timed(n: str):
+        t0 = time.monotonic()
+        try:
+            err = run_step(n)
+        except Exception as e:
+            err = str(e) or type(e).__name__
+        return err, round(time.monotonic() - t0, 3)
+
+    ready = [n for n in pipe.steps if not waiting[n]]
+    running = {}
+    with ThreadPoolExecutor(max_workers=pipe.concurrency) as pool:
+        while ready or running:
+            ready.sort(key=lambda n: (-prio[n], order[n]))
+            while ready and len(running) < pipe.concurrency:
+                n = ready.pop(0)
+                running[pool.submit(_timed, n)] = n
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for f in done:
+                n = running.pop(f)
+                err, secs = f.result()
+                _done(n, {"status": "ok" if err is None else "failed", "seconds": secs, "error": err})
+                blocked = err is not None and not pipe.continues(n)
+                for c in children[n]:
+                    if blocked:
+                        _skip(c, n)
+                        continue
+                    waiting[c].discard(n)
+                    if not waiting[c] and c not in results:
+                        ready.append(c)
+    return results
+
+
+# --- длительности шагов между прогонами (для критического пути) ---
+
+def _times_file(home: pathlib.Path) -> pathlib.Path:
+    return pathlib.Path(home) / "state" / "step_times.json"
+
+
+def load_step_times(home: pathlib.Path) -> Dict[str, float]:
+    p = _times_file(home)
+    try:
+        data = json.loads(p.read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+    return {str(k): float(v) for k, v in data.items()} if isinstance(data, dict) else {}
+
+
+def save_step_times(home: pathlib.Path, results: Dict[str, StepResult], alpha: float = 0.5) -> None:
+    """Сглаженные (EMA) длительности успешных шагов: state/step_times.json."""
+    times = load_step_times(home)
+    for n, res in results.items():
+        if res.get("status") != "ok":
+            continue
+        secs = float(res.get("seconds") or 0.0)
+        times[n] = round(alpha * secs + (1 - alpha) * times[n], 3) if n in times else secs
+    p = _times_file(home)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    tmp = p.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps(times, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, p)
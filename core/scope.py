@@ -0,0 +1,26 @@
+# core/scope.py
+import pathlib
+from typing import Union
+
+from .targets import TargetSet
+from .utils import read_lines
+
+
+def exclude_file(home: Union[str, pathlib.Path]) -> pathlib.Path:
+    return pathlib.Path(home) / "config" / "exclude.txt"
+
+
+def load_exclusions(home: Union[str, pathlib.Path]) -> TargetSet:
+    """
+    Читаем config/exclude.txt (IP, CIDR, диапазоны, hostnames) в TargetSet.
+    CIDR берутся целиком (включая network/broadcast).
+    Нет файла — пустое множество.
+    """
+    return TargetSet(read_lines(exclude_file(home)), whole_networks=True)
+
+
+def in_scope(asset: str, exclusions: TargetSet) -> bool:
+    """Актив (IP, host, URL, host:port) не попал в исключения."""
+    if not asset or not exclusions:
+        return True
+    return str(asset) not in exclusions
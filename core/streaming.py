@@ -0,0 +1,99 @@
+# core/streaming.py
+import pathlib
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from .utils import write_text
+
+
+class BatchStreamer:
+    """
+    Конвейер [01] -> [02]: живые хосты приходят из aggregate() через push()
+    по мере обнаружения, копятся в батчи (batch_size хостов или flush_seconds
+    с первого хоста батча), и каждый батч сразу отдаётся шагам в пул воркеров.
+
+    run_batch(targets_file, batch_id) -> список ошибок [{"step", "error"}].
+    """
+
+    def __init__(
+        self,
+        batch_dir: pathlib.Path,
+        run_batch: Callable[[pathlib.Path, str], List[Dict[str, str]]],
+        batch_size: int = 256,
+        flush_seconds: float = 10.0,
+        workers: int = 4,
+    ):
+        self.batch_dir = pathlib.Path(batch_dir)
+        self.run_batch = run_batch
+        self.batch_size = max(1, batch_size)
+        self.flush_seconds = flush_seconds
+        self.errors: List[Dict[str, str]] = []
+        self.batches = 0
+        self.hosts = 0
+        # host -> RTT из проверки живости (для подсказок таймаутов батча)
+        self.rtt: Dict[str, Optional[float]] = {}
+        self._q: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers))
+        self._futures = []
+        self._seen = set()
+        self._thread = threading.Thread(target=self._loop, name="autopen-stream", daemon=True)
+
+    def start(self) -> "BatchStreamer":
+        self._thread.start()
+        return self
+
+    def push(self, host: str, rtt: Optional[float] = None) -> None:
+        """Колбэк on_alive для aggregate(): неблокирующий."""
+        self.rtt.setdefault(host, rtt)
+        self._q.put(host)
+
+    def close(self) -> List[Dict[str, str]]:
+        """Дослать последний батч и дождаться всех воркеров."""
+        self._q.put(None)
+        self._thread.join()
+        for f in self._futures:
+            try:
+                self.errors.extend(f.result() or [])
+            except Exception as e:
+                self.errors.append({"step": "_stream", "error": str(e)})
+        self._pool.shutdown(wait=True)
+        return self.errors
+
+    # --- внутреннее ---
+
+    def _flush(self, batch: List[str]) -> None:
+        if not batch:
+            return
+        self.batches += 1
+        batch_id = f"{self.batches:04d}"
+        path = self.batch_dir / f"batch_{batch_id}.txt"
+        write_text(path, "\n".join(batch))
+        self._futures.append(self._pool.submit(self.run_batch, path, batch_id))
+
+    def _loop(self) -> None:
+        batch: List[str] = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                host = self._q.get(timeout=timeout)
+            except queue.Empty:
+                self._flush(batch)
+                batch, deadline = [], None
+                continue
+            if host is None:
+                self._flush(batch)
+                return
+            if host in self._seen:
+                continue
+            self._seen.add(host)
+            self.hosts += 1
+            batch.append(host)
+            if deadline is None:
+                deadline = time.monotonic() + self.flush_seconds
+            if len(batch) >= self.batch_size:
+                self._flush(batch)
+                batch, deadline = [], None
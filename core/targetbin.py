@@ -0,0 +1,252 @@
+# core/targetbin.py
+import bisect
+import ipaddress
+import mmap
+import os
+import pathlib
+import struct
+from typing import Iterator, List, Optional, Tuple, Union
+
+from .targets import TargetSet, normalize_host
+
+# Бинарный формат множества целей (*.bin рядом с *.txt в 01-aggregated):
+#
+#   header  : MAGIC(8) n4(u64) n6(u64) nh(u64) blob_len(u64)
+#   v4      : n4 x (start u32, end u32)          — отсортированные слитые интервалы
+#   v4 cum  : n4 x u64                            — сколько адресов до интервала i
+#   v6      : n6 x (start u128, end u128)        — big-endian
+#   v6 cum  : n6 x u128                           — big-endian
+#   hosts   : (nh + 1) x u64 смещений + utf-8 blob — hostnames, отсортированы
+#
+# Все числа little-endian, кроме u128 (big-endian, как в ipaddress.packed).
+# Одиночные адреса — интервалы длины 1; смежные адреса склеиваются.
+MAGIC = b"APTSET1\0"
+_HDR = struct.Struct("<8sQQQQ")
+_R4 = struct.Struct("<II")
+_U64 = struct.Struct("<Q")
+
+
+def _u128(v: int) -> bytes:
+    return v.to_bytes(16, "big")
+
+
+def write_target_file(path: Union[str, pathlib.Path], ts: TargetSet) -> None:
+    """Записать TargetSet в бинарный файл (атомарно)."""
+    p = pathlib.Path(path)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    r4, r6 = ts.ranges(4), ts.ranges(6)
+    hosts = sorted(ts.hostnames)
+    blob = [h.encode("utf-8") for h in hosts]
+
+    tmp = p.with_suffix(p.suffix + ".tmp")
+    with open(tmp, "wb") as fw:
+        fw.write(_HDR.pack(MAGIC, len(r4), len(r6), len(hosts), sum(len(b) for b in blob)))
+        for s, e in r4:
+            fw.write(_R4.pack(s, e))
+        cum = 0
+        for s, e in r4:
+            fw.write(_U64.pack(cum))
+            cum += e - s + 1
+        for s, e in r6:
+            fw.write(_u128(s) + _u128(e))
+        cum = 0
+        for s, e in r6:
+            fw.write(_u128(cum))
+            cum += e - s + 1
+        off = 0
+        for b in blob:
+            fw.write(_U64.pack(off))
+            off += len(b)
+        fw.write(_U64.pack(off))
+        for b in blob:
+            fw.write(b)
+    os.replace(tmp, p)
+
+
+class _Column:
+    """Ленивая «последовательность» поверх mmap для bisect."""
+
+    def __init__(self, n: int, get):
+        self.n, self.get = n, get
+
+    def __len__(self) -> int:
+        return self.n
+
+    def __getitem__(self, i: int):
+        if not 0 <= i < self.n:
+            raise IndexError(i)
+        return self.get(i)
+
+
+class TargetFile:
+    """
+    Чтение бинарного файла целей через mmap, без разбора текста:
+      len(tf), host in tf, tf[i], tf.slice(a, b), tf.shard(k, n) — O(1)/O(log n).
+    Порядок адресов: IPv4, IPv6 (по возрастанию), затем hostnames (по алфавиту).
+    """
+
+    def __init__(self, path: Union[str, pathlib.Path]):
+        self.path = pathlib.Path(path)
+        self._fh = open(self.path, "rb")
+        size = os.fstat(self._fh.fileno()).st_size
+        self._mm = mmap.mmap(self._fh.fileno(), size, access=mmap.ACCESS_READ) if size else b""
+        magic, self.n4, self.n6, self.nh, blob_len = _HDR.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path}: not an autopen target file")
+        self._o4 = _HDR.size
+        self._o4c = self._o4 + self.n4 * 8
+        self._o6 = self._o4c + self.n4 * 8
+        self._o6c = self._o6 + self.n6 * 32
+        self._oh = self._o6c + self.n6 * 16
+        self._ob = self._oh + (self.nh + 1) * 8
+
+        self.count4 = self._cum4(self.n4)
+        self.count6 = self._cum6(self.n6)
+
+    def close(self) -> None:
+        if isinstance(self._mm, mmap.mmap):
+            self._mm.close()
+        self._fh.close()
+
+    def __enter__(self) -> "TargetFile":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # --- доступ к колонкам ---
+
+    def _r4(self, i: int) -> Tuple[int, int]:
+        return _R4.unpack_from(self._mm, self._o4 + i * 8)
+
+    def _cum4(self, i: int) -> int:
+        if i == self.n4:
+            if not self.n4:
+                return 0
+            s, e = self._r4(i - 1)
+            return self._cum4(i - 1) + e - s + 1
+        return _U64.unpack_from(self._mm, self._o4c + i * 8)[0]
+
+    def _r6(self, i: int) -> Tuple[int, int]:
+        o = self._o6 + i * 32
+        b = self._mm[o:o + 32]
+        return int.from_bytes(b[:16], "big"), int.from_bytes(b[16:], "big")
+
+    def _cum6(self, i: int) -> int:
+        if i == self.n6:
+            if not self.n6:
+                return 0
+            s, e = self._r6(i - 1)
+            return self._cum6(i - 1) + e - s + 1
+        o = self._o6c + i * 16
+        return int.from_bytes(self._mm[o:o + 16], "big")
+
+    def _host(self, i: int) -> str:
+        a, b = struct.unpack_from("<QQ", self._mm, self._oh + i * 8)
+        return bytes(self._mm[self._ob + a:self._ob + b]).decode("utf-8")
+
+    # --- запросы ---
+
+    def __len__(self) -> int:
+        return self.count4 + self.count6 + self.nh
+
+    def ranges(self, version: int) -> List[Tuple[int, int]]:
+        if version == 4:
+            return [self._r4(i) for i in range(self.n4)]
+        return [self._r6(i) for i in range(self.n6)]
+
+    def _find(self, version: int, value: int) -> Optional[int]:
+        n, get = (self.n4, self._r4) if version == 4 else (self.n6, self._r6)
+        i = bisect.bisect_right(_Column(n, lambda k: get(k)[0]), value) - 1
+        if i >= 0 and get(i)[1] >= value:
+            return i
+        return None
+
+    def __contains__(self, item: str) -> bool:
+        s = normalize_host(str(item))
+        try:
+            ip = ipaddress.ip_address(s)
+        except ValueError:
+            h = s.lower().rstrip(".")
+            i = bisect.bisect_left(_Column(self.nh, self._host), h)
+            return i < self.nh and self._host(i) == h
+        return self._find(ip.version, int(ip)) is not None
+
+    def __getitem__(self, idx: int) -> str:
+        n = len(self)
+        if idx < 0:
+            idx += n
+        if not 0 <= idx < n:
+            raise IndexError(idx)
+        if idx < self.count4:
+            i = bisect.bisect_right(_Column(self.n4, self._cum4), idx) - 1
+            return str(ipaddress.IPv4Address(self._r4(i)[0] + idx - self._cum4(i)))
+        idx -= self.count4
+        if idx < self.count6:
+            i = bisect.bisect_right(_Column(self.n6, self._cum6), idx) - 1
+            return str(ipaddress.IPv6Address(self._r6(i)[0] + idx - self._cum6(i)))
+        return self._host(idx - self.count6)
+
+    def slice(self, start: int, stop: int) -> Iterator[str]:
+        """Адреса с позиции start по stop (не включая): поиск начала — O(log n)."""
+        stop = min(stop, len(self))
+        if start >= stop:
+            return
+        pos = start
+        # IPv4 / IPv6 — идём по интервалам от найденного
+        for count, n, rng, cum, cls in (
+            (self.count4, self.n4, self._r4, self._cum4, ipaddress.IPv4Address),
+            (self.count6, self.n6, self._r6, self._cum6, ipaddress.IPv6Address),
+        ):
+            if pos >= stop:
+                return
+            if pos < count:
+                i = bisect.bisect_right(_Column(n, cum), pos) - 1
+                while i < n and pos < min(stop, count):
+                    s, e = rng(i)
+                    v = s + pos - cum(i)
+                    while v <= e and pos < min(stop, count):
+                        yield str(cls(v))
+                        v += 1
+                        pos += 1
+                    i += 1
+            stop, pos = stop - count, pos - count
+        for k in range(max(0, pos), min(stop, self.nh)):
+            yield self._host(k)
+
+    def shard(self, k: int, n: int) -> Iterator[str]:
+        """k-я из n примерно равных частей."""
+        total = len(self)
+        return self.slice(total * k // n, total * (k + 1) // n)
+
+    def __iter__(self) -> Iterator[str]:
+        return self.slice(0, len(self))
+
+    def to_target_set(self) -> TargetSet:
+        ts = TargetSet()
+        for v in (4, 6):
+            for s, e in self.ranges(v):
+                ts.add_range(v, s, e)
+        for k in range(self.nh):
+            ts.add_host(self._host(k))
+        return ts
+
+
+def text_view(bin_path: Union[str, pathlib.Path], txt_path: Union[str, pathlib.Path, None] = None) -> pathlib.Path:
+    """
+    Текстовое представление (по строке на цель) — генерируется лениво,
+    только если .txt нет или он старше .bin.
+    """
+    b = pathlib.Path(bin_path)
+    t = pathlib.Path(txt_path) if txt_path else b.with_suffix(".txt")
+    if t.exists() and t.stat().st_mtime >= b.stat().st_mtime:
+        return t
+    tmp = t.with_suffix(".txt.tmp")
+    with TargetFile(b) as tf, open(tmp, "w", encoding="utf-8") as fw:
+        first = True
+        for h in tf:
+            fw.write(h if first else "\n" + h)
+            first = False
+    os.replace(tmp, t)
+    return t
+
@@ -0,0 +1,447 @@
+# core/targets.py
+import bisect
+import ipaddress
+import itertools
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+# (start, end) — включительный интервал адресов в виде int
+Range = Tuple[int, int]
+
+
+def normalize_host(raw: str) -> str:
+    """
+    Отрезаем от строки цели схему, путь и порт:
+      https://example.com:8443/x -> example.com
+      [2001:db8::1]:443          -> 2001:db8::1
+      10.0.0.0/24                -> 10.0.0.0/24 (CIDR не трогаем)
+    """
+    s = raw.strip()
+    if "://" in s:
+        s = s.split("://", 1)[1]
+        # в URL после хоста идёт путь, CIDR там быть не может
+        s = s.split("/", 1)[0]
+    elif "/" in s:
+        head, tail = s.split("/", 1)
+        # 10.0.0.0/24 оставляем как есть, host/path — режем путь
+        s = s if tail.isdigit() else head
+
+    # [v6]:port
+    if s.startswith("["):
+        return s[1:].split("]", 1)[0]
+
+    # host:port (одно двоеточие), IPv6 без скобок не трогаем
+    if s.count(":") == 1:
+        s = s.split(":", 1)[0]
+    return s
+
+
+_DEFAULT_PORTS = {"http": 80, "https": 443, "ftp": 21, "ftps": 990, "ssh": 22}
+
+
+def parse_endpoint(raw: str) -> Optional[str]:
+    """
+    Сервисная часть цели, если она есть:
+      https://app:8443/login -> https://app:8443/login (URL как есть)
+      app:8443 / [2001:db8::1]:443 -> host:port
+    Для голых хостов, IP и сетей — None.
+    """
+    s = raw.strip()
+    if "://" in s:
+        scheme, rest = s.split("://", 1)
+        return f"{scheme.lower()}://{rest}" if rest else None
+    s = s.split("/", 1)[0]
+    if s.startswith("["):
+        host, _, tail = s[1:].partition("]")
+        return s if tail.startswith(":") and tail[1:].isdigit() else None
+    if s.count(":") == 1:
+        host, port = s.split(":", 1)
+        return f"{host}:{port}" if host and port.isdigit() else None
+    return None
+
+
+def endpoint_port(ep: str) -> Optional[int]:
+    """Порт endpoint'а (для URL без порта — порт схемы по умолчанию)."""
+    try:
+        if "://" in ep:
+            u = urlsplit(ep)
+            return u.port or _DEFAULT_PORTS.get(u.scheme)
+        return urlsplit("//" + ep).port
+    except ValueError:
+        return None
+
+
+def _parse_range(s: str) -> Optional[Tuple[int, int, int]]:
+    """
+    Диапазон IP: A.B.C.D-E или A.B.C.D-A.B.C.H (и IPv6 a::1-a::ff).
+    Возвращает (version, start, end) либо None.
+    """
+    if "-" not in s:
+        return None
+    left, right = s.split("-", 1)
+    try:
+        start = ipaddress.ip_address(left)
+        if "." in right or ":" in right:
+            end = ipaddress.ip_address(right)
+        else:
+            # если правая часть только последний октет
+            base = left.split(".")
+            if len(base) != 4:
+                return None
+            end = ipaddress.ip_address(".".join(base[:3] + [right]))
+    except ValueError:
+        return None
+    if start.version != end.version or int(start) > int(end):
+        return None
+    return start.version, int(start), int(end)
+
+
+def _network_hosts(net) -> Range:
+    """
+    Интервал, эквивалентный net.hosts():
+      - IPv4 без network/broadcast (кроме /31, /32)
+      - IPv6 без subnet-router anycast (кроме /127, /128)
+    """
+    first, last = int(net.network_address), int(net.broadcast_address)
+    if net.version == 4:
+        if net.prefixlen < 31:
+            return first + 1, last - 1
+        return first, last
+    if net.prefixlen < 127:
+        return first + 1, last
+    return first, last
+
+
+def parse_target(raw: str, whole_networks: bool = False) -> Optional[Tuple[str, object]]:
+    """
+    Разбор одной строки цели:
+      ("range", (version, start, end)) — IP, CIDR или диапазон
+      ("host", "example.com")          — всё остальное
+    Пустые строки и комментарии — None.
+    whole_networks=True — CIDR целиком, с network/broadcast (для исключений).
+    """
+    s = raw.strip()
+    if not s or s.startswith("#"):
+        return None
+    s = normalize_host(s)
+    if not s:
+        return None
+
+    rng = _parse_range(s)
+    if rng is not None:
+        return "range", rng
+
+    # CIDR / одно IP
+    try:
+        net = ipaddress.ip_network(s, strict=False)
+    except ValueError:
+        # не IP — считаем, что это hostname
+        return "host", s.lower().rstrip(".")
+    if whole_networks:
+        first, last = int(net.network_address), int(net.broadcast_address)
+    else:
+        first, last = _network_hosts(net)
+    return "range", (net.version, first, last)
+
+
+def _merge(ranges: List[Range]) -> List[Range]:
+    """Сортируем и склеиваем пересекающиеся/смежные интервалы: O(n log n)."""
+    out: List[Range] = []
+    for start, end in sorted(ranges):
+        if out and start <= out[-1][1] + 1:
+            if end > out[-1][1]:
+                out[-1] = (out[-1][0], end)
+        else:
+            out.append((start, end))
+    return out
+
+
+def _subtract(a: List[Range], b: List[Range]) -> List[Range]:
+    """a \\ b для отсортированных слитых списков интервалов."""
+    out: List[Range] = []
+    j = 0
+    for start, end in a:
+        cur = start
+        # пропускаем вычитаемые интервалы, целиком лежащие левее
+        while j < len(b) and b[j][1] < cur:
+            j += 1
+        k = j
+        while k < len(b) and b[k][0] <= end:
+            bs, be = b[k]
+            if bs > cur:
+                out.append((cur, bs - 1))
+            cur = max(cur, be + 1)
+            if cur > end:
+                break
+            k += 1
+        if cur <= end:
+            out.append((cur, end))
+    return out
+
+
+def _block_parts(ranges: List[Range], host_bits: int) -> Iterator[List[Range]]:
+    """Интервалы, нарезанные по блокам 2**host_bits адресов: по списку кусков на блок."""
+    cur, parts = None, []
+    for start, end in ranges:
+        while start <= end:
+            block = start >> host_bits
+            stop = min(end, ((block + 1) << host_bits) - 1)
+            if block != cur:
+                if parts:
+                    yield parts
+                cur, parts = block, []
+            parts.append((start, stop))
+            start = stop + 1
+    if parts:
+        yield parts
+
+
+# сколько блоков чередуем одновременно (65536 /24 = весь /8) — память ограничена
+_INTERLEAVE_WINDOW = 1 << 16
+
+
+def _interleave(ranges: List[Range], host_bits: int) -> Iterator[int]:
+    """
+    Round-robin по блокам: первый адрес каждого блока, затем второй и т.д.
+    Порядок детерминирован; блоки берутся окнами по _INTERLEAVE_WINDOW.
+    """
+    blocks = _block_parts(ranges, host_bits)
+    while True:
+        # курсор блока: [куски, индекс куска, текущий адрес]
+        active = [[parts, 0, parts[0][0]] for parts in itertools.islice(blocks, _INTERLEAVE_WINDOW)]
+        if not active:
+            return
+        while active:
+            nxt = []
+            for cur in active:
+                parts, i, value = cur
+                yield value
+                value += 1
+                if value > parts[i][1]:
+                    i += 1
+                    if i == len(parts):
+                        continue
+                    value = parts[i][0]
+                cur[1], cur[2] = i, value
+                nxt.append(cur)
+            active = nxt
+
+
+class Interleaved:
+    """
+    Вид на TargetSet в порядке чередования подсетей: вместо 10.0.0.1, 10.0.0.2, ...
+    идёт 10.0.0.1, 10.0.1.1, 10.0.2.1, ..., 10.0.0.2, ... — нагрузка размазывается
+    по /block_prefix (для IPv6 — блоки того же размера), hostnames — в конце.
+    Переитерируем; len/in/bool — как у исходного множества.
+    """
+
+    def __init__(self, ts: "TargetSet", block_prefix: int = 24):
+        self.ts = ts
+        self.host_bits = 32 - block_prefix
+
+    def __iter__(self) -> Iterator[str]:
+        for v, cls in ((4, ipaddress.IPv4Address), (6, ipaddress.IPv6Address)):
+            for i in _interleave(self.ts.ranges(v), self.host_bits):
+                yield str(cls(i))
+        yield from self.ts.hostnames
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    def __bool__(self) -> bool:
+        return bool(self.ts)
+
+    def __contains__(self, item: str) -> bool:
+        return item in self.ts
+
+
+class TargetSet:
+    """
+    Компактное множество целей.
+    IP/CIDR/диапазоны хранятся слитыми интервалами int (отдельно IPv4/IPv6),
+    hostnames — отдельным множеством (с сохранением порядка добавления).
+    Конкретные адреса получаются лениво — через итерацию.
+    """
+
+    def __init__(self, lines=None, whole_networks: bool = False):
+        self.whole_networks = whole_networks
+        self._ranges: Dict[int, List[Range]] = {4: [], 6: []}
+        self._dirty = False
+        self._starts: Dict[int, List[int]] = {4: [], 6: []}
+        self.hostnames: Dict[str, None] = {}
+        # host/IP -> endpoint'ы (URL, host:port), заданные в целях явно
+        self.endpoints: Dict[str, Dict[str, None]] = {}
+        if lines is not None:
+            self.update(lines)
+
+    # --- наполнение ---
+
+    def add_range(self, version: int, start: int, end: int) -> None:
+        if start > end:
+            return
+        self._ranges[version].append((start, end))
+        self._dirty = True
+
+    def add_ip(self, ip: str) -> None:
+        a = ipaddress.ip_address(ip)
+        self.add_range(a.version, int(a), int(a))
+
+    def add_host(self, host: str) -> None:
+        self.hostnames[host] = None
+
+    def add(self, raw: str) -> bool:
+        """Добавить одну строку цели. False — если строка пустая/комментарий."""
+        parsed = parse_target(raw, self.whole_networks)
+        if parsed is None:
+            return False
+        kind, val = parsed
+        if kind == "range":
+            self.add_range(*val)
+            version, start, end = val
+            cls = ipaddress.IPv4Address if version == 4 else ipaddress.IPv6Address
+            key = str(cls(start)) if start == end else None
+        else:
+            self.add_host(val)
+            key = val
+        if key is not None:
+            ep = parse_endpoint(raw)
+            if ep is not None:
+                self.add_endpoint(key, ep)
+        return True
+
+    def add_endpoint(self, host: str, ep: str) -> None:
+        self.endpoints.setdefault(host, {})[ep] = None
+
+    def update(self, lines) -> int:
+        n = 0
+        for line in lines:
+            if self.add(line):
+                n += 1
+        return n
+
+    # --- нормализация ---
+
+    def _normalize(self) -> None:
+        if not self._dirty:
+            return
+        for v in (4, 6):
+            self._ranges[v] = _merge(self._ranges[v])
+            self._starts[v] = [r[0] for r in self._ranges[v]]
+        self._dirty = False
+
+    def ranges(self, version: int) -> List[Range]:
+        self._normalize()
+        return self._ranges[version]
+
+    # --- запросы ---
+
+    def count_ips(self) -> int:
+        return sum(e - s + 1 for v in (4, 6) for s, e in self.ranges(v))
+
+    def __len__(self) -> int:
+        return self.count_ips() + len(self.hostnames)
+
+    def __bool__(self) -> bool:
+        return bool(self.hostnames) or any(self.ranges(v) for v in (4, 6))
+
+    def contains_ip(self, version: int, value: int) -> bool:
+        self._normalize()
+        i = bisect.bisect_right(self._starts[version], value) - 1
+        return i >= 0 and self._ranges[version][i][1] >= value
+
+    def __contains__(self, item: str) -> bool:
+        s = normalize_host(str(item))
+        try:
+            ip = ipaddress.ip_address(s)
+        except ValueError:
+            return s.lower().rstrip(".") in self.hostnames
+        return self.contains_ip(ip.version, int(ip))
+
+    def __iter__(self) -> Iterator[str]:
+        """Ленивое разворачивание: IPv4, затем IPv6, затем hostnames."""
+        for v, cls in ((4, ipaddress.IPv4Address), (6, ipaddress.IPv6Address)):
+            for start, end in self.ranges(v):
+                for i in range(start, end + 1):
+                    yield str(cls(i))
+        yield from self.hostnames
+
+    def interleaved(self, block_prefix: int = 24) -> Interleaved:
+        """Ленивый обход с чередованием подсетей (см. Interleaved)."""
+        return Interleaved(self, block_prefix)
+
+    # --- операции над множествами ---
+
+    def union(self, other: "TargetSet") -> "TargetSet":
+        """Объединение: интервалы сливаются при следующем обращении."""
+        out = self.ip_set()
+        out.hostnames = dict(self.hostnames)
+        for v in (4, 6):
+            out._ranges[v] = out._ranges[v] + list(other.ranges(v))
+        out._dirty = True
+        out.hostnames.update(other.hostnames)
+        for src in (self, other):
+            for h, eps in src.endpoints.items():
+                out.endpoints.setdefault(h, {}).update(eps)
+        return out
+
+    def __or__(self, other: "TargetSet") -> "TargetSet":
+        return self.union(other)
+
+    # --- сериализация (состояние между прогонами) ---
+
+    def to_dict(self) -> Dict[str, list]:
+        return {
+            "v4": [list(r) for r in self.ranges(4)],
+            "v6": [list(r) for r in self.ranges(6)],
+            "hostnames": list(self.hostnames),
+            "endpoints": {h: list(e) for h, e in self.endpoints.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, list]) -> "TargetSet":
+        out = cls()
+        for v in (4, 6):
+            for start, end in data.get(f"v{v}") or []:
+                out.add_range(v, int(start), int(end))
+        for h in data.get("hostnames") or []:
+            out.add_host(h)
+        for h, eps in (data.get("endpoints") or {}).items():
+            for ep in eps:
+                out.add_endpoint(h, ep)
+        return out
+
+    def ip_set(self) -> "TargetSet":
+        """Копия только IP-части (без hostnames)."""
+        out = TargetSet()
+        for v in (4, 6):
+            out._ranges[v] = list(self.ranges(v))
+            out._starts[v] = list(self._starts[v])
+        return out
+
+    def subtract(self, other: "TargetSet") -> "TargetSet":
+        """
+        Разность множеств: вычитание интервалов за один проход O(n + m),
+        без перебора отдельных адресов (большие /16 внутри /8 ничего не стоят).
+        """
+        out = TargetSet()
+        for v in (4, 6):
+            out._ranges[v] = _subtract(self.ranges(v), other.ranges(v))
+            out._starts[v] = [r[0] for r in out._ranges[v]]
+        out.hostnames = {h: None for h in self.hostnames if h not in other.hostnames}
+        out.endpoints = {h: dict(e) for h, e in self.endpoints.items() if h in out}
+        return out
+
+    def __sub__(self, other: "TargetSet") -> "TargetSet":
+        return self.subtract(other)
+
+    def endpoints_for(self, hosts) -> Iterator[str]:
+        """Endpoint'ы заданных хостов (например, только живых)."""
+        for h in hosts:
+            yield from self.endpoints.get(h, ())
+
+    def cidrs(self) -> Iterator[str]:
+        """Интервалы в виде минимального набора CIDR (для логов/сырых файлов)."""
+        for v, cls in ((4, ipaddress.IPv4Address), (6, ipaddress.IPv6Address)):
+            for start, end in self.ranges(v):
+                for net in ipaddress.summarize_address_range(cls(start), cls(end)):
+                    yield str(net)
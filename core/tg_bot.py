@@ -81,11 +81,12 @@ def _norm_severity(s: str) -> str:
     return s
 
 
-def _last_severity_stats():
+def _last_severity_stats(source: str | None = None):
     """
     Считает статистику по критичностям для последнего прогона:
     возвращает dict с полями total и by (словарь severity -> count),
     либо None, если не удалось прочитать данные.
+    source — только находки по целям из этого источника (ftp, tg, local, autodiscovery).
     """
     try:
         # используем _last_run_info, которую мы уже добавляли
@@ -117,6 +118,8 @@ def _last_severity_stats():
                     obj = json.loads(line)
                 except Exception:
                     continue
+                if source and source not in (obj.get("sources") or []):
+                    continue
                 total += 1
                 sev = _norm_severity(obj.get("severity"))
                 counts[sev] += 1
@@ -146,7 +149,7 @@ def _last_run_info():
 @router.message(Command("start"))
 async def start(m: Message):
     if not _allow(m): return
-    await m.answer("Привет! Команды: /run, /status, /stop, /last")
+    await m.answer("Привет! Команды: /run, /status, /stop, /last, /sources")
 
 @router.message(Command("status"))
 async def status(m: Message):
@@ -240,6 +243,49 @@ async def last(m: Message):
         except Exception as e:
             await m.answer(f"⚠️ Не удалось отправить PDF-отчёт: {e}")
 
+def _last_provenance():
+    """Счётчики целей по источникам (01-aggregated/provenance.json) последнего прогона."""
+    r = _last_report()
+    if not r:
+        return None
+    p = r.parents[1] / "01-aggregated" / "provenance.json"
+    try:
+        data = json.loads(p.read_text(encoding="utf-8"))
+    except Exception:
+        return None
+    return {"targets": data.get("targets") or {}, "alive": data.get("alive") or {}}
+
+@router.message(Command("sources"))
+async def sources(m: Message):
+    """/sources — цели и находки по источникам; /sources ftp — критичности только по ним."""
+    if not _allow(m):
+        return
+
+    parts = (m.text or "").split()
+    src = parts[1].lower() if len(parts) > 1 else None
+    prov = _last_provenance()
+    if prov is None:
+        await m.answer("Нет данных о происхождении целей (provenance.json)")
+        return
+
+    sev_order = ["critical", "high", "medium", "low", "info", "unknown"]
+    names = [src] if src else list(prov["targets"])
+    if src and src not in prov["targets"]:
+        await m.answer(f"Неизвестный источник: {src}. Есть: {', '.join(prov['targets'])}")
+        return
+
+    lines = ["📦 Источники целей (последний прогон):"]
+    for name in names:
+        stats = _last_severity_stats(name) or {"total": 0, "by": {}}
+        by = stats.get("by") or {}
+        sev_line = ", ".join(f"{s}: {by[s]}" for s in sev_order if by.get(s)) or "—"
+        lines.append(
+            f"- {name}: целей {prov['targets'].get(name, 0)}, "
+            f"живых {prov['alive'].get(name, 0)}, "
+            f"находок {stats.get('total', 0)} ({sev_line})"
+        )
+    await m.answer("\n".join(lines))
+
 @router.message(Command("run"))
 async def run(m: Message):
     if not _allow(m):
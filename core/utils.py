@@ -1,6 +1,6 @@
 # core/utils.py
 from pathlib import Path
-from typing import List, Union
+from typing import Iterable, Iterator, List, Union
 import sys
 
 
@@ -16,31 +16,53 @@ def write_text(path: Union[str, Path], content: str) -> None:
     p.write_text(content or "", encoding="utf-8")
 
 
-def read_lines(path: Union[str, Path]) -> List[str]:
+def iter_lines(path: Union[str, Path, None]) -> Iterator[str]:
     """
-    Прочитать файл построчно:
-    - если файла нет — вернуть []
+    Генератор строк файла (файл целиком в память не читается):
+    - если файла нет — ничего не отдаёт
     - обрезать пробелы
     - пропускать пустые строки и строки-комментарии (начинающиеся с '#')
     """
+    if path is None:
+        return
     p = Path(path)
 
     if not p.exists():
-        return []
+        return
 
     try:
-        data = p.read_text(encoding="utf-8")
+        with p.open("r", encoding="utf-8") as fh:
+            for line in fh:
+                line = line.strip()
+                if not line:
+                    continue
+                if line.startswith("#"):
+                    continue
+                yield line
     except Exception as e:
-        print(f"[utils.read_lines] WARNING: can't read {p}: {e}", file=sys.stderr)
-        return []
-
-    lines: List[str] = []
-    for line in data.splitlines():
-        line = line.strip()
-        if not line:
-            continue
-        if line.startswith("#"):
-            continue
-        lines.append(line)
-
-    return lines
+        print(f"[utils.iter_lines] WARNING: can't read {p}: {e}", file=sys.stderr)
+
+
+def read_lines(path: Union[str, Path, None]) -> List[str]:
+    """
+    Прочитать файл построчно в список (см. iter_lines):
+    - если файла нет — вернуть []
+    """
+    return list(iter_lines(path))
+
+
+def write_lines(path: Union[str, Path], lines: Iterable[str]) -> int:
+    """
+    Потоковая запись строк в файл (по одной на строку, UTF-8),
+    родительская директория создаётся. Возвращает число записанных строк.
+    """
+    p = Path(path)
+    if p.parent:
+        p.parent.mkdir(parents=True, exist_ok=True)
+    n = 0
+    with p.open("w", encoding="utf-8") as fw:
+        for line in lines:
+            fw.write(line)
+            fw.write("\n")
+            n += 1
+    return n
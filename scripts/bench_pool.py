@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Сравнение задержки запуска плагина: холодный docker run --rm на каждый
+запуск против docker exec в тёплый контейнер пула.
+
+  python scripts/bench_pool.py --image alpine:3.20 -n 20 --cmd true
+"""
+import argparse
+import pathlib
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+from core.executor import run_command_sync  # noqa: E402
+from core.pipeline import Pool  # noqa: E402
+from core.pool import ImagePool, cold_argv  # noqa: E402
+
+
+def _summary(name: str, xs: list) -> str:
+    xs = sorted(xs)
+    p95 = xs[min(len(xs) - 1, int(round(0.95 * (len(xs) - 1))))]
+    return (
+        f"{name:5s} n={len(xs)} mean={statistics.mean(xs) * 1000:.1f}ms "
+        f"p50={statistics.median(xs) * 1000:.1f}ms p95={p95 * 1000:.1f}ms"
+    )
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--image", default="alpine:3.20")
+    ap.add_argument("-n", type=int, default=20, help="запусков на режим")
+    ap.add_argument("--cmd", default="true", help="команда внутри контейнера (sh -c)")
+    args = ap.parse_args()
+
+    home = pathlib.Path(tempfile.mkdtemp(prefix="autopen-bench-"))
+    # содержимое тома бенчмарку не нужно, путь задаём явно (без AUTOPEN_HOST_HOME)
+    cfg = Pool(enabled=True, size=1, max_jobs=args.n + 1, run_args=[], volumes=[f"{home}:{home}"])
+
+    cold = []
+    for _ in range(args.n):
+        t0 = time.monotonic()
+        res = run_command_sync(cold_argv(home, cfg, args.image, args.cmd), home / "logs", "cold")
+        cold.append(time.monotonic() - t0)
+        if res.rc != 0:
+            print(f"cold run failed (rc={res.rc}): {res.tail}", file=sys.stderr)
+            return 1
+
+    pool = ImagePool(home, "bench", args.image, cfg, size=1)
+    warm = []
+    try:
+        t0 = time.monotonic()
+        c = pool.acquire()
+        startup = time.monotonic() - t0
+        pool.release(c)
+        for _ in range(args.n):
+            t0 = time.monotonic()
+            c = pool.acquire()
+            res = run_command_sync(pool.exec_argv(c, args.cmd), home / "logs", "warm")
+            pool.release(c, broken=res.rc != 0)
+            warm.append(time.monotonic() - t0)
+            if res.rc != 0:
+                print(f"warm run failed (rc={res.rc}): {res.tail}", file=sys.stderr)
+                return 1
+    finally:
+        pool.close()
+        shutil.rmtree(home, ignore_errors=True)
+
+    print(_summary("cold", cold))
+    print(_summary("warm", warm))
+    print(f"pool startup (one container): {startup * 1000:.1f}ms")
+    print(f"speedup (mean): x{statistics.mean(cold) / statistics.mean(warm):.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+import json
+import os
+import sys
+
+import pytest
+
+from core import images
+from core.images import DigestIndex, prepull
+
+# docker CLI для тестов: локальные образы и «реестр» — JSON в FAKE_DOCKER_DIR,
+# каждый вызов дописывается в log
+FAKE_DOCKER = """\
+import json, os, sys
+d = os.environ["FAKE_DOCKER_DIR"]
+args = sys.argv[1:]
+with open(os.path.join(d, "log"), "a") as f:
+    f.write(" ".join(args) + "\\n")
+def load(name):
+    p = os.path.join(d, name)
+    return json.load(open(p)) if os.path.exists(p) else {}
+local, registry = load("local.json"), load("registry.json")
+img = args[-1]
+if args[0] == "pull":
+    if img not in registry:
+        print("manifest unknown", file=sys.stderr)
+        sys.exit(1)
+    local[img] = registry[img]
+    json.dump(local, open(os.path.join(d, "local.json"), "w"))
+    print(img)
+elif args[:2] == ["image", "inspect"]:
+    if img not in local:
+        print("No such image", file=sys.stderr)
+        sys.exit(1)
+    print(local[img] + " reg/" + img.split(":")[0] + "@sha256:abc")
+"""
+
+
+@pytest.fixture
+def docker(tmp_path, monkeypatch):
+    d = tmp_path / "docker"
+    bin_dir = d / "bin"
+    bin_dir.mkdir(parents=True)
+    exe = bin_dir / "docker"
+    exe.write_text(f"#!{sys.executable}\n" + FAKE_DOCKER)
+    exe.chmod(0o755)
+    monkeypatch.setenv("FAKE_DOCKER_DIR", str(d))
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}")
+    monkeypatch.setattr(images, "_digests", {})
+
+    class Fake:
+        def set(self, name, data):
+            (d / f"{name}.json").write_text(json.dumps(data))
+
+        def pulls(self):
+            log = d / "log"
+            return [l.split()[-1] for l in log.read_text().splitlines() if l.startswith("pull")] if log.exists() else []
+
+    return Fake()
+
+
+def test_prepull_pulls_missing_and_indexes(tmp_path, docker):
+    docker.set("registry", {"tool:1": "sha256:t1"})
+    res = prepull(tmp_path, ["tool:1", "none", ""], recheck=3600)
+    assert list(res) == ["tool:1"]
+    assert res["tool:1"]["id"] == "sha256:t1" and res["tool:1"]["pulled"]
+    idx = DigestIndex.load(tmp_path)
+    assert idx.entries["tool:1"]["id"] == "sha256:t1"
+    assert idx.entries["tool:1"]["repo_digests"] == ["reg/tool@sha256:abc"]
+    assert images.image_digest("tool:1") == "sha256:t1"
+
+
+def test_fresh_index_skips_pull(tmp_path, docker):
+    docker.set("registry", {"tool:1": "sha256:t1"})
+    prepull(tmp_path, ["tool:1"], recheck=3600)
+    res = prepull(tmp_path, ["tool:1"], recheck=3600)
+    assert docker.pulls() == ["tool:1"]
+    assert not res["tool:1"]["pulled"] and not res["tool:1"]["checked"]
+
+
+def test_stale_tag_is_rechecked(tmp_path, docker):
+    docker.set("registry", {"tool:latest": "sha256:old", "tool@sha256:x": "sha256:pin"})
+    prepull(tmp_path, ["tool:latest", "tool@sha256:x"], recheck=3600)
+    docker.set("registry", {"tool:latest": "sha256:new", "tool@sha256:x": "sha256:pin"})
+    res = prepull(tmp_path, ["tool:latest", "tool@sha256:x"], recheck=0)
+    assert res["tool:latest"]["id"] == "sha256:new" and res["tool:latest"]["pulled"]
+    # закреплённый по digest образ не перепроверяется
+    assert docker.pulls().count("tool@sha256:x") == 1
+    assert DigestIndex.load(tmp_path).entries["tool:latest"]["id"] == "sha256:new"
+
+
+def test_pull_failures(tmp_path, docker):
+    docker.set("local", {"offline:1": "sha256:loc"})
+    res = prepull(tmp_path, ["missing:1", "offline:1"], recheck=0)
+    assert res["missing:1"]["error"] == "manifest unknown" and not res["missing:1"]["id"]
+    # реестр недоступен, но образ есть локально — работаем с ним
+    assert res["offline:1"]["id"] == "sha256:loc"
+    assert res["offline:1"]["error"] is None and "manifest unknown" in res["offline:1"]["warning"]
+    entries = DigestIndex.load(tmp_path).entries
+    assert "missing:1" not in entries
+    # не сверен — в следующий раз сверяем снова
+    assert entries["offline:1"]["checked"] == 0
+
+
+def test_digest_index_fresh(tmp_path):
+    idx = DigestIndex(tmp_path / "images.json")
+    idx.entries = {
+        "a:1": {"id": "sha256:a", "checked": 1000.0},
+        "p@sha256:x": {"id": "sha256:p", "checked": 0},
+    }
+    assert idx.fresh("a:1", "sha256:a", recheck=100, now=1050)
+    assert not idx.fresh("a:1", "sha256:a", recheck=100, now=1200)
+    assert not idx.fresh("a:1", "sha256:other", recheck=100, now=1050)
+    assert not idx.fresh("a:1", "", recheck=100, now=1050)
+    assert not idx.fresh("b:1", "sha256:b", recheck=100, now=1050)
+    assert idx.fresh("p@sha256:x", "sha256:p", recheck=0, now=10**9)
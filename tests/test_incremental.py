@@ -0,0 +1,37 @@
+from core.incremental import ScanState, carried_assets
+from core.pipeline import Incremental
+
+
+def test_split_new_stale_and_fresh(tmp_path):
+    st = ScanState(tmp_path / "incremental.json")
+    st.scanned = {"old.example": 0.0, "fresh.example": 900.0, "10.0.0.1": 950.0}
+    scan, carry = st.split(
+        ["new.example", "old.example", "fresh.example", "10.0.0.1"], Incremental(stale_after=500), now=1000.0
+    )
+    assert scan == ["new.example", "old.example"]
+    assert carry == ["fresh.example", "10.0.0.1"]
+
+
+def test_split_stale_after_zero_rescans_everything(tmp_path):
+    st = ScanState(tmp_path / "incremental.json")
+    st.scanned = {"a.example": 999.0}
+    assert st.split(["a.example"], Incremental(stale_after=0), now=1000.0) == (["a.example"], [])
+
+
+def test_save_keeps_original_scan_time_of_carried(tmp_path):
+    st = ScanState.load(tmp_path)
+    st.scanned = {"fresh.example": 900.0, "gone.example": 100.0}
+    st.save("run2", ["new.example"], ["fresh.example"], now=1000.0)
+    loaded = ScanState.load(tmp_path)
+    assert loaded.run_id == "run2"
+    assert loaded.scanned == {"new.example": 1000.0, "fresh.example": 900.0}
+
+
+def test_carried_assets_include_ips_except_rescanned():
+    host_map = {
+        "web.example": ["10.0.0.1", "10.0.0.2"],
+        "api.example": ["10.0.0.2"],
+    }
+    out = carried_assets(["web.example", "10.0.0.9"], ["api.example"], host_map)
+    # 10.0.0.2 сканируется заново вместе с api.example
+    assert out == {"web.example", "10.0.0.1", "10.0.0.9"}
@@ -0,0 +1,39 @@
+import json
+
+from core.livecache import AliveCache, block_of
+
+
+def _run(home, hosts, alive, now):
+    cache = AliveCache.load(home, ttl=0, dead_after=2, dead_every=3)
+    probed = list(cache.to_probe(hosts, now))
+    cache.update(hosts, alive, now)
+    cache.save(now)
+    return probed
+
+
+def test_block_of():
+    assert block_of("10.1.2.3") == "10.1.2"
+    assert block_of("2001:db8::1") == "2001:db8::"
+    assert block_of("host.example") == "host.example"
+
+
+def test_silent_block_backs_off_without_per_ip_entries(tmp_path):
+    hosts = [f"10.0.{b}.{i}" for b in range(4) for i in range(1, 255)]
+    alive = {"10.0.0.5": 1.0}
+    probed = [len(_run(tmp_path, hosts, alive, now)) for now in range(1, 7)]
+    # 3 молчащих блока: 2 прогона подряд, затем раз в 3 прогона (5-й);
+    # в блоке 10.0.0 ответил 10.0.0.5 — streak блока начался на прогон позже,
+    # а сам живой хост пробуется всегда (ttl=0)
+    assert probed == [1016, 1016, 254, 1, 3 * 254 + 1, 254]
+    data = json.loads((tmp_path / "state" / "alive_cache.json").read_text())
+    assert list(data["hosts"]) == ["10.0.0.5"]
+    assert sorted(data["blocks"]) == ["10.0.0", "10.0.1", "10.0.2", "10.0.3"]
+
+
+def test_old_flat_format_keeps_only_ever_alive(tmp_path):
+    (tmp_path / "state").mkdir()
+    (tmp_path / "state" / "alive_cache.json").write_text(
+        json.dumps({"10.0.0.1": [100, 0, 1.5, 0, 0], "10.0.0.2": [0, 100, None, 5, 0]})
+    )
+    cache = AliveCache.load(tmp_path, ttl=0)
+    assert list(cache.entries) == ["10.0.0.1"] and cache.blocks == {}
@@ -0,0 +1,36 @@
+from core.plugins import _stable_batches
+
+
+def _hosts(n):
+    return [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(n)]
+
+
+def test_stable_batches_cover_targets_once(tmp_path):
+    src = tmp_path / "alive.txt"
+    hosts = _hosts(1000)
+    src.write_text("\n".join(hosts))
+    batches = dict(_stable_batches(src, 64))
+    # корзин — степень двойки не меньше n / batch_size
+    assert len(batches) == 16
+    flat = [t for chunk in batches.values() for t in chunk]
+    assert sorted(flat) == sorted(hosts)
+
+
+def test_stable_batches_insert_changes_one_batch(tmp_path):
+    src = tmp_path / "alive.txt"
+    hosts = _hosts(1000)
+    src.write_text("\n".join(hosts))
+    before = dict(_stable_batches(src, 64))
+    # новый хост посередине интерливнутого списка и другой порядок остальных
+    src.write_text("\n".join(hosts[500:] + ["192.168.7.7"] + hosts[:500]))
+    after = dict(_stable_batches(src, 64))
+    changed = [b for b in after if after[b] != before.get(b)]
+    assert len(changed) == 1 and "192.168.7.7" in after[changed[0]]
+
+
+def test_stable_batches_small_input(tmp_path):
+    src = tmp_path / "alive.txt"
+    src.write_text("a.example\nb.example\n")
+    batches = list(_stable_batches(src, 64))
+    assert len(batches) == 1 and sorted(batches[0][1]) == ["a.example", "b.example"]
+    assert list(_stable_batches(tmp_path / "missing.txt", 64)) == []
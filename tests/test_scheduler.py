@@ -0,0 +1,73 @@
+import threading
+
+from core.pipeline import Pipeline, Step
+from core.scheduler import run_dag
+
+
+def _pipe(continue_on_error=False, **needs):
+    steps = ["a", "b", "c", "d", "e"]
+    return Pipeline(
+        steps=steps,
+        concurrency=2,
+        continue_on_error=continue_on_error,
+        specs={n: Step(n, needs=needs.get(n, [])) for n in steps},
+    )
+
+
+def _runner(fail=()):
+    ran = []
+    lock = threading.Lock()
+
+    def run(n):
+        with lock:
+            ran.append(n)
+        return "boom" if n in fail else None
+
+    return run, ran
+
+
+def test_failure_skips_whole_branch_only():
+    # a -> b -> c, a -> d; e независим
+    pipe = _pipe(b=["a"], c=["b"], d=["a"])
+    run, ran = _runner(fail={"a"})
+    res = run_dag(pipe, run)
+    assert res["a"]["status"] == "failed" and res["a"]["error"] == "boom"
+    assert res["b"] == {"status": "skipped", "seconds": 0.0, "error": "needs a"}
+    # пропуск распространяется дальше по цепочке
+    assert res["c"]["status"] == "skipped" and res["c"]["error"] == "needs b"
+    assert res["d"]["status"] == "skipped"
+    assert res["e"]["status"] == "ok"
+    assert sorted(ran) == ["a", "e"]
+
+
+def test_continue_on_error_runs_dependents():
+    pipe = _pipe(continue_on_error=True, b=["a"], c=["b"])
+    run, ran = _runner(fail={"a"})
+    res = run_dag(pipe, run)
+    assert res["a"]["status"] == "failed"
+    assert all(res[n]["status"] == "ok" for n in "bcde")
+    assert ran.index("a") < ran.index("b") < ran.index("c")
+
+
+def test_step_override_and_exception():
+    pipe = _pipe(continue_on_error=True, b=["a"], c=["a"])
+    pipe.specs["a"].continue_on_error = False
+
+    def run(n):
+        if n == "a":
+            raise RuntimeError("crashed")
+        return None
+
+    res = run_dag(pipe, run)
+    assert res["a"]["status"] == "failed" and res["a"]["error"] == "crashed"
+    assert res["b"]["status"] == res["c"]["status"] == "skipped"
+    assert res["d"]["status"] == res["e"]["status"] == "ok"
+
+
+def test_skipped_step_with_two_parents_reported_once():
+    pipe = _pipe(c=["a", "b"])
+    done = []
+    run, _ = _runner(fail={"a", "b"})
+    res = run_dag(pipe, run, on_done=lambda n, r: done.append(n))
+    assert res["c"]["status"] == "skipped"
+    assert done.count("c") == 1
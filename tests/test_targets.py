@@ -0,0 +1,51 @@
+from core.targets import TargetSet
+
+
+def test_subtract_matches_set_difference():
+    a = TargetSet(["10.0.0.0/24", "10.0.1.5", "example.com", "other.org", "2001:db8::1-2001:db8::10"])
+    b = TargetSet(["10.0.0.64/26", "10.0.1.5", "other.org", "2001:db8::8"])
+    diff = a - b
+    assert list(diff) == [t for t in a if t not in b]
+    assert "10.0.0.100" not in diff and "10.0.0.10" in diff
+    assert "example.com" in diff and "other.org" not in diff
+    assert "2001:db8::8" not in diff and "2001:db8::9" in diff
+
+
+def test_subtract_large_ranges_without_enumeration():
+    a = TargetSet(["10.0.0.0/8"])
+    b = TargetSet(["10.1.0.0/16", "10.200.0.0/16"])
+    diff = a - b
+    # /16 внутри /8 вычитается интервалами: минус по 2**16 - 2 хостов (без network/broadcast)
+    assert len(diff) == len(a) - 2 * (2**16 - 2)
+    assert "10.1.2.3" not in diff and "10.2.0.1" in diff
+
+
+def test_subtract_keeps_endpoints_of_remaining_hosts():
+    a = TargetSet(["https://10.0.0.1:8443/", "10.0.0.2:22"])
+    diff = a - TargetSet(["10.0.0.2"])
+    assert diff.endpoints == {"10.0.0.1": {"https://10.0.0.1:8443/": None}}
+
+
+def test_interleave_round_robins_blocks():
+    ts = TargetSet(["10.0.0.1-3", "10.0.1.1-2", "10.0.2.7", "b.example"])
+    order = list(ts.interleaved(24))
+    assert order == [
+        "10.0.0.1", "10.0.1.1", "10.0.2.7",
+        "10.0.0.2", "10.0.1.2",
+        "10.0.0.3",
+        "b.example",
+    ]
+    assert sorted(order) == sorted(ts) and len(ts.interleaved(24)) == len(ts)
+
+
+def test_interleave_block_prefix():
+    ts = TargetSet(["10.0.0.0/23"])
+    order = list(ts.interleaved(25))
+    # /23 без network/broadcast: 4 блока /25 по кругу
+    assert order[:4] == ["10.0.0.1", "10.0.0.128", "10.0.1.0", "10.0.1.128"]
+    assert len(order) == len(set(order)) == len(ts)
+
+
+def test_ipv6_endpoint_keyed_by_address_family():
+    ts = TargetSet(["[::1]:443", "10.0.0.1:80"])
+    assert set(ts.endpoints) == {"::1", "10.0.0.1"}